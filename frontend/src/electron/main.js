@@ -34,36 +34,92 @@ function createWindow() {
 
 app.whenReady().then(createWindow);
 
-async function callASR(buffer) {
+// --- Server-sent events: parse a fetch body into (event, data) pairs ---
+async function readSSE(body, onEvent) {
+  // One streaming decoder so a UTF-8 character split across chunks is not mangled
+  const decoder = new TextDecoder("utf-8");
+  let buffered = "";
+  for await (const chunk of body) {
+    buffered += decoder.decode(chunk, { stream: true });
+    let sep;
+    while ((sep = buffered.indexOf("\n\n")) !== -1) {
+      const raw = buffered.slice(0, sep);
+      buffered = buffered.slice(sep + 2);
+      let event = "message";
+      const data = [];
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data.push(line.slice(line.startsWith("data: ") ? 6 : 5));
+      }
+      if (data.length) onEvent(event, JSON.parse(data.join("\n")));
+    }
+  }
+}
+
+// The answer currently streaming back; aborting it closes the request, which also stops the LLM upstream
+let answerController = null;
+
+// Ask for the answer as SSE and relay tokens to the renderer; resolves with the final payload
+async function readAnswer(res, sender) {
+  if (!(res.headers.get("content-type") || "").startsWith("text/event-stream")) return res.json();
+  let final = null;
+  await readSSE(res.body, (event, data) => {
+    if (event === "final") final = data;
+    else if (!sender.isDestroyed()) sender.send("stt:answer-event", { event, data });
+  });
+  if (!final) throw new Error("answer stream ended early");
+  return final;
+}
+
+async function answerRequest(url, options, sender) {
+  if (answerController) answerController.abort();
+  const controller = new AbortController();
+  answerController = controller;
+  try {
+    const res = await fetch(url, {
+      ...options,
+      headers: { ...(options.headers || {}), Accept: "text/event-stream, application/json" },
+      signal: controller.signal,
+    });
+    if (!res.ok) {
+      const txt = await res.text();
+      let json = null;
+      try { json = JSON.parse(txt); } catch { /* not JSON */ }
+      if (json) return json;
+      throw new Error(`ASR server error: ${res.status} ${txt}`);
+    }
+    return await readAnswer(res, sender);
+  } catch (err) {
+    if (err.name === "AbortError") return { cancelled: true };
+    throw err;
+  } finally {
+    if (answerController === controller) answerController = null;
+  }
+}
+
+async function callASR(buffer, sender, contentType = "audio/webm") {
   if (!ASR_URL) throw new Error("ASR_URL not configured");
 
   // buffer is Node Buffer
   const form = new FormData();
-  // ensure content type and filename are provided
-  form.append("file", buffer, { filename: "speech.webm", contentType: "audio/webm" });
+  // ensure content type and filename are provided; raw PCM / Opus frames declare their rate in the type
+  const raw = !contentType.startsWith("audio/webm");
+  form.append("file", buffer, { filename: raw ? "speech.raw" : "speech.webm", contentType });
 
   // debug: log size
   const size = Buffer.isBuffer(buffer) ? buffer.length : 0;
   console.log("callASR: sending buffer size:", size);
 
-  const res = await fetch(ASR_URL, {
+  const result = await answerRequest(ASR_URL, {
     method: "POST",
     body: form,
     headers: form.getHeaders ? form.getHeaders() : {},
-  });
-
-  if (!res.ok) {
-    const txt = await res.text();
-    console.error(`ASR server error: ${res.status} - ${txt}`);
-    throw new Error(`ASR server error: ${res.status} ${txt}`);
-  }
-  
-  const result = await res.json();
+  }, sender);
   console.log("ASR result:", result);
   return result;
 }
 
-ipcMain.handle("stt:recognize", async (event, arrayLike) => {
+ipcMain.handle("stt:recognize", async (event, arrayLike, contentType) => {
   try {
     console.log("IPC: Received transcription request");
     const uint8 = Uint8Array.from(arrayLike || []);
@@ -74,15 +130,16 @@ ipcMain.handle("stt:recognize", async (event, arrayLike) => {
     }
 
     console.log("IPC: Calling ASR with buffer size:", buffer.length);
-    const json = await callASR(buffer);
+    const json = await callASR(buffer, event.sender, contentType || undefined);
     console.log("IPC: ASR response:", json);
-    
+
+    if (json && json.cancelled) return { cancelled: true };
     if (json && json.error) {
       console.error("IPC: ASR returned error:", json.error);
       return { error: json.error };
     }
 
-    const result = { text: json.text || "", question: json.question || "" };
+    const result = { text: json.text || "", question: json.question || "", command_executed: json.command_executed };
     console.log("IPC: Returning result:", result);
     return result;
   } catch (err) {
@@ -90,3 +147,96 @@ ipcMain.handle("stt:recognize", async (event, arrayLike) => {
     return { error: String(err) };
   }
 });
+
+// --- Streaming transcription: forward MediaRecorder chunks as they are recorded ---
+const ASR_STREAM_URL = process.env.ASR_STREAM_URL || `${ASR_URL}/stream`;
+const streams = new Map(); // sessionId -> { queue: Promise, events: AbortController }
+
+async function readStreamEvents(sessionId, sender, controller) {
+  try {
+    const res = await fetch(`${ASR_STREAM_URL}/${sessionId}/events`, { signal: controller.signal });
+    if (!res.ok) return;
+    await readSSE(res.body, (event, data) => {
+      if (!sender.isDestroyed()) sender.send("stt:stream-event", { sessionId, event, data });
+    });
+  } catch (err) {
+    if (err.name !== "AbortError") console.error("Stream events error:", err);
+  }
+}
+
+ipcMain.handle("stt:stream-start", async (event) => {
+  try {
+    const res = await fetch(ASR_STREAM_URL, { method: "POST" });
+    if (!res.ok) return { error: `ASR stream error: ${res.status} ${await res.text()}` };
+    const { session_id: sessionId } = await res.json();
+    const controller = new AbortController();
+    streams.set(sessionId, { queue: Promise.resolve(), events: controller });
+    readStreamEvents(sessionId, event.sender, controller);
+    console.log("IPC: Opened stream session", sessionId);
+    return { sessionId };
+  } catch (err) {
+    console.error("IPC: Error starting stream:", err);
+    return { error: String(err) };
+  }
+});
+
+ipcMain.handle("stt:stream-chunk", async (event, sessionId, arrayLike) => {
+  const stream = streams.get(sessionId);
+  if (!stream) return { error: "unknown stream session" };
+  const buffer = Buffer.from(Uint8Array.from(arrayLike || []));
+  // chunks must reach the decoder in recording order
+  stream.queue = stream.queue.then(async () => {
+    const res = await fetch(`${ASR_STREAM_URL}/${sessionId}`, {
+      method: "POST",
+      body: buffer,
+      headers: { "Content-Type": "application/octet-stream" },
+    });
+    if (!res.ok) throw new Error(`ASR stream error: ${res.status} ${await res.text()}`);
+    return res.json();
+  });
+  try {
+    return await stream.queue;
+  } catch (err) {
+    console.error("IPC: Error sending stream chunk:", err);
+    stream.queue = Promise.resolve();
+    return { error: String(err) };
+  }
+});
+
+ipcMain.handle("stt:stream-finish", async (event, sessionId) => {
+  const stream = streams.get(sessionId);
+  if (!stream) return { error: "unknown stream session" };
+  try {
+    await stream.queue.catch(() => {});
+    const json = await answerRequest(`${ASR_STREAM_URL}/${sessionId}/finish`, { method: "POST" }, event.sender);
+    if (json.cancelled) return { cancelled: true };
+    if (json.error) return { error: json.error };
+    return { text: json.text || "", question: json.question || "", command_executed: json.command_executed };
+  } catch (err) {
+    console.error("IPC: Error finishing stream:", err);
+    return { error: String(err) };
+  } finally {
+    stream.events.abort();
+    streams.delete(sessionId);
+  }
+});
+
+ipcMain.handle("stt:stream-cancel", async (event, sessionId) => {
+  const stream = streams.get(sessionId);
+  if (!stream) return { ok: false };
+  streams.delete(sessionId);
+  stream.events.abort();
+  try {
+    await fetch(`${ASR_STREAM_URL}/${sessionId}`, { method: "DELETE" });
+  } catch (err) {
+    console.warn("IPC: Error cancelling stream:", err);
+  }
+  return { ok: true };
+});
+
+// Double-click while an answer is streaming: drop the request (the server stops generating)
+ipcMain.handle("stt:cancel-answer", async () => {
+  if (!answerController) return { ok: false };
+  answerController.abort();
+  return { ok: true };
+});
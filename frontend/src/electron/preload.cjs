@@ -2,6 +2,25 @@
 const { contextBridge, ipcRenderer } = require("electron");
 
 contextBridge.exposeInMainWorld("electronAPI", {
-  // accept a Uint8Array from renderer and forward to main
-  transcribeAudio: (uint8Array) => ipcRenderer.invoke("stt:recognize", Array.from(uint8Array))
+  // accept a Uint8Array (and its declared Content-Type, e.g. "audio/s16le;rate=16000") from renderer and forward to main
+  transcribeAudio: (uint8Array, contentType) => ipcRenderer.invoke("stt:recognize", Array.from(uint8Array), contentType),
+
+  // streaming transcription: open a session, push recorder chunks, then finish or cancel
+  startStream: () => ipcRenderer.invoke("stt:stream-start"),
+  sendStreamChunk: (sessionId, uint8Array) => ipcRenderer.invoke("stt:stream-chunk", sessionId, Array.from(uint8Array)),
+  finishStream: (sessionId) => ipcRenderer.invoke("stt:stream-finish", sessionId),
+  cancelStream: (sessionId) => ipcRenderer.invoke("stt:stream-cancel", sessionId),
+  onStreamEvent: (callback) => {
+    const listener = (_event, payload) => callback(payload);
+    ipcRenderer.on("stt:stream-event", listener);
+    return () => ipcRenderer.removeListener("stt:stream-event", listener);
+  },
+
+  // answers stream back as "transcript" and "token" events before the final result; cancel drops the request
+  onAnswerEvent: (callback) => {
+    const listener = (_event, payload) => callback(payload);
+    ipcRenderer.on("stt:answer-event", listener);
+    return () => ipcRenderer.removeListener("stt:answer-event", listener);
+  },
+  cancelAnswer: () => ipcRenderer.invoke("stt:cancel-answer"),
 });
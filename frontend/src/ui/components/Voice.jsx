@@ -1,6 +1,70 @@
 // src/components/Voice.jsx
 import React, { useEffect, useRef, useState } from "react";
 
+// Uploads are downsampled here so the server can skip container demux (see "Upload formats" in the README)
+const UPLOAD_RATE = 16000;
+
+// Decode the recorded blob and resample it to mono UPLOAD_RATE float samples
+async function decodeToPCM(blob) {
+  const ctx = new OfflineAudioContext(1, 1, UPLOAD_RATE);
+  const decoded = await ctx.decodeAudioData(await blob.arrayBuffer());
+  const length = Math.ceil(decoded.duration * UPLOAD_RATE);
+  const offline = new OfflineAudioContext(1, length, UPLOAD_RATE);
+  const source = offline.createBufferSource();
+  source.buffer = decoded;
+  source.connect(offline.destination);
+  source.start();
+  return (await offline.startRendering()).getChannelData(0);
+}
+
+// Raw Opus packets, each prefixed by its length as a 2-byte big-endian int
+async function encodeOpusFrames(samples) {
+  const config = { codec: "opus", sampleRate: UPLOAD_RATE, numberOfChannels: 1, bitrate: 24000 };
+  if (typeof AudioEncoder === "undefined" || !(await AudioEncoder.isConfigSupported(config)).supported) return null;
+  const packets = [];
+  let failure = null;
+  const encoder = new AudioEncoder({
+    output: (chunk) => {
+      const packet = new Uint8Array(chunk.byteLength);
+      chunk.copyTo(packet);
+      packets.push(packet);
+    },
+    error: (e) => { failure = e; },
+  });
+  encoder.configure(config);
+  encoder.encode(new AudioData({
+    format: "f32", sampleRate: UPLOAD_RATE, numberOfFrames: samples.length,
+    numberOfChannels: 1, timestamp: 0, data: samples,
+  }));
+  await encoder.flush();
+  encoder.close();
+  if (failure || !packets.length) return null;
+  const out = new Uint8Array(packets.reduce((n, p) => n + 2 + p.length, 0));
+  let pos = 0;
+  for (const p of packets) {
+    out[pos] = p.length >> 8;
+    out[pos + 1] = p.length & 0xff;
+    out.set(p, pos + 2);
+    pos += 2 + p.length;
+  }
+  return out;
+}
+
+// Pick the cheapest declared format the renderer can produce: Opus frames, then 16-bit PCM, else the container
+async function encodeUpload(blob, mimeType) {
+  try {
+    const samples = await decodeToPCM(blob);
+    const frames = await encodeOpusFrames(samples);
+    if (frames) return { bytes: frames, contentType: `audio/x-opus-frames;rate=${UPLOAD_RATE};channels=1` };
+    const pcm = new Int16Array(samples.length);
+    for (let i = 0; i < samples.length; i++) pcm[i] = Math.max(-1, Math.min(1, samples[i])) * 0x7fff;
+    return { bytes: new Uint8Array(pcm.buffer), contentType: `audio/s16le;rate=${UPLOAD_RATE};channels=1` };
+  } catch (e) {
+    console.warn("Local decode failed, uploading the container:", e);
+    return { bytes: new Uint8Array(await blob.arrayBuffer()), contentType: mimeType };
+  }
+}
+
 export default function Voice() {
   const [listening, setListening] = useState(false);
   const [lastText, setLastText] = useState("");
@@ -20,6 +84,14 @@ export default function Voice() {
   const vadIntervalRef = useRef(null);
   const recordingStartTimeRef = useRef(0);
   const streamRef = useRef(null); // Store the MediaStream for proper cleanup
+  const sttSessionRef = useRef(null); // Streaming transcription session id (if the server supports it)
+  const sttChunksRef = useRef(Promise.resolve()); // Chain of in-flight chunk uploads, kept in recording order
+  const sttUnsubscribeRef = useRef(null);
+  const answeringRef = useRef(false); // An answer is streaming back; a double-click cancels it
+  const answerTextRef = useRef("");
+
+  // MediaRecorder timeslice used when streaming chunks to the server
+  const STREAM_TIMESLICE_MS = 500;
 
   useEffect(() => {
     // Initialize voices for TTS
@@ -33,7 +105,19 @@ export default function Voice() {
     }
     loadVoices();
 
+    // Show the answer as it streams in instead of waiting for the whole response
+    const unsubscribeAnswer = window.electronAPI?.onAnswerEvent?.(({ event, data }) => {
+      if (event === "transcript") {
+        answerTextRef.current = "";
+        setLastText(`… ${data.question}`);
+      } else if (event === "token") {
+        answerTextRef.current += data.text;
+        setLastText(answerTextRef.current);
+      }
+    });
+
     return () => {
+      if (unsubscribeAnswer) unsubscribeAnswer();
       // cleanup
       cleanupRecording();
       if (clickTimeoutRef.current) {
@@ -134,11 +218,69 @@ export default function Voice() {
     window.speechSynthesis.speak(utterance);
   };
 
-  const sendToBackend = async (uint8arr) => {
+  // Open a streaming session so the server can decode and transcribe while we record
+  const startStreamSession = async () => {
+    sttSessionRef.current = null;
+    sttChunksRef.current = Promise.resolve();
+    if (!window.electronAPI?.startStream) return;
+    try {
+      const resp = await window.electronAPI.startStream();
+      if (resp?.error || !resp?.sessionId) {
+        console.warn("Streaming unavailable, falling back to full upload:", resp?.error);
+        return;
+      }
+      const sessionId = resp.sessionId;
+      sttSessionRef.current = sessionId;
+      if (sttUnsubscribeRef.current) sttUnsubscribeRef.current();
+      sttUnsubscribeRef.current = window.electronAPI.onStreamEvent(({ sessionId: id, event, data }) => {
+        if (id !== sessionId) return;
+        if (event === "partial" && data?.text) setLastText(`… ${data.text}`);
+      });
+    } catch (e) {
+      console.warn("Failed to start streaming session:", e);
+    }
+  };
+
+  const endStreamSession = async (cancel) => {
+    const sessionId = sttSessionRef.current;
+    sttSessionRef.current = null;
+    if (sttUnsubscribeRef.current) {
+      sttUnsubscribeRef.current();
+      sttUnsubscribeRef.current = null;
+    }
+    if (!sessionId) return null;
+    await sttChunksRef.current;
+    if (cancel) {
+      await window.electronAPI.cancelStream(sessionId);
+      return null;
+    }
+    return window.electronAPI.finishStream(sessionId);
+  };
+
+  const sendToBackend = async (uint8arr, contentType) => {
+    console.log("Sending audio to backend, size:", uint8arr.length, "type:", contentType);
+    answeringRef.current = true;
+    try {
+      const resp = await window.electronAPI.transcribeAudio(uint8arr, contentType);
+      await handleTranscription(resp);
+    } finally {
+      answeringRef.current = false;
+    }
+  };
+
+  const cancelAnswer = () => {
+    answeringRef.current = false;
+    window.electronAPI?.cancelAnswer?.();
+    window.speechSynthesis.cancel();
+  };
+
+  const handleTranscription = async (resp) => {
     try {
-      console.log("Sending audio to backend, size:", uint8arr.length);
-      const resp = await window.electronAPI.transcribeAudio(uint8arr);
       console.log("Transcription response:", resp);
+      if (resp?.cancelled) {
+        console.log("Answer cancelled");
+        return;
+      }
       if (resp?.error) {
         console.error("Transcription error:", resp.error);
         
@@ -162,6 +304,15 @@ export default function Voice() {
 
       console.log("Transcription result:", { question, llmText, confidence });
 
+      // If server already executed the command and returned a command_executed flag,
+      // show that result directly and don't call /api/execute again.
+      if (resp?.command_executed) {
+        const responseText = llmText || question || "";
+        setLastText(responseText);
+        speakText(responseText);
+        return;
+      }
+
       // Enhanced quality checks for noisy environments
       const isHighQuality = question.length >= 5 && // Minimum length
                            !question.match(/^[^a-zA-Z]*$/) && // Not just symbols/numbers
@@ -175,15 +326,6 @@ export default function Voice() {
         return;
       }
 
-      // If server already executed the command and returned a command_executed flag,
-      // show that result directly and don't call /api/execute again.
-      if (resp?.command_executed) {
-        const responseText = llmText || question || "";
-        setLastText(responseText);
-        speakText(responseText);
-        return;
-      }
-
       // Enhanced command patterns requiring more explicit phrases
       const commandPatterns = [
         // Full phrase patterns - much more reliable in noisy environments
@@ -319,14 +461,28 @@ export default function Voice() {
       const mr = new MediaRecorder(stream, options);
       mediaRecorderRef.current = mr;
 
+      await startStreamSession();
+      const sessionId = sttSessionRef.current;
+
       mr.ondataavailable = (ev) => {
-        if (ev.data && ev.data.size > 0) chunksRef.current.push(ev.data);
+        if (ev.data && ev.data.size > 0) {
+          chunksRef.current.push(ev.data);
+          if (sessionId) {
+            const data = ev.data;
+            sttChunksRef.current = sttChunksRef.current.then(async () => {
+              const buf = new Uint8Array(await data.arrayBuffer());
+              const r = await window.electronAPI.sendStreamChunk(sessionId, buf);
+              if (r?.error) console.warn("Stream chunk rejected:", r.error);
+            }).catch((e) => console.warn("Stream chunk upload failed:", e));
+          }
+        }
       };
 
       mr.onstop = async () => {
         try {
           // If the recording was cancelled via double-click or a pending cancel, skip sending
           if (cancelledRef.current || doNotSendRef.current) {
+            await endStreamSession(true);
             // clear chunks and reset cancel flags
             chunksRef.current = [];
             cancelledRef.current = false;
@@ -342,12 +498,23 @@ export default function Voice() {
           if (!size || size < 1000) { // Increased minimum size for better quality
             setError("Recording too short. Please speak for at least 2-3 seconds with complete phrases.");
             speakText("Please speak longer with complete phrases like 'Can you open the calculator'.");
+            await endStreamSession(true);
+            return;
+          }
+          if (sessionId) {
+            // The server already has every chunk; just ask it to finalize
+            answeringRef.current = true;
+            try {
+              const resp = await endStreamSession(false);
+              await handleTranscription(resp);
+            } finally {
+              answeringRef.current = false;
+            }
             return;
           }
-          const arrayBuffer = await blob.arrayBuffer();
-          const uint8 = new Uint8Array(arrayBuffer);
+          const { bytes, contentType } = await encodeUpload(blob, mimeType);
           // send Uint8Array to preload -> main
-          await sendToBackend(uint8);
+          await sendToBackend(bytes, contentType);
         } catch (e) {
           setError(String(e));
         } finally {
@@ -361,7 +528,7 @@ export default function Voice() {
         }
       };
 
-      mr.start();
+      mr.start(sessionId ? STREAM_TIMESLICE_MS : undefined);
       setListening(true);
       recordingStartTimeRef.current = Date.now();
 
@@ -572,7 +739,14 @@ export default function Voice() {
       // double click detected
       lastClickRef.current = 0;
       console.log("Double-click detected - cancelling recording");
-      
+
+      // A streaming answer is cancelled too; the recording the first click started is dropped
+      if (answeringRef.current) {
+        doNotSendRef.current = true;
+        cancelAnswer();
+        setError("Answer cancelled");
+      }
+
       // If currently recording, cancel immediately
       if (listening) {
         doNotSendRef.current = true;
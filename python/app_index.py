@@ -0,0 +1,403 @@
+# app_index.py
+# Installed-application index: per-OS scanners fill a name -> launch target map, refreshed in the background
+import collections
+import concurrent.futures
+import configparser
+import logging
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+APP_INDEX_REFRESH = float(os.environ.get("APP_INDEX_REFRESH", "300"))  # seconds between rescans; 0 = scan once
+APP_LAUNCH_WORKERS = int(os.environ.get("APP_LAUNCH_WORKERS", "2"))
+# PATH holds every system binary (reboot, shutdown, rm), so only these names are indexed from it; the
+# server adds the executables its commands name via allow_path_executables()
+APP_PATH_ALLOWLIST = {n.strip() for n in os.environ.get("APP_PATH_ALLOWLIST", "").split(",") if n.strip()}
+
+# argv is exec'd directly (never through a shell); `startfile` targets (.lnk shortcuts) go to os.startfile
+LaunchTarget = collections.namedtuple("LaunchTarget", ["name", "argv", "source", "startfile"])
+
+_SUFFIXES = re.compile(r'\.(exe|lnk|app|desktop|appimage)$')
+_FIELD_CODE = re.compile(r'^%[a-zA-Z]$')  # .desktop Exec placeholders: %f %U %i ...
+
+
+def normalize(name: str) -> str:
+    """Lookup key: "Google Chrome.lnk" -> "google chrome", "CALC.EXE" -> "calc"."""
+    return _SUFFIXES.sub('', re.sub(r'\s+', ' ', name.lower()).strip())
+
+
+def _is_executable(path: str) -> bool:
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+_path_allowed = {normalize(n) for n in APP_PATH_ALLOWLIST}
+
+
+def allow_path_executables(names):
+    """Let these executables be launched from PATH (or by absolute path). Call before the first scan."""
+    for name in names:
+        if name:
+            _path_allowed.add(normalize(name))
+            if os.path.isabs(name):
+                _path_allowed.add(normalize(os.path.basename(name)))
+
+
+def path_allowed(name: str) -> bool:
+    return normalize(name) in _path_allowed
+
+
+class AppScanner:
+    """One source of installed apps. `roots()` lists directories (or other keys) to scan; `scan(root)`
+    yields (names, LaunchTarget) for one of them.
+
+    The index re-runs `scan(root)` only when `mtime(root)` changes, so a refresh costs one stat per
+    root unless something was installed or removed. Return None from `mtime` to rescan every time.
+    """
+
+    name = "scanner"
+
+    def roots(self):
+        return []
+
+    def mtime(self, root):
+        try:
+            return os.stat(root).st_mtime_ns
+        except OSError:
+            return -1
+
+    def scan(self, root):
+        return []
+
+
+class PathScanner(AppScanner):
+    """Allowlisted executables on PATH (PATHEXT extensions on Windows); see allow_path_executables()."""
+
+    name = "path"
+
+    def roots(self):
+        return list(dict.fromkeys(p for p in os.environ.get("PATH", "").split(os.pathsep) if p))
+
+    def scan(self, root):
+        exts = [e.lower() for e in os.environ.get("PATHEXT", ".EXE;.BAT;.CMD").split(";") if e] \
+            if sys.platform == "win32" else None
+        try:
+            entries = list(os.scandir(root))
+        except OSError:
+            return
+        for entry in entries:
+            # Only Windows names carry an extension; "python3.11-config" is not "python3"
+            stem, ext = os.path.splitext(entry.name) if exts is not None else (entry.name, "")
+            if exts is not None:
+                if ext.lower() not in exts:
+                    continue
+                if ext.lower() in (".bat", ".cmd"):
+                    continue  # batch files need cmd.exe
+            elif not _is_executable(entry.path):
+                continue
+            if not path_allowed(stem):
+                continue
+            yield [entry.name, stem], LaunchTarget(stem, [entry.path], self.name, False)
+
+
+class DesktopEntryScanner(AppScanner):
+    """freedesktop.org `.desktop` launchers under $XDG_DATA_HOME and $XDG_DATA_DIRS."""
+
+    name = "desktop"
+
+    def roots(self):
+        home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+        dirs = [home] + dirs.split(":") + ["/var/lib/flatpak/exports/share",
+                                           os.path.expanduser("~/.local/share/flatpak/exports/share")]
+        return [os.path.join(d, "applications") for d in dict.fromkeys(dirs) if d]
+
+    def scan(self, root):
+        try:
+            paths = [e.path for e in os.scandir(root) if e.name.endswith(".desktop")]
+        except OSError:
+            return
+        for path in paths:
+            parsed = self._parse(path)
+            if parsed:
+                yield parsed
+
+    def _parse(self, path):
+        config = configparser.ConfigParser(interpolation=None, strict=False)
+        config.optionxform = str
+        try:
+            config.read(path, encoding="utf-8")
+            entry = config["Desktop Entry"]
+        except (configparser.Error, KeyError, UnicodeDecodeError):
+            return None
+        if entry.get("Type", "Application") != "Application" or "Exec" not in entry:
+            return None
+        if entry.get("Hidden", "").lower() == "true" or entry.get("NoDisplay", "").lower() == "true":
+            return None
+        if entry.get("TryExec") and not shutil.which(entry["TryExec"]):
+            return None
+        try:
+            argv = [arg.replace("%%", "%") for arg in shlex.split(entry["Exec"]) if not _FIELD_CODE.match(arg)]
+        except ValueError:
+            return None
+        executable = argv and (argv[0] if os.path.isabs(argv[0]) else shutil.which(argv[0]))
+        if not executable:
+            return None
+        argv[0] = executable
+        desktop_id = os.path.basename(path)[:-len(".desktop")]
+        names = [entry.get("Name", ""), desktop_id, desktop_id.rsplit(".", 1)[-1]]
+        return [n for n in names if n], LaunchTarget(entry.get("Name") or desktop_id, argv, self.name, False)
+
+
+class MacAppScanner(AppScanner):
+    """`.app` bundles in /Applications and ~/Applications, opened with open(1)."""
+
+    name = "mac_apps"
+
+    def roots(self):
+        return ["/Applications", "/System/Applications", "/System/Applications/Utilities",
+                os.path.expanduser("~/Applications")]
+
+    def scan(self, root):
+        try:
+            bundles = [e for e in os.scandir(root) if e.name.endswith(".app")]
+        except OSError:
+            return
+        for bundle in bundles:
+            stem = bundle.name[:-len(".app")]
+            yield [stem], LaunchTarget(stem, ["/usr/bin/open", "-a", bundle.path], self.name, False)
+
+
+class StartMenuScanner(AppScanner):
+    """Start Menu shortcuts (.lnk), launched through os.startfile since they are not executables."""
+
+    name = "start_menu"
+
+    def roots(self):
+        bases = [os.environ.get("ProgramData"), os.environ.get("APPDATA")]
+        return [os.path.join(b, "Microsoft", "Windows", "Start Menu", "Programs") for b in bases if b]
+
+    def mtime(self, root):
+        return None  # shortcuts live in nested folders whose changes don't touch the root's mtime
+
+    def scan(self, root):
+        for dirpath, _, files in os.walk(root):
+            for file in files:
+                if file.lower().endswith(".lnk"):
+                    stem = file[:-len(".lnk")]
+                    yield [stem], LaunchTarget(stem, [os.path.join(dirpath, file)], self.name, True)
+
+
+class AppPathsScanner(AppScanner):
+    """HKLM/HKCU ...\\App Paths: what `start chrome` consults to find chrome.exe, msedge.exe, winword.exe."""
+
+    name = "app_paths"
+    KEY = r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths"
+
+    def roots(self):
+        return ["HKEY_LOCAL_MACHINE", "HKEY_CURRENT_USER"]
+
+    def mtime(self, root):
+        return None  # registry reads are cheap; rescan every refresh
+
+    def scan(self, root):
+        import winreg
+        try:
+            key = winreg.OpenKey(getattr(winreg, root), self.KEY)
+        except OSError:
+            return
+        with key:
+            for i in range(winreg.QueryInfoKey(key)[0]):
+                exe = winreg.EnumKey(key, i)
+                try:
+                    path = winreg.QueryValue(key, exe).strip('"')
+                except OSError:
+                    continue
+                path = os.path.expandvars(path)
+                if os.path.isfile(path):
+                    stem = os.path.splitext(exe)[0]
+                    yield [exe, stem], LaunchTarget(stem, [path], self.name, False)
+
+
+# Scanners per platform, in priority order: when two sources claim a name, the first one wins.
+# Add one with register_scanner("linux", MyScanner()).
+SCANNERS = {
+    "linux": [DesktopEntryScanner(), PathScanner()],
+    "darwin": [MacAppScanner(), PathScanner()],
+    "win32": [AppPathsScanner(), StartMenuScanner(), PathScanner()],
+}
+
+
+def platform_key() -> str:
+    if sys.platform in ("win32", "darwin"):
+        return sys.platform
+    return "linux"  # other Unixes follow the same XDG layout
+
+
+def register_scanner(platform: str, scanner: AppScanner, first: bool = False):
+    scanners = SCANNERS.setdefault(platform, [])
+    if first:
+        scanners.insert(0, scanner)
+    else:
+        scanners.append(scanner)
+
+
+class AppIndex:
+    """Installed apps by spoken/file name, scanned once at start and refreshed incrementally.
+
+    `lookup()` is a dict get and never waits: until the first scan finishes it misses and `ready` is
+    False, so callers can answer "retry" instead of "not installed". Every `refresh_seconds` the background thread stats each scanner root
+    and re-scans only the ones that changed, then swaps in a rebuilt map. `launch()` execs the target
+    on a small executor and returns at once; a launch that fails drops the entry and schedules a rescan.
+    """
+
+    def __init__(self, scanners=None, refresh_seconds: float = APP_INDEX_REFRESH,
+                 launch_workers: int = APP_LAUNCH_WORKERS):
+        self.scanners = list(SCANNERS.get(platform_key(), []) if scanners is None else scanners)
+        self.refresh_seconds = refresh_seconds
+        self._apps = {}
+        self._roots = {}  # (scanner name, root) -> (mtime, [(names, target)])
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._children = []
+        self._launcher = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, launch_workers),
+                                                               thread_name_prefix="app-launch")
+        self.stats = {"scans": 0, "roots_scanned": 0, "roots_reused": 0, "last_scan_ms": 0.0,
+                      "lookups": 0, "misses": 0, "launches": 0, "launch_failures": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="app-index", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logging.exception("app index refresh failed")
+            finally:
+                self._ready.set()
+            # Periodic rescans, or only on request_refresh() when APP_INDEX_REFRESH=0
+            self._wake.wait(self.refresh_seconds if self.refresh_seconds > 0 else None)
+            self._wake.clear()
+
+    def refresh(self):
+        """Re-scan roots whose mtime changed and rebuild the lookup map. Returns the number of apps."""
+        started = time.perf_counter()
+        scanned = reused = 0
+        roots = {}
+        apps = {}
+        for scanner in self.scanners:
+            try:
+                scanner_roots = scanner.roots()
+            except Exception:
+                logging.exception("app scanner %s failed to list roots", scanner.name)
+                continue
+            for root in scanner_roots:
+                key = (scanner.name, root)
+                mtime = scanner.mtime(root)
+                cached = self._roots.get(key)
+                if mtime is not None and cached is not None and cached[0] == mtime:
+                    entries = cached[1]
+                    reused += 1
+                else:
+                    try:
+                        entries = list(scanner.scan(root))
+                    except Exception:
+                        logging.exception("app scanner %s failed on %s", scanner.name, root)
+                        entries = []
+                    scanned += 1
+                roots[key] = (mtime, entries)
+                for names, target in entries:
+                    for name in names:
+                        apps.setdefault(normalize(name), target)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._roots = roots
+            self._apps = apps
+            self.stats["scans"] += 1
+            self.stats["roots_scanned"] += scanned
+            self.stats["roots_reused"] += reused
+            self.stats["last_scan_ms"] = round(elapsed_ms, 1)
+        logging.info("App index: %d names from %d roots (%d rescanned) in %.0f ms",
+                     len(apps), len(roots), scanned, elapsed_ms)
+        return len(apps)
+
+    def request_refresh(self):
+        """Wake the background thread for an immediate incremental rescan."""
+        self._wake.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def lookup(self, *names):
+        """First LaunchTarget matching any of `names`, or None."""
+        return self.match(*names)[1]
+
+    def match(self, *names):
+        """(name, LaunchTarget) for the first of `names` that is indexed, else (None, None).
+
+        An allowlisted absolute path to an executable matches itself.
+        """
+        apps = self._apps
+        with self._lock:
+            self.stats["lookups"] += 1
+        for name in names:
+            if not name:
+                continue
+            target = apps.get(normalize(name))
+            if target is not None:
+                return name, target
+            if os.path.isabs(name) and path_allowed(name) and os.path.isfile(name):
+                return name, LaunchTarget(os.path.basename(name), [name], "path", False)
+        with self._lock:
+            self.stats["misses"] += 1
+        return None, None
+
+    def launch(self, target: LaunchTarget) -> concurrent.futures.Future:
+        """Start `target` on the launch executor; the returned future resolves to the child's pid (or None)."""
+        return self._launcher.submit(self._spawn, target)
+
+    def _spawn(self, target):
+        # Reap children that already exited so they don't linger as zombies
+        self._children = [p for p in self._children if p.poll() is None]
+        try:
+            if target.startfile:
+                os.startfile(target.argv[0])
+                pid = None
+            else:
+                kwargs = {"start_new_session": True} if os.name == "posix" else \
+                    {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+                proc = subprocess.Popen(target.argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL, close_fds=True, **kwargs)
+                self._children.append(proc)
+                pid = proc.pid
+        except OSError as exc:
+            with self._lock:
+                self.stats["launch_failures"] += 1
+                self._apps = {k: v for k, v in self._apps.items() if v != target}
+            logging.warning("Launching %s (%s) failed: %s", target.name, target.argv[0], exc)
+            self.request_refresh()
+            raise
+        with self._lock:
+            self.stats["launches"] += 1
+        logging.info("Launched %s: %s (pid %s)", target.name, target.argv[0], pid)
+        return pid
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats, apps=len(self._apps), roots=len(self._roots), ready=self._ready.is_set(),
+                        platform=platform_key(), scanners=[s.name for s in self.scanners])
+
+
+APP_INDEX = AppIndex()
@@ -0,0 +1,348 @@
+# asgi_app.py
+# Production ASGI entry point: async /transcribe and /api/execute, every other route served by the Flask app
+#
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 5000      (or: python asgi_app.py)
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import tempfile
+import time
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import server
+from audio_pipeline import SAMPLE_RATE
+from decoder_pool import DecodeError
+from llm_client import GEMINI_API_KEY, AsyncGeminiClient, httpx
+from log_setup import capped
+from metrics import (ENGINE_REJECTS, LLM_ERRORS, LLM_FIRST_TOKEN_SECONDS, REQUEST_SECONDS, REQUESTS, end_trace, stage,
+                     start_trace)
+from model_loader import EngineNotReady
+from profiler import PROFILER
+from profiles import get_profile
+from scheduler import EngineBusy
+from streaming import sse_event
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    WSGIMiddleware = None
+
+ASGI_HOST = os.environ.get("ASGI_HOST", "0.0.0.0")
+ASGI_PORT = int(os.environ.get("ASGI_PORT", "5000"))
+ASGI_WORKERS = int(os.environ.get("ASGI_WORKERS", "1"))  # each worker process loads its own model
+ASGI_MAX_INFERENCE = int(os.environ.get("ASGI_MAX_INFERENCE", "4"))  # clips decoded/transcribed at once
+ASGI_MAX_PENDING = int(os.environ.get("ASGI_MAX_PENDING", "32"))  # waiting for a slot before answering 429
+ASGI_MAX_LLM = int(os.environ.get("ASGI_MAX_LLM", "32"))  # concurrent Gemini calls
+UPLOAD_SPOOL_BYTES = 1024 * 1024  # raw bodies larger than this are buffered on disk, not in memory
+
+# Blocking work (ffmpeg, VAD, waiting on the engine) runs here; the event loop only awaits it
+INFERENCE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=ASGI_MAX_INFERENCE,
+                                                       thread_name_prefix="asgi-inference")
+
+_state = {"pending": 0, "llm": None}
+_llm_slots = asyncio.Semaphore(ASGI_MAX_LLM)
+
+
+def _busy():
+    return JSONResponse(server.BUSY_ERROR, status_code=429, headers={"Retry-After": "1"})
+
+
+async def _run_blocking(executor, fn, *args):
+    """run_in_executor that carries contextvars along, so stage() spans land in the request's trace."""
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(ctx.run, fn, *args))
+
+
+def _instrumented(endpoint):
+    """Request counters, latency histogram and trace for the async routes (Flask has its own hooks)."""
+    def wrap(handler):
+        @functools.wraps(handler)
+        async def timed(request):
+            started = time.perf_counter()
+            start_trace(endpoint, method=request.method)
+            status = 500  # unless the handler returns a response
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            finally:
+                REQUESTS.inc(endpoint=endpoint, status=status)
+                REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+                PROFILER.request_done()
+                end_trace(status=status)
+        return timed
+    return wrap
+
+
+def _decode_and_transcribe(body, content_type, profile):
+    """Runs on INFERENCE_POOL. Returns (transcript, speech_seconds); raises DecodeError."""
+    audio = server.decode_upload(body, content_type)
+    logging.debug("Decoded upload to %.2fs of PCM", len(audio) / SAMPLE_RATE)
+    return server.transcribe_speech(audio, profile)
+
+
+async def ask_gemini(question: str) -> str:
+    """Async counterpart of server.ask_gemini(): same "[Gemini ...]" strings on failure."""
+    if not GEMINI_API_KEY:
+        logging.error("GEMINI_API_KEY not set in environment or .env file.")
+        return "[Gemini API key not configured]"
+    try:
+        async with _llm_slots:
+            with stage("llm"):
+                if _state["llm"] is not None:
+                    return await _state["llm"].ask(question)
+                # No httpx: keep the blocking client off the event loop
+                return await _run_blocking(None, server.LLM.ask, question)
+    except Exception as e:
+        LLM_ERRORS.inc()
+        logging.error("Gemini request failed: %s", e)
+        return f"[Gemini error: {e}]"
+
+
+async def answer_transcript(transcript: str, execute: bool):
+    if not transcript or transcript.strip() == "":
+        return dict(server.NO_SPEECH_ERROR), 400
+    if execute:
+        payload = await _run_blocking(None, server.execute_transcript, transcript)
+        if payload is not None:
+            return payload, 200
+    answer = await ask_gemini(transcript)
+    return {"text": answer, "question": transcript}, 200
+
+
+async def ask_gemini_stream(question: str):
+    """Async counterpart of server.ask_gemini_stream()."""
+    if not GEMINI_API_KEY:
+        logging.error("GEMINI_API_KEY not set in environment or .env file.")
+        yield "[Gemini API key not configured]"
+        return
+    if _state["llm"] is None:
+        yield await ask_gemini(question)  # no httpx: the blocking client answers in one piece
+        return
+    started = time.perf_counter()
+    first = True
+    try:
+        async with _llm_slots:
+            pieces = _state["llm"].stream(question)
+            try:
+                async for piece in pieces:
+                    if first:
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                        first = False
+                    yield piece
+            finally:
+                await pieces.aclose()  # drops the upstream connection when the client disconnects
+    except Exception as e:
+        LLM_ERRORS.inc()
+        logging.error("Gemini stream failed: %s", e)
+        yield f"[Gemini error: {e}]"
+
+
+async def stream_answer(transcript: str, execute: bool, extra: dict):
+    """Async counterpart of server.stream_answer(): "transcript", "token"..., "final" events."""
+    yield sse_event("transcript", dict(extra, question=transcript))
+    payload = await _run_blocking(None, server.execute_transcript, transcript) if execute else None
+    if payload is None:
+        pieces = []
+        async for piece in ask_gemini_stream(transcript):
+            pieces.append(piece)
+            yield sse_event("token", {"text": piece})
+        payload = {"text": "".join(pieces), "question": transcript}
+    payload.update(extra)
+    yield sse_event("final", payload)
+
+
+def _wants_execute(request, form=None) -> bool:
+    value = request.query_params.get("execute")
+    if value is None and form is not None:
+        value = form.get("execute")
+    if value is None:
+        return server.FUSED_EXECUTE
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def _wants_stream(request, form=None) -> bool:
+    value = request.query_params.get("stream")
+    if value is None and form is not None:
+        value = form.get("stream")
+    if value is None:
+        return "text/event-stream" in request.headers.get("accept", "")
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def _profile(request, form=None):
+    """Same lookup as server.request_profile(); raises KeyError for unknown names."""
+    name = request.query_params.get("profile")
+    if name is None and form is not None:
+        name = form.get("profile")
+    return get_profile(name or request.headers.get("x-transcribe-profile"))
+
+
+async def _spool_body(request):
+    """Copy the request body into a temp file (in memory up to UPLOAD_SPOOL_BYTES) while enforcing
+    server.MAX_UPLOAD_BYTES, so a large or endless body never sits in memory. Returns (file, size)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > server.MAX_UPLOAD_BYTES:
+            spool.close()
+            raise DecodeError("too_large", f"upload exceeds {server.MAX_UPLOAD_BYTES} bytes")
+        spool.write(chunk)
+    spool.seek(0)
+    return spool, size
+
+
+def _upload_error(exc: DecodeError):
+    payload, status, headers = server.decode_error_response(exc)
+    return JSONResponse(payload, status_code=status, headers=headers)
+
+
+@_instrumented("/transcribe")
+async def transcribe(request):
+    # Reject from Content-Length before reading any of the body
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > server.MAX_UPLOAD_BYTES:
+        return _upload_error(DecodeError("too_large", f"upload exceeds {server.MAX_UPLOAD_BYTES} bytes"))
+    form = None
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()  # starlette spools file parts to temp files
+            upload = form.get("file")
+            body, size = (upload.file, upload.size) if hasattr(upload, "file") else (None, 0)
+            content_type = getattr(upload, "content_type", None)
+            if size and size > server.MAX_UPLOAD_BYTES:
+                raise DecodeError("too_large", f"upload exceeds {server.MAX_UPLOAD_BYTES} bytes")
+        else:
+            body, size = await _spool_body(request)
+            content_type = request.headers.get("content-type")
+    except DecodeError as exc:
+        return _upload_error(exc)
+    try:
+        return await _transcribe_upload(request, form, body, size, content_type)
+    finally:
+        if body is not None:
+            body.close()
+
+
+async def _transcribe_upload(request, form, body, size, content_type):
+    if not size:
+        return JSONResponse({"error": "no file provided"}, status_code=400)
+    if size < 100:
+        return JSONResponse({"error": "uploaded file is too small or empty"}, status_code=400)
+    try:
+        profile = _profile(request, form)
+    except KeyError:
+        return JSONResponse(server.unknown_profile_error(), status_code=400)
+    logging.info("POST /transcribe: %d bytes from %s", size, request.client.host if request.client else "-",
+                 extra={"endpoint": "/transcribe", "bytes": size})
+
+    # Backpressure: bounded number of clips in (or waiting for) the inference pool
+    if _state["pending"] >= ASGI_MAX_INFERENCE + ASGI_MAX_PENDING:
+        logging.warning("Rejecting /transcribe: %d clips already pending", _state["pending"])
+        return _busy()
+    _state["pending"] += 1
+    try:
+        transcript, speech_seconds = await _run_blocking(INFERENCE_POOL, _decode_and_transcribe, body, content_type, profile)
+    except DecodeError as exc:
+        return _upload_error(exc)
+    except EngineBusy as exc:
+        ENGINE_REJECTS.inc(reason="busy")
+        logging.warning("Rejecting /transcribe: %s", exc)
+        return _busy()
+    except EngineNotReady as exc:
+        ENGINE_REJECTS.inc(reason="not_ready")
+        logging.warning("Rejecting /transcribe: %s", exc)
+        return JSONResponse(dict(server.NOT_READY_ERROR, state=server.LOADER.state), status_code=503,
+                            headers={"Retry-After": "2"})
+    except Exception as exc:
+        logging.exception("transcribe handler error")
+        return JSONResponse({"error": str(exc)}, status_code=500)
+    finally:
+        _state["pending"] -= 1
+
+    if speech_seconds == 0.0:
+        return JSONResponse(dict(server.NO_SPEECH_ERROR, speech_duration=0.0), status_code=400)
+    if transcript.strip() and _wants_stream(request, form):
+        extra = {"speech_duration": round(speech_seconds, 2), "profile": profile.name}
+        return StreamingResponse(stream_answer(transcript, _wants_execute(request, form), extra),
+                                 media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    payload, status = await answer_transcript(transcript, _wants_execute(request, form))
+    payload["speech_duration"] = round(speech_seconds, 2)
+    payload["profile"] = profile.name
+    return JSONResponse(payload, status_code=status)
+
+
+@_instrumented("/api/execute")
+async def execute_command(request):
+    try:
+        data = await request.json()
+    except Exception:
+        data = None
+    if not isinstance(data, dict) or not isinstance(data.get('text'), str):
+        return JSONResponse({"status": "error", "message": "Missing 'text' field"}, status_code=400)
+    text = data['text'].strip()
+    parsed = server.parse_command(text)
+    logging.info("POST /api/execute: %r -> %s (%s)", capped(text, 200), parsed["type"], parsed.get("match"),
+                 extra={"endpoint": "/api/execute"})
+    try:
+        payload, status = await _run_blocking(None, server.run_command, parsed, text)
+    except Exception as e:
+        logging.exception("Error in execute_command")
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+    return JSONResponse(payload, status_code=status)
+
+
+async def llm_stats(request):
+    client = _state["llm"] if _state["llm"] is not None else server.LLM
+    return JSONResponse(client.snapshot())
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    server.start_background()  # a no-op unless this is a spawned uvicorn worker
+    if httpx is not None:
+        _state["llm"] = AsyncGeminiClient()
+    else:
+        logging.warning("httpx not installed; Gemini calls will use the blocking client in a thread")
+    logging.info("ASGI server ready (inference slots=%d, queue=%d, llm=%d)", ASGI_MAX_INFERENCE, ASGI_MAX_PENDING, ASGI_MAX_LLM)
+    yield
+    if _state["llm"] is not None:
+        await _state["llm"].aclose()
+    INFERENCE_POOL.shutdown(wait=False)
+
+
+routes = [
+    Route("/transcribe", transcribe, methods=["POST"]),
+    Route("/api/execute", execute_command, methods=["POST"]),
+    Route("/llm/stats", llm_stats, methods=["GET"]),
+]
+if WSGIMiddleware is not None:
+    # Streaming, stats and any other Flask routes keep working on the same port
+    routes.append(Mount("/", app=WSGIMiddleware(server.app)))
+else:
+    logging.warning("a2wsgi not installed; only /transcribe and /api/execute are served")
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    if ASGI_WORKERS > 1:
+        uvicorn.run("asgi_app:app", host=ASGI_HOST, port=ASGI_PORT, workers=ASGI_WORKERS)
+    else:
+        uvicorn.run(app, host=ASGI_HOST, port=ASGI_PORT)
@@ -0,0 +1,328 @@
+# asr_backends.py
+# Pluggable transcription engines: openai-whisper (PyTorch), faster-whisper (CTranslate2) and a test stub
+import importlib.util
+import logging
+import os
+import time
+
+import numpy as np
+
+from audio_pipeline import SAMPLE_RATE
+
+# Engines are imported when a backend is constructed; importing them here would put
+# torch / CTranslate2 start-up on the server's critical path.
+HAVE_FAST_WHISPER = importlib.util.find_spec("faster_whisper") is not None
+
+# Configuration
+WHISPER_BACKEND = os.environ.get("WHISPER_BACKEND", "auto")  # auto | openai | faster | stub
+WHISPER_COMPUTE_TYPE = os.environ.get("WHISPER_COMPUTE_TYPE")  # e.g. int8, float32, float16 (default per device)
+WHISPER_THREADS = int(os.environ.get("WHISPER_THREADS", "0"))  # 0 = library default
+
+BATCH_MAX_SECONDS = 30.0  # one Whisper window; longer clips go through the sequential path
+
+
+def detect_device() -> str:
+    """Return "cuda" if a GPU is usable by torch or CTranslate2, else "cpu"."""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return "cuda"
+    except Exception:
+        pass
+    try:
+        import ctranslate2
+        if ctranslate2.get_cuda_device_count() > 0:
+            return "cuda"
+    except Exception:
+        pass
+    return "cpu"
+
+
+class ASRBackend:
+    """Common interface for transcription engines.
+
+    `transcribe()` accepts a 16kHz mono float32 array (or a file path) plus openai-whisper
+    style keyword options and returns an openai-whisper shaped result dict:
+    {"text": str, "language": str, "segments": [{"text", "avg_logprob", "no_speech_prob", ...}]}.
+    """
+
+    name = "base"
+    default_compute_type = "float32"
+
+    def __init__(self, model_name: str, device: str = "cpu", compute_type: str = None, threads: int = 0):
+        self.model_name = model_name
+        self.device = device
+        self.compute_type = compute_type or self.default_compute_type
+        self.threads = threads
+
+    def transcribe(self, audio, **options) -> dict:
+        raise NotImplementedError
+
+    def transcribe_batch(self, audios, **options) -> list:
+        """Transcribe several clips that share the same options.
+
+        Clips that fit in one 30s window are run through a single batched encoder/decoder
+        pass when the engine supports it; anything else falls back to per-clip transcribe().
+        """
+        if len(audios) > 1 and self.can_batch(audios, options):
+            try:
+                results = self._decode_batch(audios, options)
+            except Exception:
+                logging.exception(f"{self.name} batched decode failed; decoding clips one by one")
+            else:
+                # None marks a clip whose greedy result needs the temperature fallback
+                return [r if r is not None else self.transcribe(a, **options) for a, r in zip(audios, results)]
+        return [self.transcribe(a, **options) for a in audios]
+
+    def can_batch(self, audios, options) -> bool:
+        if not hasattr(self, "_decode_batch"):
+            return False
+        # Word alignment and language detection are per-clip features (a shared prompt is fine)
+        if options.get("word_timestamps") or not options.get("language"):
+            return False
+        return all(not isinstance(a, str) and len(a) <= BATCH_MAX_SECONDS * SAMPLE_RATE for a in audios)
+
+    @staticmethod
+    def _batch_result(text, avg_logprob, no_speech_prob, compression_ratio, temperature, duration, options):
+        """Apply transcribe()'s thresholds to one greedy batch result; None means "needs fallback"."""
+        logprob_threshold = options.get("logprob_threshold")
+        no_speech_threshold = options.get("no_speech_threshold")
+        ratio_threshold = options.get("compression_ratio_threshold")
+        temperatures = options.get("temperature", 0.0)
+        can_fall_back = isinstance(temperatures, (list, tuple)) and len(temperatures) > 1
+
+        if no_speech_threshold is not None and no_speech_prob > no_speech_threshold:
+            if logprob_threshold is None or avg_logprob < logprob_threshold:
+                return {"text": "", "segments": [], "language": options.get("language")}
+        if can_fall_back:
+            if ratio_threshold is not None and compression_ratio > ratio_threshold:
+                return None
+            if logprob_threshold is not None and avg_logprob < logprob_threshold:
+                return None
+        segment = {
+            "id": 0, "seek": 0, "start": 0.0, "end": duration, "text": text,
+            "temperature": temperature, "avg_logprob": avg_logprob,
+            "compression_ratio": compression_ratio, "no_speech_prob": no_speech_prob,
+        }
+        return {"text": text, "segments": [segment], "language": options.get("language")}
+
+    def describe(self) -> dict:
+        return {
+            "engine": self.name,
+            "model": self.model_name,
+            "device": self.device,
+            "compute_type": self.compute_type,
+            "threads": self.threads,
+        }
+
+
+class OpenAIWhisperBackend(ASRBackend):
+    """Reference PyTorch implementation (openai-whisper)."""
+
+    name = "openai"
+
+    def __init__(self, model_name, device="cpu", compute_type=None, threads=0):
+        if compute_type is None:
+            compute_type = "float16" if device == "cuda" else "float32"
+        super().__init__(model_name, device, compute_type, threads)
+        import whisper
+        import torch
+        if threads:
+            torch.set_num_threads(threads)
+        try:
+            self.model = whisper.load_model(model_name, device=device)
+        except Exception:
+            logging.exception("Failed to load model with device hint; falling back to default load")
+            self.model = whisper.load_model(model_name)
+
+    def transcribe(self, audio, **options) -> dict:
+        options.setdefault("fp16", self.compute_type == "float16")
+        return self.model.transcribe(audio, **options)
+
+    def _decode_batch(self, audios, options):
+        import whisper
+        import torch
+        n_mels = self.model.dims.n_mels
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(np.asarray(a, dtype=np.float32)), n_mels=n_mels)
+            for a in audios
+        ]).to(self.model.device)
+        temperatures = options.get("temperature", 0.0)
+        temperature = temperatures[0] if isinstance(temperatures, (list, tuple)) else temperatures
+        decode_options = whisper.DecodingOptions(
+            task=options.get("task", "transcribe"),
+            language=options.get("language"),
+            temperature=temperature,
+            without_timestamps=True,
+            prompt=options.get("initial_prompt"),
+            sample_len=options.get("sample_len"),
+            fp16=options.get("fp16", self.compute_type == "float16"),
+        )
+        with torch.no_grad():
+            results = self.model.decode(mel, decode_options)
+        return [
+            self._batch_result(r.text, r.avg_logprob, r.no_speech_prob, r.compression_ratio,
+                               temperature, len(a) / SAMPLE_RATE, options)
+            for a, r in zip(audios, results)
+        ]
+
+
+class FasterWhisperBackend(ASRBackend):
+    """CTranslate2 implementation (faster-whisper); int8 on CPU is the fast path."""
+
+    name = "faster"
+
+    # openai-whisper option names that are spelled differently in faster-whisper
+    OPTION_ALIASES = {"logprob_threshold": "log_prob_threshold", "sample_len": "max_new_tokens"}
+    # openai-whisper options with no faster-whisper equivalent
+    DROPPED_OPTIONS = {"verbose", "fp16"}
+
+    def __init__(self, model_name, device="cpu", compute_type=None, threads=0):
+        if not HAVE_FAST_WHISPER:
+            raise RuntimeError("faster-whisper is not installed")
+        if compute_type is None:
+            compute_type = "float16" if device == "cuda" else "int8"
+        super().__init__(model_name, device, compute_type, threads)
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_name, device=device, compute_type=compute_type, cpu_threads=threads)
+        self._prompt_tokens = {}  # initial_prompt text -> token ids; the command prompt is the same every call
+
+    def prompt_tokens(self, prompt: str) -> list:
+        """Token ids for an initial prompt, tokenized once (faster-whisper accepts ids in place of text)."""
+        tokens = self._prompt_tokens.get(prompt)
+        if tokens is None:
+            # Same encoding faster-whisper applies to a text prompt
+            tokens = self.model.hf_tokenizer.encode(" " + prompt.strip(), add_special_tokens=False).ids
+            if len(self._prompt_tokens) < 64:
+                self._prompt_tokens[prompt] = tokens
+        return tokens
+
+    def transcribe(self, audio, **options) -> dict:
+        kwargs = {}
+        for key, value in options.items():
+            if key in self.DROPPED_OPTIONS:
+                continue
+            kwargs[self.OPTION_ALIASES.get(key, key)] = value
+        if isinstance(kwargs.get("initial_prompt"), str):
+            kwargs["initial_prompt"] = self.prompt_tokens(kwargs["initial_prompt"])
+        # openai-whisper decodes greedily unless a beam size is given; keep parity
+        kwargs.setdefault("beam_size", 1)
+        segments, info = self.model.transcribe(audio, **kwargs)
+        result_segments = []
+        for seg in segments:  # generator: decoding happens while iterating
+            entry = {
+                "id": seg.id,
+                "seek": seg.seek,
+                "start": seg.start,
+                "end": seg.end,
+                "text": seg.text,
+                "tokens": list(seg.tokens),
+                "temperature": seg.temperature,
+                "avg_logprob": seg.avg_logprob,
+                "compression_ratio": seg.compression_ratio,
+                "no_speech_prob": seg.no_speech_prob,
+            }
+            if seg.words:
+                entry["words"] = [
+                    {"word": w.word, "start": w.start, "end": w.end, "probability": w.probability}
+                    for w in seg.words
+                ]
+            result_segments.append(entry)
+        return {
+            "text": "".join(s["text"] for s in result_segments),
+            "segments": result_segments,
+            "language": info.language,
+        }
+
+    def _decode_batch(self, audios, options):
+        from faster_whisper.audio import pad_or_trim
+        from faster_whisper.tokenizer import Tokenizer
+        from faster_whisper.transcribe import get_compression_ratio, get_suppressed_tokens
+        features = np.stack([
+            pad_or_trim(self.model.feature_extractor(np.asarray(a, dtype=np.float32))[..., :-1])
+            for a in audios
+        ])
+        tokenizer = Tokenizer(
+            self.model.hf_tokenizer,
+            self.model.model.is_multilingual,
+            task=options.get("task", "transcribe"),
+            language=options.get("language"),
+        )
+        previous = self.prompt_tokens(options["initial_prompt"]) if options.get("initial_prompt") else []
+        prompt = self.model.get_prompt(tokenizer, previous, without_timestamps=True)
+        max_length = self.model.max_length
+        if options.get("sample_len"):
+            max_length = min(max_length, len(prompt) + options["sample_len"])
+        temperatures = options.get("temperature", 0.0)
+        temperature = temperatures[0] if isinstance(temperatures, (list, tuple)) else temperatures
+        encoder_output = self.model.encode(features)
+        results = self.model.model.generate(
+            encoder_output,
+            [list(prompt) for _ in audios],
+            beam_size=options.get("beam_size", 1),
+            max_length=max_length,
+            return_scores=True,
+            return_no_speech_prob=True,
+            suppress_blank=True,
+            suppress_tokens=get_suppressed_tokens(tokenizer, [-1]),
+            sampling_temperature=temperature or 1.0,
+        )
+        outputs = []
+        for audio, result in zip(audios, results):
+            tokens = result.sequences_ids[0]
+            # Recover the average log prob from the length-normalised score (length_penalty=1)
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            text = tokenizer.decode(tokens)
+            outputs.append(self._batch_result(
+                text, avg_logprob, result.no_speech_prob, get_compression_ratio(text.strip()),
+                temperature, len(audio) / SAMPLE_RATE, options,
+            ))
+        return outputs
+
+
+class StubBackend(ASRBackend):
+    """Deterministic fake engine for tests and benchmarks; never touches a model."""
+
+    name = "stub"
+    default_compute_type = "none"
+
+    def __init__(self, model_name, device="cpu", compute_type=None, threads=0):
+        super().__init__(model_name, device, compute_type, threads)
+        self.text = os.environ.get("WHISPER_STUB_TEXT", "open notepad")
+        self.delay = float(os.environ.get("WHISPER_STUB_DELAY", "0"))
+
+    def transcribe(self, audio, **options) -> dict:
+        if self.delay:
+            time.sleep(self.delay)
+        return {
+            "text": f" {self.text}",
+            "segments": [{
+                "id": 0, "start": 0.0, "end": 1.0, "text": f" {self.text}",
+                "avg_logprob": -0.1, "compression_ratio": 1.0, "no_speech_prob": 0.01,
+            }],
+            "language": options.get("language") or "en",
+        }
+
+
+BACKENDS = {
+    "openai": OpenAIWhisperBackend,
+    "faster": FasterWhisperBackend,
+    "stub": StubBackend,
+}
+
+
+def load_backend(name: str = None, model_name: str = "tiny", device: str = None,
+                 compute_type: str = None, threads: int = None) -> ASRBackend:
+    """Instantiate the configured engine. "auto" prefers faster-whisper when it is installed."""
+    name = (name or WHISPER_BACKEND).lower()
+    if name == "auto":
+        name = "faster" if HAVE_FAST_WHISPER else "openai"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown WHISPER_BACKEND '{name}' (expected one of: auto, {', '.join(BACKENDS)})")
+    device = device or ("cpu" if name == "stub" else detect_device())  # probing imports torch
+    compute_type = compute_type or WHISPER_COMPUTE_TYPE
+    threads = WHISPER_THREADS if threads is None else threads
+    started = time.perf_counter()
+    backend = BACKENDS[name](model_name, device=device, compute_type=compute_type, threads=threads)
+    logging.info(f"Loaded ASR backend {backend.describe()} in {time.perf_counter() - started:.2f}s")
+    return backend
@@ -0,0 +1,215 @@
+# audio_pipeline.py
+# In-memory audio decoding for the voice server: upload bytes -> ffmpeg (pipes) -> float32 PCM
+import logging
+import os
+import subprocess
+import threading
+
+import numpy as np
+
+SAMPLE_RATE = 16000  # Whisper expects 16kHz mono
+FFMPEG_BIN = os.environ.get("FFMPEG_BIN", "ffmpeg")
+DECODE_TIMEOUT = float(os.environ.get("FFMPEG_TIMEOUT", "30"))
+
+
+def ffmpeg_pcm_command(sample_rate: int = SAMPLE_RATE, source: str = 'pipe:0'):
+    """ffmpeg argv that reads any container from stdin (or `source`) and writes mono s16le PCM to stdout."""
+    return [
+        FFMPEG_BIN, '-hide_banner', '-loglevel', 'error',
+        *(['-nostdin'] if source != 'pipe:0' else []),
+        '-i', source,
+        '-ar', str(sample_rate),  # 16kHz sample rate optimal for speech
+        '-ac', '1',               # Mono channel
+        '-acodec', 'pcm_s16le',   # 16-bit PCM encoding
+        '-f', 's16le',            # Raw samples, no container
+        'pipe:1',
+    ]
+
+
+def pcm16_to_float32(pcm: bytes) -> np.ndarray:
+    """Convert little-endian 16-bit PCM bytes to a float32 array in [-1, 1]."""
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def decode_audio_bytes(data: bytes, sample_rate: int = SAMPLE_RATE):
+    """Decode an encoded audio blob (webm/ogg/wav/...) to mono float32 PCM.
+
+    The bytes are piped into ffmpeg over stdin and raw PCM is read back from stdout,
+    so no temporary files are written. Returns None if ffmpeg fails or yields no audio.
+    """
+    if not data:
+        return None
+    try:
+        result = subprocess.run(
+            ffmpeg_pcm_command(sample_rate),
+            input=data,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=DECODE_TIMEOUT,
+        )
+    except Exception:
+        logging.exception("ffmpeg decode failed to run")
+        return None
+    if result.returncode != 0:
+        logging.warning(f"ffmpeg decode failed (exit {result.returncode}): {result.stderr.decode(errors='replace').strip()[-300:]}")
+        return None
+    if not result.stdout:
+        logging.warning("ffmpeg decode produced no audio samples")
+        return None
+    return pcm16_to_float32(result.stdout)
+
+
+class StreamDecoder:
+    """Incremental decoder: one long-lived ffmpeg process fed container chunks over stdin.
+
+    MediaRecorder chunks are not independently decodable (only the first carries the
+    webm header), so a streaming session keeps a single ffmpeg process open and a reader
+    thread accumulates the PCM it emits as more of the container arrives.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, max_seconds: float = None):
+        self.sample_rate = sample_rate
+        # Past this much PCM ffmpeg is killed and `overflowed` set, so a long stream cannot grow memory
+        self.max_bytes = int(max_seconds * sample_rate) * 2 if max_seconds else None
+        self.overflowed = False
+        self._pcm = bytearray()
+        self._stderr = bytearray()
+        self._lock = threading.Lock()
+        self.proc = subprocess.Popen(
+            ffmpeg_pcm_command(sample_rate),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+        self._err_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._err_reader.start()
+
+    def _read_stdout(self):
+        while True:
+            chunk = self.proc.stdout.read1(65536)
+            if not chunk:
+                break
+            with self._lock:
+                self._pcm.extend(chunk)
+                if self.max_bytes is not None and len(self._pcm) > self.max_bytes:
+                    del self._pcm[self.max_bytes:]
+                    self.overflowed = True
+            if self.overflowed:
+                self.proc.kill()
+                break
+
+    def _read_stderr(self):
+        for line in self.proc.stderr:
+            self._stderr.extend(line)
+
+    def feed(self, chunk: bytes) -> bool:
+        """Push more encoded bytes into the decoder. Returns False if ffmpeg has exited."""
+        try:
+            self.proc.stdin.write(chunk)
+            self.proc.stdin.flush()
+            return True
+        except (BrokenPipeError, ValueError, OSError):
+            logging.warning(f"stream decoder closed early: {self.error()}")
+            return False
+
+    @property
+    def seconds(self) -> float:
+        with self._lock:
+            return len(self._pcm) / 2 / self.sample_rate
+
+    def samples(self, last_seconds: float = None) -> np.ndarray:
+        """Float32 PCM decoded so far, optionally only the trailing `last_seconds`."""
+        with self._lock:
+            end = len(self._pcm) - len(self._pcm) % 2
+            start = 0
+            if last_seconds is not None:
+                start = max(0, end - int(last_seconds * self.sample_rate) * 2)
+            pcm = bytes(self._pcm[start:end])
+        return pcm16_to_float32(pcm)
+
+    def close(self, timeout: float = DECODE_TIMEOUT) -> np.ndarray:
+        """Signal end of input, wait for ffmpeg to flush and return all decoded PCM."""
+        try:
+            self.proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logging.warning("stream decoder did not exit in time; killing ffmpeg")
+            self.proc.kill()
+            self.proc.wait()
+        self._reader.join(timeout=1.0)
+        return self.samples()
+
+    def abort(self):
+        """Kill ffmpeg without waiting for remaining output."""
+        if self.proc.poll() is None:
+            self.proc.kill()
+        try:
+            self.proc.wait(timeout=1.0)
+        except Exception:
+            pass
+
+    def error(self) -> str:
+        return self._stderr.decode(errors='replace').strip()[-300:]
+
+
+# --- Voice activity detection: trim silence and reject no-speech clips before inference ---
+VAD_MODE = os.environ.get("VAD_MODE", "energy")  # energy | webrtc | off
+VAD_FRAME_MS = 30
+VAD_MIN_SPEECH_MS = float(os.environ.get("VAD_MIN_SPEECH_MS", "250"))  # less speech than this = reject
+VAD_PAD_MS = float(os.environ.get("VAD_PAD_MS", "200"))  # context kept around detected speech
+VAD_MARGIN_DB = float(os.environ.get("VAD_MARGIN_DB", "12"))  # speech must be this far above the noise floor
+VAD_FLOOR_DBFS = float(os.environ.get("VAD_FLOOR_DBFS", "-45"))  # and louder than this absolute level
+VAD_AGGRESSIVENESS = int(os.environ.get("VAD_AGGRESSIVENESS", "2"))  # webrtcvad mode 0-3
+
+try:
+    import webrtcvad
+except Exception:
+    webrtcvad = None
+
+
+def _energy_speech_frames(frames: np.ndarray) -> np.ndarray:
+    """Per-frame speech flags from RMS energy relative to the clip's own noise floor."""
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    db = 20 * np.log10(np.maximum(rms, 1e-10))
+    noise_floor = np.percentile(db, 10)
+    return db > max(noise_floor + VAD_MARGIN_DB, VAD_FLOOR_DBFS)
+
+
+def _webrtc_speech_frames(frames: np.ndarray, sample_rate: int) -> np.ndarray:
+    vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
+    pcm = (np.clip(frames, -1.0, 1.0) * 32767).astype(np.int16)
+    return np.array([vad.is_speech(f.tobytes(), sample_rate) for f in pcm], dtype=bool)
+
+
+def trim_silence(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, mode: str = None):
+    """Trim leading/trailing silence. Returns (trimmed_audio, speech_seconds).
+
+    A clip with less than VAD_MIN_SPEECH_MS of detected speech comes back empty with
+    speech_seconds == 0.0, so callers can reject it without running the model.
+    """
+    mode = (mode or VAD_MODE).lower()
+    if mode == "off" or len(audio) == 0:
+        return audio, len(audio) / sample_rate
+    frame_len = sample_rate * VAD_FRAME_MS // 1000
+    n_frames = len(audio) // frame_len
+    if n_frames == 0:
+        return audio[:0], 0.0
+    frames = audio[:n_frames * frame_len].reshape(n_frames, frame_len)
+    if mode == "webrtc" and webrtcvad is not None:
+        speech = _webrtc_speech_frames(frames, sample_rate)
+    else:
+        speech = _energy_speech_frames(frames)
+
+    speech_seconds = float(speech.sum()) * VAD_FRAME_MS / 1000.0
+    if speech_seconds * 1000.0 < VAD_MIN_SPEECH_MS:
+        return audio[:0], 0.0
+    idx = np.flatnonzero(speech)
+    pad = int(VAD_PAD_MS * sample_rate / 1000)
+    start = max(0, idx[0] * frame_len - pad)
+    end = min(len(audio), (idx[-1] + 1) * frame_len + pad)
+    return audio[start:end], speech_seconds
@@ -0,0 +1,196 @@
+# batch_transcribe.py
+# Offline re-transcription of audio corpora: parallel ffmpeg decode -> batched model -> JSONL, resumable
+#
+#   python batch_transcribe.py recordings/ -o results.jsonl              (directory, recursive)
+#   python batch_transcribe.py manifest.jsonl -o results.jsonl --llm     (manifest: {"path": ..., "id": ...} per line)
+import concurrent.futures
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+
+from audio_pipeline import SAMPLE_RATE
+from decoder_pool import DECODER, DecodeError, DecoderPool
+from scheduler import EngineBusy
+
+AUDIO_EXTENSIONS = {".wav", ".webm", ".ogg", ".opus", ".oga", ".mp3", ".m4a", ".mp4", ".aac", ".flac", ".wma"}
+BATCH_DECODE_WORKERS = int(os.environ.get("BATCH_DECODE_WORKERS", str(os.cpu_count() or 4)))  # parallel decodes
+BATCH_INFLIGHT = int(os.environ.get("BATCH_INFLIGHT", "16"))  # clips decoded or queued ahead of the model
+
+
+def iter_inputs(source: str):
+    """Yield (id, path) from a directory (recursive, audio extensions only) or a manifest file.
+
+    Manifests are JSONL ({"path": ..., "id": ...}; id defaults to the path) or plain text with one
+    path per line. Relative paths are resolved against the manifest's directory.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, source), path
+        return
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                path = entry["path"]
+                item_id = str(entry.get("id", path))
+            else:
+                path = item_id = line
+            yield item_id, path if os.path.isabs(path) else os.path.join(base, path)
+
+
+def load_done(output_path: str, retry_errors: bool = False) -> set:
+    """Ids that already have a result line in `output_path` (so an interrupted run can resume)."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by the interruption
+            if retry_errors and entry.get("error"):
+                continue
+            done.add(entry.get("id"))
+    return done
+
+
+def _decode(source, pool=DECODER):
+    if hasattr(source, "read"):
+        source = source.read()
+    return pool.decode(source)
+
+
+def transcribe_items(items, transcribe, annotate=None, decode=_decode, inflight: int = BATCH_INFLIGHT):
+    """Decode and transcribe (id, source) pairs; yields one result dict per item in completion order.
+
+    `source` is a path, bytes or a file-like object. `transcribe(audio)` returns (text, speech_seconds)
+    and `annotate(text)` (optional) returns extra fields for the result, e.g. an LLM answer.
+    Up to `inflight` clips are in progress at once, so concurrent calls reach the model's
+    micro-batcher together; `decode` (by default the shared DecoderPool) bounds decoding itself.
+    """
+
+    def process(item_id, source):
+        started = time.perf_counter()
+        result = {"id": item_id}
+        if isinstance(source, str):
+            result["path"] = source
+        try:
+            try:
+                audio = decode(source)
+            except DecodeError as exc:
+                audio = None
+                result.update(error="could not decode audio", reason=exc.reason)
+            if audio is not None:
+                result["duration"] = round(len(audio) / SAMPLE_RATE, 2)
+                while True:
+                    try:
+                        text, speech_seconds = transcribe(audio)
+                        break
+                    except EngineBusy:
+                        time.sleep(0.05)  # live traffic has filled the queue; wait for room
+                result.update(text=text, speech_duration=round(speech_seconds, 2))
+                if speech_seconds == 0.0:
+                    result["error"] = "no speech detected"
+                elif annotate is not None and text:
+                    result.update(annotate(text))
+        except Exception as exc:
+            logging.exception(f"batch item {item_id} failed")
+            result["error"] = f"{type(exc).__name__}: {exc}"
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, inflight),
+                                               thread_name_prefix="batch-transcribe") as pool:
+        pending = set()
+        for item_id, source in items:
+            pending.add(pool.submit(process, item_id, source))
+            if len(pending) >= inflight:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Transcribe a directory or manifest of audio files to JSONL")
+    parser.add_argument("source", help="Directory of audio files, or a .jsonl/.txt manifest")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results file; existing results are skipped")
+    parser.add_argument("--profile", help="Transcription profile (default: TRANSCRIBE_PROFILE)")
+    parser.add_argument("--llm", action="store_true", help="Also ask Gemini about each transcript (off by default)")
+    parser.add_argument("--retry-errors", action="store_true", help="Redo items whose previous result was an error")
+    parser.add_argument("--decode-workers", type=int, default=BATCH_DECODE_WORKERS)
+    parser.add_argument("--inflight", type=int, default=BATCH_INFLIGHT)
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many new items")
+    args = parser.parse_args(argv)
+
+    # Same engine, VAD, cache and profiles as the HTTP server (importing it starts the model load)
+    import server
+    pool = DecoderPool(workers=args.decode_workers, max_queue=args.inflight)
+    from profiles import get_profile
+    profile = get_profile(args.profile)
+
+    done = load_done(args.output, args.retry_errors)
+    items = ((i, p) for i, p in iter_inputs(args.source) if i not in done)
+    if args.limit:
+        items = itertools.islice(items, args.limit)
+    if done:
+        print(f"Resuming: {len(done)} items already in {args.output}", file=sys.stderr)
+
+    if not server.LOADER.wait():
+        print(f"Model failed to load: {server.LOADER.status()['error']}", file=sys.stderr)
+        return 1
+
+    def annotate(text):
+        fields = {"command": server.parse_command(text)}
+        if args.llm:
+            fields["answer"] = server.ask_gemini(text)
+        return fields
+
+    # Finish a line cut off by an interrupted run before appending
+    if os.path.exists(args.output) and os.path.getsize(args.output):
+        with open(args.output, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    started = time.perf_counter()
+    count = errors = 0
+    audio_seconds = 0.0
+    with open(args.output, "a", encoding="utf-8") as out:
+        if needs_newline:
+            out.write("\n")
+        for result in transcribe_items(items, lambda audio: server.transcribe_speech(audio, profile), annotate,
+                                       decode=lambda source: _decode(source, pool), inflight=args.inflight):
+            result["profile"] = profile.name
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            count += 1
+            errors += bool(result.get("error"))
+            audio_seconds += result.get("duration", 0.0)
+            if count % 50 == 0:
+                elapsed = time.perf_counter() - started
+                print(f"{count} items, {errors} errors, {count / elapsed:.1f} files/s, "
+                      f"{audio_seconds / elapsed:.1f}x realtime", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    print(f"Done: {count} items ({errors} errors, {audio_seconds:.0f}s of audio) in {elapsed:.1f}s -> {args.output}",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# bench
+# End-to-end benchmark for /transcribe and /api/execute: audio fixtures, stub LLM, load generator, result diffing
@@ -0,0 +1,157 @@
+# bench/__main__.py
+# CLI: `python -m bench run ...` writes a JSON result file, `python -m bench compare old.json new.json` diffs two
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+from bench.fixtures import make_fixture
+from bench.load import ServerProcess, make_request, run_load
+from bench.stub_llm import StubLLM
+
+# (metric path, higher is better)
+COMPARED = [
+    (("throughput_rps",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("server_memory", "peak_rss_mib"), False),
+]
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def cmd_run(args) -> int:
+    stub = None
+    server = None
+    env = {"COMMANDS_DRY_RUN": "1"}  # never actually launch apps from a benchmark
+    if args.stub_model:
+        env.update(WHISPER_BACKEND="stub", WHISPER_STUB_TEXT=args.text, WHISPER_STUB_DELAY=str(args.stub_model_delay))
+    if args.stub_llm:
+        stub = StubLLM(delay=args.stub_llm_delay).start()
+        env.update(GEMINI_API_URL=stub.url, GEMINI_API_KEY="bench", GEMINI_CACHE_SIZE="0")
+    try:
+        if args.spawn:
+            server = ServerProcess(args.spawn, port=args.port, env=env, log_path=args.server_log).start()
+            base_url = server.base_url
+        else:
+            base_url = args.url.rstrip("/")
+
+        fixture = make_fixture(args.fixture, args.seconds, args.format)
+        results = {}
+        for endpoint in args.endpoints:
+            send = make_request(endpoint, base_url, fixture=fixture, text=args.text, execute=not args.no_execute)
+            print(f"[bench] {endpoint}: concurrency={args.concurrency} "
+                  f"{'requests=%d' % args.requests if args.requests else 'duration=%ss' % args.duration}", file=sys.stderr)
+            results[endpoint] = run_load(send, concurrency=args.concurrency, duration=args.duration,
+                                         requests_total=args.requests, warmup=args.warmup,
+                                         server_pid=server.pid if server else None)
+            r = results[endpoint]
+            print(f"[bench] {endpoint}: {r['throughput_rps']} req/s, p50={r['latency_ms']['p50']}ms "
+                  f"p95={r['latency_ms']['p95']}ms p99={r['latency_ms']['p99']}ms statuses={r['statuses']}",
+                  file=sys.stderr)
+    finally:
+        if server is not None:
+            server.stop()
+        if stub is not None:
+            stub.stop()
+
+    report = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": {k: v for k, v in vars(args).items() if k != "func"},
+        "llm_calls": stub.calls if stub is not None else None,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"[bench] wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+def _lookup(result: dict, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def cmd_compare(args) -> int:
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)["results"]
+    regressions = 0
+    for endpoint in sorted(set(baseline) & set(candidate)):
+        print(endpoint)
+        for path, higher_is_better in COMPARED:
+            old, new = _lookup(baseline[endpoint], path), _lookup(candidate[endpoint], path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100.0
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > args.threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"  {'.'.join(path):<28} {old:>10.2f} -> {new:>10.2f}  {change:+7.1f}%{flag}")
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.threshold:.0f}%")
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Voice server benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Drive /transcribe and/or /api/execute and report latency, throughput and memory")
+    target = run.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://127.0.0.1:5000", help="Benchmark an already running server")
+    target.add_argument("--spawn", choices=["flask", "asgi"], help="Start the server as a child process")
+    run.add_argument("--port", type=int, default=5099, help="Port for --spawn")
+    run.add_argument("--server-log", help="Where --spawn writes the server's output (default: discarded)")
+    run.add_argument("--endpoints", nargs="+", choices=["transcribe", "execute"], default=["transcribe", "execute"])
+    run.add_argument("-c", "--concurrency", type=int, default=4)
+    run.add_argument("-d", "--duration", type=float, default=10.0, help="Seconds per endpoint")
+    run.add_argument("-n", "--requests", type=int, default=0, help="Fixed request count per endpoint (overrides --duration)")
+    run.add_argument("--warmup", type=int, default=2, help="Unmeasured requests before each endpoint")
+    run.add_argument("--fixture", choices=["speech", "silence"], default="speech")
+    run.add_argument("--seconds", type=float, default=2.0, help="Fixture length")
+    run.add_argument("--format", choices=["wav", "webm"], default="wav", help="webm needs ffmpeg with libopus")
+    run.add_argument("--text", default="open notepad", help="Command text for /api/execute and the stub model")
+    run.add_argument("--no-execute", action="store_true", help="Send /transcribe with execute=0 (always asks the LLM)")
+    run.add_argument("--stub-model", action="store_true", help="--spawn with WHISPER_BACKEND=stub")
+    run.add_argument("--stub-model-delay", type=float, default=0.0, help="Seconds the stub model 'thinks'")
+    run.add_argument("--stub-llm", action="store_true", help="--spawn against a local Gemini stub")
+    run.add_argument("--stub-llm-delay", type=float, default=0.2)
+    run.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="Diff two reports; exit 1 if any metric regressed past --threshold")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--threshold", type=float, default=10.0, help="Percent")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+# bench/fixtures.py
+# Synthesized audio fixtures: deterministic WAV (or webm/opus via ffmpeg) clips that pass or fail VAD
+import io
+import subprocess
+import wave
+
+import numpy as np
+
+from audio_pipeline import FFMPEG_BIN, SAMPLE_RATE
+
+
+def speech_like(seconds: float = 2.0, sample_rate: int = SAMPLE_RATE, seed: int = 0) -> np.ndarray:
+    """Quiet noise floor with syllable-rate amplitude-modulated harmonic bursts, so energy VAD finds speech."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    t = np.arange(n, dtype=np.float32) / sample_rate
+    voiced = sum(np.sin(2 * np.pi * f0 * t) / k for k, f0 in enumerate((140.0, 280.0, 420.0, 560.0), 1))
+    envelope = np.clip(np.sin(2 * np.pi * 4.0 * t), 0, None)  # ~4 syllables per second
+    envelope[(t < 0.3) | (t > seconds - 0.3)] = 0.0  # leading/trailing silence for the trimmer
+    audio = 0.3 * envelope * voiced + 0.003 * rng.standard_normal(n)
+    return audio.astype(np.float32)
+
+
+def silence(seconds: float = 2.0, sample_rate: int = SAMPLE_RATE, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return (0.002 * rng.standard_normal(int(seconds * sample_rate))).astype(np.float32)
+
+
+KINDS = {"speech": speech_like, "silence": silence}
+
+
+def to_wav(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+    return buf.getvalue()
+
+
+def to_webm(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Encode like the Electron client (MediaRecorder webm/opus); needs ffmpeg with libopus."""
+    proc = subprocess.run(
+        [FFMPEG_BIN, "-nostdin", "-loglevel", "error", "-f", "wav", "-i", "pipe:0",
+         "-c:a", "libopus", "-b:a", "32k", "-f", "webm", "pipe:1"],
+        input=to_wav(audio, sample_rate), capture_output=True, check=True,
+    )
+    return proc.stdout
+
+
+def make_fixture(kind: str = "speech", seconds: float = 2.0, fmt: str = "wav", seed: int = 0):
+    """Returns (filename, content_type, bytes)."""
+    audio = KINDS[kind](seconds, seed=seed)
+    if fmt == "webm":
+        return f"{kind}.webm", "audio/webm", to_webm(audio)
+    return f"{kind}.wav", "audio/wav", to_wav(audio)
@@ -0,0 +1,172 @@
+# bench/load.py
+# Closed-loop load generator: N threads, each with its own keep-alive session, hammering one endpoint
+import collections
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0 for an empty one)."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(q / 100.0 * len(sorted_values)))) - 1
+    return sorted_values[rank]
+
+
+def proc_memory(pid: int) -> dict:
+    """Current and peak resident set size of `pid` in MiB, from /proc (empty dict where unavailable)."""
+    mem = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key = "rss_mib" if line.startswith("VmRSS") else "peak_rss_mib"
+                    mem[key] = round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    return mem
+
+
+def make_request(kind: str, base_url: str, fixture=None, text: str = "open notepad", execute: bool = True):
+    """Returns a callable(session) -> Response for one /transcribe or /api/execute call."""
+    if kind == "transcribe":
+        name, content_type, data = fixture
+        url = f"{base_url}/transcribe?execute={'1' if execute else '0'}"
+        return lambda s: s.post(url, files={"file": (name, data, content_type)}, timeout=120)
+    url = f"{base_url}/api/execute"
+    return lambda s: s.post(url, json={"text": text}, timeout=60)
+
+
+def run_load(send, concurrency: int = 4, duration: float = 10.0, requests_total: int = 0,
+             warmup: int = 2, server_pid: int = None) -> dict:
+    """Drive `send` from `concurrency` threads for `duration` seconds (or `requests_total` calls).
+
+    Warm-up calls are made first and excluded from the numbers. Errors and non-2xx answers
+    are counted by status; latency percentiles are over every measured call.
+    """
+    warm_session = requests.Session()
+    for _ in range(warmup):
+        try:
+            send(warm_session)
+        except requests.RequestException:
+            pass
+
+    latencies, statuses = [], collections.Counter()
+    lock = threading.Lock()
+    issued = [0]
+    sample = {"peak_rss_mib": 0.0}
+    stop = threading.Event()
+
+    def claim() -> bool:
+        if stop.is_set():
+            return False
+        if requests_total:
+            with lock:
+                if issued[0] >= requests_total:
+                    return False
+                issued[0] += 1
+        return True
+
+    def worker():
+        session = requests.Session()
+        while claim():
+            started = time.perf_counter()
+            try:
+                status = send(session).status_code
+            except requests.RequestException as exc:
+                status = type(exc).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] += 1
+
+    threads = [threading.Thread(target=worker, name=f"bench-{i}", daemon=True) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    deadline = None if requests_total else started + duration
+    while any(t.is_alive() for t in threads):
+        if server_pid:  # the server's own VmHWM covers the peak; this tracks threads/children too
+            rss = proc_memory(server_pid).get("rss_mib", 0.0)
+            sample["peak_rss_mib"] = max(sample["peak_rss_mib"], rss)
+        if deadline is not None and time.perf_counter() >= deadline:
+            stop.set()
+        time.sleep(0.05)
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    ok = sum(n for s, n in statuses.items() if s.isdigit() and 200 <= int(s) < 300)
+    result = {
+        "requests": len(ordered),
+        "ok": ok,
+        "statuses": dict(statuses),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(ordered) / wall, 2) if wall else 0.0,
+        "ok_rps": round(ok / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(1000 * sum(ordered) / len(ordered), 2) if ordered else 0.0,
+            "p50": round(1000 * percentile(ordered, 50), 2),
+            "p95": round(1000 * percentile(ordered, 95), 2),
+            "p99": round(1000 * percentile(ordered, 99), 2),
+            "max": round(1000 * ordered[-1], 2) if ordered else 0.0,
+        },
+    }
+    if server_pid:
+        result["server_memory"] = dict(proc_memory(server_pid), sampled_peak_rss_mib=sample["peak_rss_mib"])
+    return result
+
+
+class ServerProcess:
+    """Start server.py (Flask) or asgi_app.py (uvicorn) as a child process and wait for /ready."""
+
+    def __init__(self, kind: str = "flask", port: int = 5099, env: dict = None, log_path: str = None):
+        self.kind = kind
+        self.port = port
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.env = dict(os.environ, **(env or {}))
+        self.log_path = log_path or os.devnull
+        self.proc = None
+
+    def start(self, timeout: float = 120.0):
+        if self.kind == "asgi":
+            self.env["ASGI_HOST"], self.env["ASGI_PORT"] = "127.0.0.1", str(self.port)
+            cmd = [sys.executable, "asgi_app.py"]
+        else:
+            cmd = [sys.executable, "-c",
+                   f"import server; server.app.run(host='127.0.0.1', port={self.port}, threaded=True)"]
+        self._log = open(self.log_path, "ab")
+        self.proc = subprocess.Popen(cmd, cwd=PYTHON_DIR, env=self.env, stdout=self._log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"{self.kind} server exited with code {self.proc.returncode} (log: {self.log_path})")
+            try:
+                if requests.get(f"{self.base_url}/ready", timeout=1).status_code == 200:
+                    return self
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"{self.kind} server not ready after {timeout:.0f}s (log: {self.log_path})")
+
+    @property
+    def pid(self):
+        return self.proc.pid if self.proc is not None else None
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        if getattr(self, "_log", None) is not None:
+            self._log.close()
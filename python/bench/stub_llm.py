@@ -0,0 +1,125 @@
+# bench/stub_llm.py
+# Local stand-in for the Gemini generateContent / streamGenerateContent endpoints with configurable delays
+import collections
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            prompt = json.loads(self.rfile.read(length))["contents"][0]["parts"][0]["text"]
+        except Exception:
+            prompt = ""
+        if "stub_redirect=1" in self.path:
+            self._error("redirect")  # keep bouncing the redirected request
+            return
+        self.server.calls += 1
+        time.sleep(self.server.delay)
+        if self.server.failures:
+            self._error(self.server.failures.popleft())
+            return
+        answer = f"stub answer to: {prompt}"
+        if ":streamGenerateContent" in self.path:
+            self._stream(answer)
+            return
+        body = json.dumps({"candidates": [{"content": {"parts": [{"text": answer}]}}]}, ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, failure):
+        if failure == "redirect":  # to a marked URL that redirects to itself until the client gives up
+            location = self.path if "stub_redirect=1" in self.path else self.path + "&stub_redirect=1"
+            self.send_response(307)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if failure == "truncated":  # chunked body that ends mid-chunk
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.write(b"40\r\n{\"candidates\"")
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        if failure == "not_json":
+            status, body = 200, b"<html>upstream proxy error</html>"
+        else:
+            status, body = failure, json.dumps({"error": {"code": failure, "message": "stub failure"}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, answer: str):
+        """One SSE event per word, `chunk_delay` apart, sent with chunked transfer encoding."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = answer.split(" ")
+        try:
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self.server.chunk_delay)
+                text = word if i == len(words) - 1 else word + " "
+                # Raw UTF-8 and no charset in Content-Type, like the real endpoint
+                payload = json.dumps({'candidates': [{'content': {'parts': [{'text': text}]}}]}, ensure_ascii=False)
+                event = f"data: {payload}\r\n\r\n"
+                data = event.encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.cancelled += 1  # the client stopped reading mid-answer
+            self.close_connection = True
+
+
+class StubLLM:
+    """Threaded HTTP server on 127.0.0.1; `url` is what GEMINI_API_URL should point at."""
+
+    def __init__(self, delay: float = 0.2, port: int = 0, chunk_delay: float = 0.05):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.delay = delay
+        self.httpd.chunk_delay = chunk_delay
+        self.httpd.calls = 0
+        self.httpd.cancelled = 0
+        self.httpd.failures = collections.deque()  # failures to answer the next requests with
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1beta/models/stub:generateContent"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stub-llm", daemon=True)
+
+    @property
+    def calls(self) -> int:
+        return self.httpd.calls
+
+    def fail(self, *failures):
+        """Answer the next requests with these failures, in order.
+
+        Each is an HTTP status, "not_json" (a 200 with an HTML body), "truncated" (a chunked body cut
+        short) or "redirect" (redirects to itself for as long as the client follows).
+        """
+        self.httpd.failures.extend(failures)
+        return self
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
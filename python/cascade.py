@@ -0,0 +1,99 @@
+# cascade.py
+# Two-model cascade: every clip runs on the small model, uncertain ones are re-run on a larger resident model
+import collections
+import logging
+import os
+import threading
+import time
+
+from scheduler import EngineBusy
+
+WHISPER_CASCADE_MODEL = os.environ.get("WHISPER_CASCADE_MODEL", "")  # e.g. "small"; empty = no cascade
+# Escalate when the small model's worst segment is past any of these
+CASCADE_MIN_LOGPROB = float(os.environ.get("CASCADE_MIN_LOGPROB", "-0.6"))
+CASCADE_MAX_NO_SPEECH = float(os.environ.get("CASCADE_MAX_NO_SPEECH", "0.4"))
+CASCADE_MAX_COMPRESSION = float(os.environ.get("CASCADE_MAX_COMPRESSION", "2.0"))
+
+Thresholds = collections.namedtuple("Thresholds", ["min_logprob", "max_no_speech", "max_compression"])
+DEFAULT_THRESHOLDS = Thresholds(CASCADE_MIN_LOGPROB, CASCADE_MAX_NO_SPEECH, CASCADE_MAX_COMPRESSION)
+
+
+def escalation_reason(result: dict, thresholds: Thresholds = DEFAULT_THRESHOLDS):
+    """Why the small model's result should not be trusted, or None to keep it.
+
+    Uses the per-segment scores whisper already computes: the lowest avg_logprob, the highest
+    no_speech_prob and the highest compression_ratio. Callers only get here after VAD found
+    speech, so an empty transcript is itself a miss.
+    """
+    segments = result.get("segments") or []
+    if not result.get("text", "").strip() or not segments:
+        return "empty"
+    if min(s.get("avg_logprob", 0.0) for s in segments) < thresholds.min_logprob:
+        return "low_logprob"
+    if max(s.get("no_speech_prob", 0.0) for s in segments) > thresholds.max_no_speech:
+        return "no_speech"
+    if max(s.get("compression_ratio", 0.0) for s in segments) > thresholds.max_compression:
+        return "compression"
+    return None
+
+
+class CascadeEngine:
+    """Engine-shaped wrapper (transcribe/qsize) over a fast and an accurate engine, both kept loaded.
+
+    `transcribe()` runs the fast engine and returns its result unless `escalation_reason()` or
+    `check(text)` names a reason; then the clip is re-run on the accurate engine. `check` is how the
+    server adds "the transcript looks like a command but matches none". When the accurate engine's
+    queue is full the fast result is kept rather than failing the request.
+    """
+
+    def __init__(self, fast, accurate, thresholds: Thresholds = DEFAULT_THRESHOLDS, check=None):
+        self.fast = fast
+        self.accurate = accurate
+        self.thresholds = thresholds
+        self.check = check
+        self._lock = threading.Lock()
+        self.stats = {"clips": 0, "escalated": 0, "busy": 0, "fast_ms": 0.0, "accurate_ms": 0.0}
+        self.reasons = collections.Counter()
+
+    def transcribe(self, audio, **options) -> dict:
+        started = time.perf_counter()
+        result = self.fast.transcribe(audio, **options)
+        fast_ms = (time.perf_counter() - started) * 1000
+        reason = escalation_reason(result, self.thresholds)
+        if reason is None and self.check is not None:
+            reason = self.check(result.get("text", ""))
+        with self._lock:
+            self.stats["clips"] += 1
+            self.stats["fast_ms"] += fast_ms
+        if reason is None:
+            return result
+        started = time.perf_counter()
+        try:
+            escalated = self.accurate.transcribe(audio, **options)
+        except EngineBusy:
+            with self._lock:
+                self.stats["busy"] += 1
+            logging.warning("Cascade: accurate model busy, keeping the fast transcript (%s)", reason)
+            return result
+        with self._lock:
+            self.stats["escalated"] += 1
+            self.stats["accurate_ms"] += (time.perf_counter() - started) * 1000
+            self.reasons[reason] += 1
+        logging.debug("Cascade escalated (%s): %r -> %r", reason, result.get("text"), escalated.get("text"))
+        escalated["escalated"] = reason
+        return escalated
+
+    def qsize(self) -> int:
+        return self.fast.qsize() + self.accurate.qsize()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            clips, escalated = self.stats["clips"], self.stats["escalated"]
+            return dict(
+                self.stats,
+                escalation_rate=round(escalated / clips, 4) if clips else 0.0,
+                fast_ms=round(self.stats["fast_ms"], 1), accurate_ms=round(self.stats["accurate_ms"], 1),
+                avg_fast_ms=round(self.stats["fast_ms"] / clips, 2) if clips else 0.0,
+                avg_accurate_ms=round(self.stats["accurate_ms"] / escalated, 2) if escalated else 0.0,
+                reasons=dict(self.reasons), thresholds=self.thresholds._asdict(),
+            )
@@ -0,0 +1,290 @@
+# command_registry.py
+# Voice-command intents compiled once: one trie-shaped regex for exact phrases + a fuzzy alias index
+import json
+import logging
+import os
+import re
+
+COMMANDS_FILE = os.environ.get("COMMANDS_FILE", "")  # optional JSON with user-defined apps/websites
+
+WEBSITE_VERBS = ("open", "go to", "visit")
+APP_VERBS = ("open", "start", "launch")
+
+# name -> (url, spoken aliases)
+WEBSITES = {
+    "youtube": ("https://youtube.com", ["youtube", "you tube"]),
+    "google": ("https://google.com", ["google"]),
+    "facebook": ("https://facebook.com", ["facebook", "fb"]),
+    "twitter": ("https://twitter.com", ["twitter"]),
+    "instagram": ("https://instagram.com", ["instagram"]),
+    "github": ("https://github.com", ["github"]),
+    "stackoverflow": ("https://stackoverflow.com", ["stackoverflow", "stack overflow"]),
+}
+
+# canonical app -> spoken aliases (APP_COMMANDS keys are added as aliases of themselves)
+APP_ALIASES = {
+    "notepad": ["notepad", "text editor"],
+    "calculator": ["calculator", "calc"],
+    "chrome": ["chrome", "google chrome"],
+    "brave": ["brave", "brave browser"],
+    "edge": ["edge", "microsoft edge", "browser", "web browser"],
+    "firefox": ["firefox", "mozilla"],
+    "vs code": ["vs code", "visual studio code", "code"],
+    "word": ["word", "microsoft word"],
+    "excel": ["excel", "microsoft excel"],
+    "powerpoint": ["powerpoint", "microsoft powerpoint", "power point"],
+    "explorer": ["explorer", "file explorer", "files", "file"],
+    "paint": ["paint", "ms paint"],
+}
+
+FILLER_SUFFIX = re.compile(r'\s+(app|application|program)$')
+
+
+def normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+
+def clean_transcript(text: str) -> str:
+    """Lowercase a transcript and drop punctuation: "Open Notepad." -> "open notepad"."""
+    return ' '.join(re.sub(r"[^\w\s+]", ' ', text.lower()).split())
+
+
+def _trie_regex(words) -> str:
+    """Regex alternation built from a character trie, so shared prefixes are matched once."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != '']
+        if not branches:
+            return ''
+        end = '' in node
+        if len(branches) == 1 and not end:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if end else '')
+
+    return build(trie)
+
+
+def _deletes(word: str, depth: int):
+    """All strings reachable from `word` by deleting up to `depth` characters."""
+    out = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Optimal-string-alignment distance (Levenshtein plus adjacent transpositions)."""
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class CommandRegistry:
+    """All app and website intents, compiled once at startup.
+
+    `parse()` keeps the shape of the old per-call regex scan:
+    {"type": "website", "url", "name"} | {"type": "app", "app"} | {"type": "unknown", "text"},
+    plus a "match" key saying whether it was an exact alias, a fuzzy alias or the generic
+    "open <anything>" fallback.
+    """
+
+    def __init__(self, app_commands: dict = None, websites: dict = None, app_aliases: dict = None,
+                 max_fuzzy_distance: int = 2):
+        self.max_fuzzy_distance = max_fuzzy_distance
+        self.aliases = {}  # spoken alias -> ("app", canonical) | ("website", name)
+        self.urls = {}
+        for name, (url, aliases) in (websites or WEBSITES).items():
+            self.urls[name] = url
+            for alias in aliases:
+                self._add_alias(alias, ("website", name))
+        for canonical, aliases in (app_aliases or APP_ALIASES).items():
+            for alias in aliases:
+                self._add_alias(alias, ("app", canonical))
+        for name in (app_commands or {}):
+            self._add_alias(name, ("app", name), overwrite=False)
+        self.compile()
+
+    def _add_alias(self, alias, intent, overwrite=True):
+        alias = normalize(alias)
+        variants = {alias, alias.replace(' ', '')}  # "vs code" is often transcribed "vscode"
+        for v in variants:
+            if overwrite or v not in self.aliases:
+                self.aliases[v] = intent
+
+    def add_app(self, canonical: str, aliases):
+        self._add_alias(canonical, ("app", canonical))
+        for alias in aliases:
+            self._add_alias(alias, ("app", canonical))
+
+    def add_website(self, name: str, url: str, aliases):
+        self.urls[name] = url
+        self._add_alias(name, ("website", name))
+        for alias in aliases:
+            self._add_alias(alias, ("website", name))
+
+    def compile(self):
+        """(Re)build the matcher regex and the fuzzy index after aliases change."""
+        # Input is normalize()d, so literal single spaces are enough between words.
+        # Verbs are whole words, optionally prefixed "re" ("reopen notepad" opens notepad).
+        verbs = _trie_regex(set(WEBSITE_VERBS) | set(APP_VERBS))
+        targets = _trie_regex(self.aliases)
+        self._pattern = re.compile(
+            rf'\b(?:re)?(?P<verb>{verbs}) (?:the )?(?P<target>{targets})(?![a-z0-9+])'
+        )
+        self._fallback = re.compile(r'\b(?:re)?(open|start|launch)\s+(.+)')
+        self._fuzzy = {}
+        for alias in self.aliases:
+            if len(alias) < 4:
+                continue  # short aliases ("fb", "calc") match too much when fuzzed
+            for d in _deletes(alias, self.max_fuzzy_distance):
+                self._fuzzy.setdefault(d, set()).add(alias)
+        logging.info(f"Command registry compiled: {len(self.aliases)} aliases, {len(self._fuzzy)} fuzzy keys")
+
+    def _intent_result(self, intent, match):
+        kind, name = intent
+        if kind == "website":
+            return {"type": "website", "url": self.urls[name], "name": name, "match": match}
+        return {"type": "app", "app": name, "match": match}
+
+    def fuzzy_lookup(self, phrase: str):
+        """Closest alias within the allowed edit distance, or None."""
+        phrase = normalize(phrase)
+        if len(phrase) < 4:
+            return None
+        limit = 1 if len(phrase) < 6 else self.max_fuzzy_distance
+        candidates = set()
+        for d in _deletes(phrase, limit):
+            candidates |= self._fuzzy.get(d, set())
+        best = None
+        for alias in candidates:
+            dist = edit_distance(phrase, alias)
+            if dist <= limit and (best is None or (dist, len(alias)) < best[:2]):
+                best = (dist, len(alias), alias)
+        return best[2] if best else None
+
+    def resolve_app(self, name: str):
+        """Map a free-form app name to a canonical app (exact, contained alias, then fuzzy)."""
+        name = normalize(name)
+        intent = self.aliases.get(name)
+        if intent is None:
+            m = self._pattern.search(f"open {name}")
+            if m:
+                intent = self.aliases.get(normalize(m.group('target')))
+        if intent is None:
+            alias = self.fuzzy_lookup(name)
+            intent = self.aliases.get(alias) if alias else None
+        if intent and intent[0] == "app":
+            return intent[1]
+        return None
+
+    def parse(self, text: str) -> dict:
+        text = normalize(text)
+        for m in self._pattern.finditer(text):
+            verb = m.group('verb')
+            intent = self.aliases.get(m.group('target'))
+            if intent is None:
+                continue
+            allowed = WEBSITE_VERBS if intent[0] == "website" else APP_VERBS
+            if verb in allowed:
+                return self._intent_result(intent, "exact")
+
+        # Fallback: try to extract app name after common trigger words
+        open_match = self._fallback.search(text)
+        if open_match:
+            app_name = FILLER_SUFFIX.sub('', open_match.group(2).strip())
+            # Misheard transcripts: fuzzy-match the first few words against known aliases
+            words = app_name.split()
+            for n in range(min(3, len(words)), 0, -1):
+                alias = self.fuzzy_lookup(' '.join(words[:n]))
+                if alias:
+                    intent = self.aliases[alias]
+                    allowed = WEBSITE_VERBS if intent[0] == "website" else APP_VERBS
+                    if open_match.group(1) in allowed:
+                        return self._intent_result(intent, "fuzzy")
+            return {"type": "app", "app": app_name, "match": "fallback"}
+
+        return {"type": "unknown", "text": text}
+
+    def vocabulary_prompt(self, max_chars: int = 400) -> str:
+        """Decoder prompt naming the known commands: "open youtube, google, ..., visual studio code".
+
+        Whisper reads the prompt as preceding transcript, so it nudges spelling and phrasing
+        toward names parse() recognizes. Canonical names come first, then multi-word aliases.
+        """
+        canonical = [name for kind, name in self.aliases.values()]
+        # Spaced spellings ("you tube") would only bias Whisper away from the canonical form
+        spoken = [a for a in self.aliases if ' ' in a and a.replace(' ', '') not in canonical]
+        names = dict.fromkeys(canonical + sorted(spoken, key=len, reverse=True))
+        prompt = "open"
+        for i, name in enumerate(names):
+            part = f" {name}" if i == 0 else f", {name}"
+            if len(prompt) + len(part) > max_chars:
+                break
+            prompt += part
+        return prompt
+
+    def snap(self, text: str, max_words: int = 5) -> str:
+        """Rewrite a short transcript that is a known command to its canonical phrase.
+
+        "Open notpad." -> "open notepad". Longer transcripts, unknown intents and the generic
+        "open <anything>" fallback are returned unchanged.
+        """
+        cleaned = clean_transcript(text)
+        words = cleaned.split()
+        if not words or len(words) > max_words:
+            return text
+        parsed = self.parse(cleaned)
+        if parsed.get("match") not in ("exact", "fuzzy"):
+            return text
+        verb = next((v for v in sorted(set(WEBSITE_VERBS) | set(APP_VERBS), key=len, reverse=True)
+                     if cleaned.startswith(v + ' ')), None)
+        if verb is None:
+            return text
+        return f"{verb} {parsed['name'] if parsed['type'] == 'website' else parsed['app']}"
+
+    def unmatched_target(self, text: str, max_words: int = 5):
+        """For a short "open <x>" transcript whose target is no known alias, return x; else None.
+
+        These are the transcripts most likely to be a misheard command (the cascade re-runs them).
+        """
+        cleaned = clean_transcript(text)
+        if not cleaned or len(cleaned.split()) > max_words:
+            return None
+        parsed = self.parse(cleaned)
+        return parsed["app"] if parsed.get("match") == "fallback" else None
+
+    def load_file(self, path: str):
+        """Merge user-defined commands from JSON. Returns {name: launch command} for new apps.
+
+        Format: {"apps": {"obs": {"command": "obs64.exe", "aliases": ["obs studio"]}},
+                 "websites": {"reddit": {"url": "https://reddit.com", "aliases": ["red it"]}}}
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        commands = {}
+        for name, spec in data.get("apps", {}).items():
+            name = normalize(name)
+            self.add_app(name, spec.get("aliases", []))
+            if spec.get("command"):
+                commands[name] = spec["command"]
+        for name, spec in data.get("websites", {}).items():
+            self.add_website(normalize(name), spec["url"], spec.get("aliases", []))
+        self.compile()
+        logging.info(f"Loaded {len(data.get('apps', {}))} apps and {len(data.get('websites', {}))} websites from {path}")
+        return commands
@@ -0,0 +1,281 @@
+# decoder_pool.py
+# Bounded audio decode pool: PyAV inside the server process (no spawn per upload), ffmpeg subprocesses as a fallback
+import collections
+import importlib.util
+import io
+import logging
+import os
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from audio_pipeline import DECODE_TIMEOUT, SAMPLE_RATE, ffmpeg_pcm_command, pcm16_to_float32
+
+HAVE_PYAV = importlib.util.find_spec("av") is not None
+
+DECODER_BACKEND = os.environ.get("DECODER_BACKEND", "auto")  # auto (pyav if installed) | pyav | ffmpeg
+DECODER_WORKERS = int(os.environ.get("DECODER_WORKERS", str(min(4, os.cpu_count() or 1))))  # decodes at once
+DECODER_MAX_QUEUE = int(os.environ.get("DECODER_MAX_QUEUE", "32"))  # waiting for a slot before "busy"
+DECODER_MAX_SECONDS = float(os.environ.get("DECODER_MAX_SECONDS", "600"))  # reject longer audio
+DECODER_CHUNK_BYTES = 64 * 1024  # read size when feeding a stream to ffmpeg
+
+
+class DecodeError(Exception):
+    """Audio could not be decoded.
+
+    `reason` is one of: empty, invalid, no_audio, unsupported, too_large, too_long, timeout, busy, failed.
+    """
+
+    def __init__(self, reason: str, message: str = ""):
+        super().__init__(message or reason)
+        self.reason = reason
+
+
+class BoundedStream(io.RawIOBase):
+    """Read-only wrapper that raises DecodeError("too_large") once more than `limit` bytes are read.
+
+    Lets a request body be decoded straight from the socket without trusting Content-Length.
+    """
+
+    def __init__(self, stream, limit: int):
+        self._stream = stream
+        self.limit = limit
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        self.bytes_read += len(data)
+        if self.bytes_read > self.limit:
+            raise DecodeError("too_large", f"upload exceeds {self.limit} bytes")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _too_long(max_seconds: float) -> DecodeError:
+    return DecodeError("too_long", f"audio is longer than {max_seconds:.0f}s")
+
+
+def _pyav_decode(source, sample_rate: int, deadline: float, max_seconds: float) -> np.ndarray:
+    import av
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    try:
+        container = av.open(source, mode="r", metadata_errors="ignore")
+    except av.FFmpegError as exc:
+        raise DecodeError("invalid", f"not a readable audio container: {exc}") from exc
+    try:
+        stream = next((s for s in container.streams if s.type == "audio"), None)
+        if stream is None:
+            raise DecodeError("no_audio", "container has no audio stream")
+        resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+        chunks, samples = [], 0
+        max_samples = int(max_seconds * sample_rate)
+        try:
+            for frame in container.decode(stream):
+                frame.pts = None  # the resampler only needs the samples; bogus pts make it drop frames
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+                    samples += out.samples
+                # Cooperative kill-on-hang: checked between frames, so a stuck decode gives up its slot
+                if time.monotonic() > deadline:
+                    raise DecodeError("timeout", "decode ran past its deadline")
+                if samples > max_samples:
+                    raise _too_long(max_seconds)
+            for out in resampler.resample(None):
+                chunks.append(out.to_ndarray().reshape(-1))
+        except av.FFmpegError as exc:
+            if not chunks:
+                raise DecodeError("invalid", f"corrupt audio: {exc}") from exc
+            # MediaRecorder blobs cut mid-cluster end with a broken frame; keep what decoded
+            logging.debug("Truncated audio, keeping %d decoded chunks: %s", len(chunks), exc)
+    finally:
+        container.close()
+    if not chunks:
+        raise DecodeError("no_audio", "no audio samples decoded")
+    audio = np.concatenate(chunks)
+    if len(audio) > max_samples:
+        raise _too_long(max_seconds)
+    return audio.astype(np.float32) / 32768.0
+
+
+def _feed(stdin, stream, failures: list):
+    """Copy a readable stream into ffmpeg's stdin in chunks (runs on its own thread)."""
+    try:
+        for chunk in iter(lambda: stream.read(DECODER_CHUNK_BYTES), b""):
+            stdin.write(chunk)
+    except DecodeError as exc:
+        failures.append(exc)
+    except (BrokenPipeError, ValueError, OSError):
+        pass  # ffmpeg exited early; its exit status and stderr say why
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+def _ffmpeg_decode(source, sample_rate: int, timeout: float, max_seconds: float) -> np.ndarray:
+    is_path = isinstance(source, str)
+    is_stream = not is_path and hasattr(source, "read")
+    # One second past the limit, so over-long audio is detected rather than silently cut
+    command = ffmpeg_pcm_command(sample_rate, source=source if is_path else 'pipe:0')
+    command[-1:-1] = ['-t', str(max_seconds + 1)]
+    failures = []
+    try:
+        proc = subprocess.Popen(command, stdin=None if is_path else subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as exc:
+        raise DecodeError("failed", f"could not run ffmpeg: {exc}") from exc
+    try:
+        if is_stream:
+            stdin, proc.stdin = proc.stdin, None  # fed by _feed, so communicate() must not close it
+            threading.Thread(target=_feed, args=(stdin, source, failures), daemon=True).start()
+            stdout, stderr = proc.communicate(timeout=timeout)
+        else:
+            stdout, stderr = proc.communicate(None if is_path else source, timeout=timeout)
+    except subprocess.TimeoutExpired as exc:
+        proc.kill()  # kills ffmpeg if it hangs
+        proc.communicate()
+        raise DecodeError("timeout", f"ffmpeg took longer than {timeout:.0f}s") from exc
+    if failures:
+        raise failures[0]
+    if proc.returncode != 0:
+        raise DecodeError("invalid", stderr.decode(errors="replace").strip()[-300:]
+                          or f"ffmpeg exited with {proc.returncode}")
+    if not stdout:
+        raise DecodeError("no_audio", "ffmpeg produced no audio samples")
+    if len(stdout) // 2 > int(max_seconds * sample_rate):
+        raise _too_long(max_seconds)
+    return pcm16_to_float32(stdout)
+
+
+class DecoderPool:
+    """At most `workers` decodes run at once; up to `max_queue` more wait, the rest fail fast as "busy".
+
+    The PyAV backend decodes in-process (libav releases the GIL), so an upload costs no fork/exec or
+    codec re-probe of a fresh process; the ffmpeg backend spawns one process per decode. Every decode
+    has a deadline and records its duration and, on failure, the reason.
+
+    A thread cannot be killed, so each PyAV decode runs on its own thread and the caller stops waiting
+    at the deadline. The stuck thread is abandoned and its slot freed; while as many are stuck as there
+    are slots, decodes go to the ffmpeg subprocess instead, which is killed on a hang.
+    """
+
+    def __init__(self, backend: str = DECODER_BACKEND, workers: int = DECODER_WORKERS,
+                 max_queue: int = DECODER_MAX_QUEUE, timeout: float = DECODE_TIMEOUT,
+                 max_seconds: float = DECODER_MAX_SECONDS, sample_rate: int = SAMPLE_RATE):
+        if backend == "auto":
+            backend = "pyav" if HAVE_PYAV else "ffmpeg"
+        if backend == "pyav" and not HAVE_PYAV:
+            raise RuntimeError("DECODER_BACKEND=pyav but PyAV (the `av` package) is not installed")
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_seconds = max_seconds
+        self.sample_rate = sample_rate
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._stuck = set()  # abandoned PyAV decode threads that may still be running
+        self.stats = {"decodes": 0, "failures": 0, "busy": 0, "abandoned": 0, "ffmpeg_fallbacks": 0,
+                      "total_ms": 0.0, "max_ms": 0.0}
+        self.failure_reasons = collections.Counter()
+
+    def decode(self, source) -> np.ndarray:
+        """Decode encoded bytes, a file path or a readable stream to mono float32 PCM; raises DecodeError.
+
+        Streams (an upload's temp file, a BoundedStream over the request body) are read in chunks
+        while decoding, so the encoded upload is never held in memory as a whole.
+        """
+        if not source:
+            raise self._failed(DecodeError("empty", "no audio data"))
+        with self._lock:
+            if self._waiting >= self.max_queue + self.workers:
+                self.stats["busy"] += 1
+                raise DecodeError("busy", f"{self._waiting} decodes already pending")
+            self._waiting += 1
+        try:
+            if not self._slots.acquire(timeout=self.timeout):
+                raise self._failed(DecodeError("timeout", "no decoder slot became free"))
+            started = time.perf_counter()
+            try:
+                if self._use_pyav():
+                    audio = self._pyav_decode(source)
+                else:
+                    audio = _ffmpeg_decode(source, self.sample_rate, self.timeout, self.max_seconds)
+            except DecodeError as exc:
+                raise self._failed(exc)
+            except Exception as exc:
+                logging.exception("decoder crashed")
+                raise self._failed(DecodeError("failed", f"{type(exc).__name__}: {exc}")) from exc
+            finally:
+                self._slots.release()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                with self._lock:
+                    self.stats["decodes"] += 1
+                    self.stats["total_ms"] += elapsed_ms
+                    self.stats["max_ms"] = max(self.stats["max_ms"], elapsed_ms)
+            return audio
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def _use_pyav(self) -> bool:
+        if self.backend != "pyav":
+            return False
+        with self._lock:
+            self._stuck = {t for t in self._stuck if t.is_alive()}
+            if len(self._stuck) < self.workers:
+                return True
+            self.stats["ffmpeg_fallbacks"] += 1
+        return False
+
+    def _pyav_decode(self, source) -> np.ndarray:
+        """_pyav_decode() on a helper thread, given up on after `timeout` even if libav never returns."""
+        outcome = {}
+
+        def run():
+            try:
+                outcome["audio"] = _pyav_decode(source, self.sample_rate, time.monotonic() + self.timeout,
+                                                self.max_seconds)
+            except BaseException as exc:
+                outcome["error"] = exc
+
+        thread = threading.Thread(target=run, name="pyav-decode", daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            with self._lock:
+                self._stuck.add(thread)
+                self.stats["abandoned"] += 1
+                stuck = len(self._stuck)
+            logging.error("PyAV decode stuck past %.0fs; abandoned its thread (%d stuck)", self.timeout, stuck)
+            raise DecodeError("timeout", f"decode took longer than {self.timeout:.0f}s")
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["audio"]
+
+    def _failed(self, exc: DecodeError) -> DecodeError:
+        with self._lock:
+            self.stats["failures"] += 1
+            self.failure_reasons[exc.reason] += 1
+        logging.warning("Audio decode failed (%s): %s", exc.reason, exc)
+        return exc
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            decodes = self.stats["decodes"]
+            return dict(self.stats, backend=self.backend, workers=self.workers, pending=self._waiting,
+                        stuck=sum(t.is_alive() for t in self._stuck),
+                        total_ms=round(self.stats["total_ms"], 1), max_ms=round(self.stats["max_ms"], 1),
+                        avg_ms=round(self.stats["total_ms"] / decodes, 2) if decodes else 0.0,
+                        failure_reasons=dict(self.failure_reasons))
+
+
+DECODER = DecoderPool()
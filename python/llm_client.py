@@ -0,0 +1,468 @@
+# llm_client.py
+# Gemini client: pooled keep-alive session, in-flight dedup, response cache, retries and a circuit breaker
+import asyncio
+import collections
+import concurrent.futures
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx  # async client for the ASGI server
+except ImportError:
+    httpx = None
+
+GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+GEMINI_API_URL = os.environ.get(
+    "GEMINI_API_URL",
+    "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent",
+)  # override to point at a local stub server
+# Server-sent-events variant used for token streaming; derived from GEMINI_API_URL unless set
+GEMINI_STREAM_URL = os.environ.get("GEMINI_STREAM_URL", "")
+GEMINI_CONNECT_TIMEOUT = float(os.environ.get("GEMINI_CONNECT_TIMEOUT", "5"))
+GEMINI_READ_TIMEOUT = float(os.environ.get("GEMINI_READ_TIMEOUT", "30"))
+GEMINI_POOL_SIZE = int(os.environ.get("GEMINI_POOL_SIZE", "10"))  # keep-alive connections
+GEMINI_RETRIES = int(os.environ.get("GEMINI_RETRIES", "2"))  # extra attempts after the first
+GEMINI_BACKOFF = float(os.environ.get("GEMINI_BACKOFF", "0.5"))  # base seconds, doubled per attempt
+GEMINI_CACHE_SIZE = int(os.environ.get("GEMINI_CACHE_SIZE", "256"))  # 0 disables the response cache
+GEMINI_CACHE_TTL = float(os.environ.get("GEMINI_CACHE_TTL", "600"))
+GEMINI_BREAKER_THRESHOLD = int(os.environ.get("GEMINI_BREAKER_THRESHOLD", "5"))  # consecutive failures
+GEMINI_BREAKER_COOLDOWN = float(os.environ.get("GEMINI_BREAKER_COOLDOWN", "30"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+NO_ANSWER = "[Gemini returned no answer]"
+
+
+class LLMError(Exception):
+    """The LLM could not produce an answer (after retries, or because the breaker is open)."""
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures; one trial call is let through after `cooldown`."""
+
+    def __init__(self, threshold: int = GEMINI_BREAKER_THRESHOLD, cooldown: float = GEMINI_BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True  # half-open: exactly one caller probes the endpoint
+            return True
+
+    def abandon(self):
+        """A call let through by allow() ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logging.error(f"Gemini circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+
+def extract_text(data: dict) -> str:
+    # Gemini returns candidates[0].content.parts[0].text
+    candidates = data.get("candidates", [])
+    if candidates:
+        parts = candidates[0].get("content", {}).get("parts", [])
+        if parts:
+            return parts[0].get("text", "")
+    return NO_ANSWER
+
+
+def sse_data(line: str):
+    """The JSON payload of one `data:` line of a streamGenerateContent?alt=sse response, else None."""
+    if not line.startswith("data:"):
+        return None
+    data = json.loads(line[5:].strip())
+    if "error" in data:
+        raise LLMError(data["error"].get("message", "error event in stream"))
+    return data
+
+
+def stream_url(url: str) -> str:
+    return GEMINI_STREAM_URL or url.replace(":generateContent", ":streamGenerateContent")
+
+
+class GeminiClient:
+    """Thread-safe Gemini generateContent client.
+
+    Identical prompts that are already in flight share one HTTP request, and successful
+    answers are kept in a small TTL'd LRU so repeated questions skip the round trip.
+    stream() uses streamGenerateContent instead and yields the answer as it is generated.
+    """
+
+    def __init__(self, api_key: str = GEMINI_API_KEY, url: str = GEMINI_API_URL,
+                 timeout=(GEMINI_CONNECT_TIMEOUT, GEMINI_READ_TIMEOUT), retries: int = GEMINI_RETRIES,
+                 backoff: float = GEMINI_BACKOFF, cache_size: int = GEMINI_CACHE_SIZE,
+                 cache_ttl: float = GEMINI_CACHE_TTL, pool_size: int = GEMINI_POOL_SIZE):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.breaker = CircuitBreaker()
+        self.stream_url = stream_url(url)
+        self.session = self._open_session(max(1, pool_size))
+        self._cache = collections.OrderedDict()  # prompt -> (stored_at, answer)
+        self._inflight = {}  # prompt -> Future shared by concurrent callers
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "http_calls": 0, "cache_hits": 0, "coalesced": 0,
+                      "retries": 0, "errors": 0, "rejected": 0, "streams": 0, "cancelled": 0}
+
+    def _open_session(self, pool_size: int):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Content-Type": "application/json"})
+        return session
+
+    def ask(self, prompt: str) -> str:
+        """Return Gemini's answer for `prompt`; raises LLMError on failure."""
+        with self._lock:
+            self.stats["requests"] += 1
+            cached = self._cache_get(prompt)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+            future = self._inflight.get(prompt)
+            leader = future is None
+            if leader:
+                future = self._inflight[prompt] = concurrent.futures.Future()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return future.result()
+
+        try:
+            answer = self._call(prompt)
+        except Exception as exc:
+            with self._lock:
+                self._inflight.pop(prompt, None)
+            future.set_exception(exc)
+            raise
+        with self._lock:
+            self._inflight.pop(prompt, None)
+            if answer != NO_ANSWER:
+                self._cache_put(prompt, answer)
+        future.set_result(answer)
+        return answer
+
+    def stream(self, prompt: str):
+        """Yield Gemini's answer for `prompt` in pieces as they are generated; raises LLMError on failure.
+
+        A cached answer comes back as one piece. Retries only happen before the first piece, and
+        closing the generator early (the client went away) closes the upstream connection.
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["streams"] += 1
+            cached = self._cache_get(prompt)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+        if cached is not None:
+            yield cached
+            return
+
+        res = self._post(prompt, stream=True)
+        res.encoding = "utf-8"  # text/event-stream has no charset, and requests would assume ISO-8859-1
+        pieces = []
+        try:
+            for line in res.iter_lines(decode_unicode=True):
+                data = sse_data(line) if line else None
+                text = extract_text(data) if data is not None else NO_ANSWER
+                if text != NO_ANSWER and text:
+                    pieces.append(text)
+                    yield text
+        except GeneratorExit:
+            self._cancelled()
+            raise
+        except (LLMError, requests.RequestException, ValueError) as exc:
+            self._failed()
+            raise LLMError(f"stream interrupted: {exc}") from exc
+        finally:
+            res.close()
+        self._streamed(prompt, pieces)
+        if not pieces:
+            yield NO_ANSWER
+
+    def _call(self, prompt: str) -> str:
+        res = self._post(prompt)
+        try:
+            answer = extract_text(res.json())
+        except Exception as exc:
+            self._failed()
+            raise LLMError(str(exc)) from exc
+        self.breaker.record(True)
+        return answer
+
+    def _request_args(self, prompt: str, stream: bool):
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        if stream:
+            return self.stream_url, {"key": self.api_key, "alt": "sse"}, payload
+        return self.url, {"key": self.api_key}, payload
+
+    def _post(self, prompt: str, stream: bool = False):
+        """POST through the breaker with retries and backoff; returns the successful response or raises LLMError."""
+        if not self.breaker.allow():
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise LLMError(f"circuit open after {self.breaker.failures} consecutive failures")
+        url, params, payload = self._request_args(prompt, stream)
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(self._retry_delay(attempt, last_error))
+            with self._lock:
+                self.stats["http_calls"] += 1
+            try:
+                res = self.session.post(url, params=params, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                last_error = exc
+                logging.warning(f"Gemini request failed (attempt {attempt + 1}): {exc}")
+                continue
+            except requests.RequestException as exc:
+                # Not worth retrying (redirect loop, bad URL, broken body), but still an outcome the
+                # breaker must see: a half-open trial that ends without one keeps the breaker shut
+                self._failed()
+                raise LLMError(f"{type(exc).__name__}: {exc}") from exc
+            if res.status_code in RETRY_STATUS:
+                last_error = res
+                res.close()
+                logging.warning(f"Gemini returned {res.status_code} (attempt {attempt + 1})")
+                continue
+            try:
+                res.raise_for_status()
+            except Exception as exc:
+                res.close()
+                self._failed()
+                raise LLMError(str(exc)) from exc
+            return res
+        self._failed()
+        raise self._gave_up(last_error)
+
+    def _streamed(self, prompt: str, pieces: list):
+        self.breaker.record(True)
+        if pieces:
+            with self._lock:
+                self._cache_put(prompt, "".join(pieces))
+
+    def _cancelled(self):
+        self.breaker.abandon()
+        with self._lock:
+            self.stats["cancelled"] += 1
+
+    def _gave_up(self, last_error) -> LLMError:
+        status = getattr(last_error, "status_code", None)
+        if status is not None:  # a requests or httpx response with a retryable status
+            reason = getattr(last_error, "reason", None) or getattr(last_error, "reason_phrase", "")
+            return LLMError(f"{status} {reason} after {self.retries + 1} attempts")
+        return LLMError(f"{last_error} after {self.retries + 1} attempts")
+
+    def _failed(self):
+        with self._lock:
+            self.stats["errors"] += 1
+        self.breaker.record(False)
+
+    def _retry_delay(self, attempt: int, last_error) -> float:
+        delay = self.backoff * (2 ** (attempt - 1))
+        retry_after = getattr(last_error, "headers", {}).get("Retry-After") if last_error is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return min(delay, GEMINI_READ_TIMEOUT) * random.uniform(0.8, 1.2)
+
+    # --- response cache (caller holds self._lock) ---
+    def _cache_get(self, prompt):
+        entry = self._cache.get(prompt)
+        if entry is None:
+            return None
+        if self.cache_ttl > 0 and time.monotonic() - entry[0] > self.cache_ttl:
+            del self._cache[prompt]
+            return None
+        self._cache.move_to_end(prompt)
+        return entry[1]
+
+    def _cache_put(self, prompt, answer):
+        if self.cache_size <= 0:
+            return
+        self._cache[prompt] = (time.monotonic(), answer)
+        self._cache.move_to_end(prompt)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats, cache_entries=len(self._cache), inflight=len(self._inflight),
+                        breaker=self.breaker.state)
+
+
+class AsyncGeminiClient(GeminiClient):
+    """asyncio version of GeminiClient on an httpx.AsyncClient, with the same cache, breaker and counters.
+
+    Create it inside the event loop that will use it (httpx binds its pool to that loop).
+    """
+
+    def _open_session(self, pool_size: int):
+        if httpx is None:
+            raise RuntimeError("httpx is not installed")
+        connect, read = self.timeout
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read, connect=connect),
+            headers={"Content-Type": "application/json"},
+        )
+
+    async def ask(self, prompt: str) -> str:
+        """Return Gemini's answer for `prompt`; raises LLMError on failure."""
+        with self._lock:
+            self.stats["requests"] += 1
+            cached = self._cache_get(prompt)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+            future = self._inflight.get(prompt)
+            leader = future is None
+            if leader:
+                future = self._inflight[prompt] = asyncio.get_running_loop().create_future()
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            answer = await self._call(prompt)
+        except BaseException as exc:  # includes CancelledError, so waiters are never left hanging
+            with self._lock:
+                self._inflight.pop(prompt, None)
+            if not isinstance(exc, Exception):
+                self.breaker.abandon()
+            future.set_exception(exc if isinstance(exc, Exception) else LLMError("request cancelled"))
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        with self._lock:
+            self._inflight.pop(prompt, None)
+            if answer != NO_ANSWER:
+                self._cache_put(prompt, answer)
+        future.set_result(answer)
+        return answer
+
+    async def stream(self, prompt: str):
+        """Async generator counterpart of GeminiClient.stream()."""
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["streams"] += 1
+            cached = self._cache_get(prompt)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+        if cached is not None:
+            yield cached
+            return
+
+        res = await self._post(prompt, stream=True)
+        pieces = []
+        try:
+            async for line in res.aiter_lines():
+                data = sse_data(line) if line else None
+                text = extract_text(data) if data is not None else NO_ANSWER
+                if text != NO_ANSWER and text:
+                    pieces.append(text)
+                    yield text
+        except (GeneratorExit, asyncio.CancelledError):
+            self._cancelled()
+            raise
+        except (LLMError, httpx.HTTPError, ValueError) as exc:
+            self._failed()
+            raise LLMError(f"stream interrupted: {exc}") from exc
+        finally:
+            await res.aclose()
+        self._streamed(prompt, pieces)
+        if not pieces:
+            yield NO_ANSWER
+
+    async def _call(self, prompt: str) -> str:
+        res = await self._post(prompt)
+        try:
+            answer = extract_text(res.json())
+        except Exception as exc:
+            self._failed()
+            raise LLMError(str(exc)) from exc
+        self.breaker.record(True)
+        return answer
+
+    async def _post(self, prompt: str, stream: bool = False):
+        if not self.breaker.allow():
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise LLMError(f"circuit open after {self.breaker.failures} consecutive failures")
+        url, params, payload = self._request_args(prompt, stream)
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                with self._lock:
+                    self.stats["retries"] += 1
+                await asyncio.sleep(self._retry_delay(attempt, last_error))
+            with self._lock:
+                self.stats["http_calls"] += 1
+            try:
+                res = await self.session.send(self.session.build_request("POST", url, params=params, json=payload),
+                                              stream=stream)
+            except httpx.TransportError as exc:
+                last_error = exc
+                logging.warning(f"Gemini request failed (attempt {attempt + 1}): {exc!r}")
+                continue
+            except (httpx.HTTPError, httpx.InvalidURL) as exc:
+                self._failed()
+                raise LLMError(f"{type(exc).__name__}: {exc}") from exc
+            if res.status_code in RETRY_STATUS:
+                last_error = res
+                await res.aclose()
+                logging.warning(f"Gemini returned {res.status_code} (attempt {attempt + 1})")
+                continue
+            try:
+                res.raise_for_status()
+            except Exception as exc:
+                await res.aclose()
+                self._failed()
+                raise LLMError(str(exc)) from exc
+            return res
+        self._failed()
+        raise self._gave_up(last_error)
+
+    async def aclose(self):
+        await self.session.aclose()
@@ -0,0 +1,146 @@
+# log_setup.py
+# Non-blocking logging: request threads enqueue records, one listener thread formats and writes them
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+from metrics import current_trace_id
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()  # "text" or "json" (one object per line)
+LOG_FILE = os.environ.get("LOG_FILE", "")  # also write to a size-rotated file when set
+LOG_FILE_MAX_BYTES = int(os.environ.get("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_FILE_BACKUPS = int(os.environ.get("LOG_FILE_BACKUPS", "5"))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))  # records beyond this are dropped, never waited on
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.01"))  # share of requests that log verbose DEBUG detail
+LOG_MAX_FIELD = int(os.environ.get("LOG_MAX_FIELD", "512"))  # chars kept from any dumped payload
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+# LogRecord attributes that are not user-supplied `extra=` fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+_state = {"listener": None, "dropped": 0}
+_lock = threading.Lock()
+
+
+class Capped:
+    """Log argument that is only stringified (and cut to `limit` chars) if the record is actually written."""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit: int = None):
+        self.value = value
+        self.limit = LOG_MAX_FIELD if limit is None else limit
+
+    def _cap(self, text: str) -> str:
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}...[{len(text) - self.limit} more chars]"
+
+    def __str__(self):
+        return self._cap(self.value.hex() if isinstance(self.value, (bytes, bytearray)) else str(self.value))
+
+    def __repr__(self):
+        return self._cap(self.value.hex() if isinstance(self.value, (bytes, bytearray)) else repr(self.value))
+
+
+def capped(value, limit: int = None) -> Capped:
+    return Capped(value, limit)
+
+
+def sample(logger=logging.root) -> bool:
+    """True for a LOG_SAMPLE_RATE share of calls when DEBUG is enabled; guard expensive debug dumps with it."""
+    return logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_SAMPLE_RATE
+
+
+class _TraceIdFilter(logging.Filter):
+    """Stamp records with the current request's trace id while still on the request thread."""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id()
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener without formatting them; drops (and counts) them if the queue is full."""
+
+    def prepare(self, record):
+        # %-formatting of msg/args happens on the listener thread. Only tracebacks are rendered
+        # here, because their frames would be gone (or changed) by then.
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _lock:
+                _state["dropped"] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value if isinstance(value, (int, float, bool, type(None))) else str(capped(value))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(process_label: str = "", force: bool = False):
+    """Route the root logger through a bounded queue to a background listener.
+
+    Idempotent unless `force`, which replaces an existing setup (e.g. to label a worker process).
+    """
+    with _lock:
+        if _state["listener"] is not None:
+            if not force:
+                return _state["listener"]
+            _state["listener"].stop()
+        formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(
+            TEXT_FORMAT.replace("%(message)s", f"[{process_label}] %(message)s") if process_label else TEXT_FORMAT)
+        handlers = [logging.StreamHandler(sys.stderr)]
+        if LOG_FILE:
+            handlers.append(logging.handlers.RotatingFileHandler(
+                LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        queue_handler = _NonBlockingQueueHandler(log_queue)
+        queue_handler.addFilter(_TraceIdFilter())
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(queue_handler)
+        root.setLevel(LOG_LEVEL)
+
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)  # flush what is queued on shutdown
+        _state["listener"] = listener
+        return listener
+
+
+def dropped_records() -> int:
+    return _state["dropped"]
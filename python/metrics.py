@@ -0,0 +1,232 @@
+# metrics.py
+# Minimal Prometheus text-format metrics plus optional per-request trace spans written as JSONL
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+TRACE_FILE = os.environ.get("TRACE_FILE", "")  # append one JSON line per traced request when set
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0  # unlabelled counters are exported from the start
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Set explicitly, or pass `fn` to sample the value when /metrics is scraped."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), fn=None):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        if self.fn is not None:
+            try:
+                self.set(self.fn())
+            except Exception:
+                logging.debug(f"gauge {self.name} callback failed", exc_info=True)
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]  # per-bucket counts, sum, count
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, [('le', _fmt_value(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Pipeline metrics ---
+STAGE_SECONDS = Histogram("voice_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+REQUEST_SECONDS = Histogram("voice_request_seconds", "End-to-end request latency", ["endpoint"])
+REQUESTS = Counter("voice_requests_total", "HTTP requests by endpoint and status code", ["endpoint", "status"])
+CACHE_LOOKUPS = Counter("voice_transcript_cache_total", "Transcript cache lookups", ["result"])
+VAD_REJECTS = Counter("voice_vad_rejects_total", "Clips rejected by VAD as containing no speech")
+DECODE_FAILURES = Counter("voice_decode_failures_total", "Uploads that could not be decoded", ["reason"])
+LLM_ERRORS = Counter("voice_llm_errors_total", "Gemini calls that failed")
+LLM_FIRST_TOKEN_SECONDS = Histogram("voice_llm_first_token_seconds", "Time from asking Gemini to the first streamed piece of its answer")
+ENGINE_REJECTS = Counter("voice_engine_rejects_total", "Transcriptions refused by the engine", ["reason"])
+CASCADE_ESCALATIONS = Counter("voice_cascade_escalations_total", "Clips re-run on the cascade's larger model", ["reason"])
+
+
+# --- Tracing ---
+_current_trace = contextvars.ContextVar("voice_trace", default=None)
+_trace_queue = queue.Queue(maxsize=10000)
+_trace_writer = None
+_trace_writer_lock = threading.Lock()
+
+
+def _write_traces():
+    with open(TRACE_FILE, "a", encoding="utf-8") as f:
+        while True:
+            record = _trace_queue.get()
+            record = {k: v for k, v in record.items() if k != "_t0"}
+            f.write(json.dumps(record, default=str) + "\n")
+            if _trace_queue.empty():
+                f.flush()
+
+
+def start_trace(name: str, **attrs):
+    """Begin a trace for the current request/context. No-op (returns None) when TRACE_FILE is unset."""
+    if not TRACE_FILE:
+        return None
+    trace = {"trace_id": uuid.uuid4().hex[:16], "name": name, "start": time.time(),
+             "_t0": time.perf_counter(), "attrs": attrs, "spans": []}
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace_id():
+    trace = _current_trace.get()
+    return trace["trace_id"] if trace is not None else None
+
+
+def end_trace(**attrs):
+    """Finish the current trace and hand it to the background writer thread."""
+    global _trace_writer
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    _current_trace.set(None)
+    trace["attrs"].update(attrs)
+    trace["duration_ms"] = round((time.perf_counter() - trace["_t0"]) * 1000, 3)
+    if _trace_writer is None:
+        with _trace_writer_lock:
+            if _trace_writer is None:
+                _trace_writer = threading.Thread(target=_write_traces, name="trace-writer", daemon=True)
+                _trace_writer.start()
+    try:
+        _trace_queue.put_nowait(trace)
+    except queue.Full:
+        pass  # never block a request on trace export
+
+
+@contextlib.contextmanager
+def stage(name: str, **attrs):
+    """Time a pipeline stage into voice_stage_seconds and, if tracing, record it as a span."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace["spans"].append({
+                "span": name,
+                "offset_ms": round((started - trace["_t0"]) * 1000, 3),
+                "duration_ms": round(elapsed * 1000, 3),
+                **attrs,
+            })
@@ -0,0 +1,102 @@
+# model_loader.py
+# Background engine start-up so the HTTP server can bind before the model is loaded and warmed up
+import contextlib
+import logging
+import threading
+import time
+
+import numpy as np
+
+from audio_pipeline import SAMPLE_RATE
+
+
+class EngineNotReady(RuntimeError):
+    """Raised while the model is still loading (or failed to load); callers should answer 503."""
+
+
+def synthetic_clip(seconds: float = 1.0, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """A short deterministic tone-plus-noise clip: enough to push every kernel through the encoder and decoder."""
+    t = np.arange(int(seconds * sample_rate), dtype=np.float32) / sample_rate
+    rng = np.random.default_rng(0)
+    clip = 0.1 * np.sin(2 * np.pi * 220.0 * t) + 0.01 * rng.standard_normal(len(t))
+    return clip.astype(np.float32)
+
+
+def warm_up(backend, options: dict) -> float:
+    """Run one throwaway transcription so the first real request doesn't pay for lazy init. Returns seconds."""
+    started = time.perf_counter()
+    try:
+        backend.transcribe(synthetic_clip(), **dict(options))
+    except Exception:
+        logging.exception("warm-up transcription failed (continuing)")
+    return time.perf_counter() - started
+
+
+class EngineLoader:
+    """Builds the inference engine on a background thread and records how long each phase took.
+
+    `build` receives a `phase(name)` context-manager factory and returns the engine;
+    `get()` returns it once ready and raises EngineNotReady before that.
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._engine = None
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.phases = {}  # name -> seconds
+        self.started_at = None
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self.started_at = time.perf_counter()
+                self._thread = threading.Thread(target=self._run, name="engine-loader", daemon=True)
+                self._thread.start()
+        return self
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 3)
+            logging.info(f"Startup phase '{name}' took {self.phases[name]:.2f}s")
+
+    def _run(self):
+        try:
+            self._engine = self._build(self.phase)
+        except Exception as exc:
+            logging.exception("Engine failed to load")
+            self._error = f"{type(exc).__name__}: {exc}"
+        else:
+            self.phases["total"] = round(time.perf_counter() - self.started_at, 3)
+            logging.info(f"Engine ready in {self.phases['total']:.2f}s ({self.phases})")
+        finally:
+            self._ready.set()
+
+    @property
+    def state(self) -> str:
+        if self._thread is None:
+            return "idle"
+        if not self._ready.is_set():
+            return "loading"
+        return "failed" if self._error else "ready"
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._ready.wait(timeout) and self._error is None
+
+    def get(self):
+        if self._engine is not None:
+            return self._engine
+        if self._thread is None:
+            self.start()
+        if self._error:
+            raise EngineNotReady(f"model failed to load: {self._error}")
+        raise EngineNotReady("model is still loading")
+
+    def status(self) -> dict:
+        return {"state": self.state, "phases": dict(self.phases), "error": self._error}
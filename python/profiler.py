@@ -0,0 +1,176 @@
+# profiler.py
+# On-demand profiling: a stack sampler over every thread (collapsed stacks for flamegraphs) and per-request cProfile
+import collections
+import cProfile
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "voice-profiles")
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "10"))  # 100 Hz: ~1% of one core
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "600"))
+
+# Leaf frames of a thread that is parked waiting for work; left out unless idle stacks are asked for
+_IDLE_LEAVES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+    ("selectors.py", "select"), ("thread.py", "_worker"), ("connection.py", "_recv"),
+    ("connection.py", "_poll"), ("socket.py", "accept"), ("socket.py", "readinto"),
+}
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the Python stack of every thread every `interval_ms` and counts identical stacks.
+
+    One session runs at a time. It stops after `seconds`, after `requests` completed requests
+    (counted through request_done()) or on stop(), whichever comes first. The result is written as
+    "thread;outer frame;...;leaf frame count" lines, the collapsed format flamegraph.pl,
+    speedscope and inferno read. Sampling never stops the world: a tick only reads frame
+    objects, so a request in flight pays nothing but the GIL hand-off.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._requests_left = None
+        self.session = None
+        self.last = None
+
+    def start(self, seconds: float = 30.0, requests: int = 0, interval_ms: float = PROFILE_INTERVAL_MS,
+              idle: bool = False) -> dict:
+        """Begin a session; raises RuntimeError if one is already running."""
+        seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+        interval_ms = max(interval_ms, 1.0)
+        with self._lock:
+            if self._thread is not None:
+                raise RuntimeError("a profiling session is already running")
+            os.makedirs(self.directory, exist_ok=True)
+            name = time.strftime("sample-%Y%m%d-%H%M%S") + f"-{os.getpid()}.collapsed"
+            self.session = {"file": os.path.join(self.directory, name), "seconds": seconds,
+                            "requests": requests or None, "interval_ms": interval_ms, "idle": idle,
+                            "started": time.time(), "samples": 0, "completed_requests": 0}
+            self._requests_left = requests or None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(self.session,), name="stack-sampler",
+                                            daemon=True)
+            self._thread.start()
+        logging.info("Stack sampler started: %.0fs / %s requests at %.0f ms -> %s",
+                     seconds, requests or "any", interval_ms, self.session["file"])
+        return self.status()
+
+    def stop(self) -> dict:
+        """End the running session early (its file is still written); returns the final status."""
+        thread = self._thread
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+        return self.status()
+
+    def request_done(self):
+        """Called once per finished request; ends a request-bounded session after its Nth request."""
+        if self._thread is None:
+            return
+        with self._lock:
+            if self.session is not None:
+                self.session["completed_requests"] += 1
+            if self._requests_left is not None:
+                self._requests_left -= 1
+                if self._requests_left <= 0:
+                    self._stop.set()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"running": self._thread is not None, "session": dict(self.session) if self.session else None,
+                    "last": dict(self.last) if self.last else None}
+
+    def _run(self, session):
+        stacks = collections.Counter()
+        me = threading.get_ident()
+        interval = session["interval_ms"] / 1000.0
+        deadline = time.monotonic() + session["seconds"]
+        try:
+            while not self._stop.wait(interval) and time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    code = frame.f_code
+                    if not session["idle"] and (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame.f_code))
+                        frame = frame.f_back
+                    labels.append(names.get(ident, f"thread-{ident}"))
+                    stacks[";".join(reversed(labels))] += 1
+                session["samples"] += 1
+        finally:
+            self._write(session, stacks)
+
+    def _write(self, session, stacks):
+        try:
+            with open(session["file"], "w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError:
+            logging.exception("could not write profile %s", session["file"])
+        with self._lock:
+            session["elapsed"] = round(time.time() - session["started"], 2)
+            session["stacks"] = len(stacks)
+            self.last = session
+            self.session = None
+            self._thread = None
+        logging.info("Stack sampler wrote %d stacks (%d ticks) to %s",
+                     len(stacks), session["samples"], session["file"])
+
+
+_REQUEST_SEQ = itertools.count(1)
+
+
+class RequestProfile:
+    """cProfile around one request's view function; `run()` writes a pstats file.
+
+    The profiler is enabled and disabled in the same call, on the thread that runs the view, so it
+    never outlives the request or ends up hooked on a different thread. Only that thread is profiled:
+    time spent waiting on the inference scheduler shows up as a Future wait, which is what the stack
+    sampler is for. Streamed bodies are generated after the view returns and are not included.
+    """
+
+    def __init__(self, label: str, directory: str = PROFILE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        slug = "".join(c if c.isalnum() else "_" for c in label.strip("/")) or "root"
+        # The sequence number keeps two requests in the same second from overwriting each other's file
+        name = time.strftime("request-%Y%m%d-%H%M%S") + f"-{slug}-{os.getpid()}-{next(_REQUEST_SEQ)}.prof"
+        self.path = os.path.join(directory, name)
+        self._profile = cProfile.Profile()
+        self.written = False
+
+    def run(self, fn, *args, **kwargs):
+        """Call `fn` under the profiler and dump the stats; `fn` still runs if profiling is unavailable."""
+        try:
+            self._profile.enable()
+        except ValueError as exc:  # another profiler already owns this interpreter (3.12+)
+            logging.warning("cannot profile request: %s", exc)
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._profile.disable()
+            try:
+                self._profile.dump_stats(self.path)
+                self.written = True
+                logging.info("Request profile written to %s", self.path)
+            except OSError:
+                logging.exception("could not write request profile %s", self.path)
+
+
+PROFILER = SamplingProfiler()
@@ -0,0 +1,71 @@
+# profiles.py
+# Named transcription profiles: each maps to a fixed set of decode options, built once at import
+import collections
+import os
+
+TRANSCRIBE_PROFILE = os.environ.get("TRANSCRIBE_PROFILE", "command")  # used when a request names none
+# Prompt the "command" profile with the registry's app/website names (see set_vocabulary)
+TRANSCRIBE_VOCAB_PROMPT = os.environ.get("TRANSCRIBE_VOCAB_PROMPT", "1").lower() in ("1", "true", "yes", "on")
+COMMAND_MAX_TOKENS = int(os.environ.get("COMMAND_MAX_TOKENS", "48"))  # decode steps per clip in "command"; 0 = no cap
+
+# Shared by every profile
+_BASE = dict(
+    language="en",  # Force English for better accuracy
+    task="transcribe",
+    verbose=None,  # openai-whisper: no per-segment printing and no progress bar
+    condition_on_previous_text=False,  # Don't use previous context
+    compression_ratio_threshold=2.4,  # Detect repetitive content
+    logprob_threshold=-1.0,  # Confidence threshold
+)
+
+_PROFILE_OPTIONS = {
+    # Push-to-talk commands: a few words, so greedy decoding without timestamp tokens or word
+    # alignment, and silence/noise is dropped more eagerly
+    "command": dict(
+        _BASE,
+        temperature=0.0,
+        beam_size=1,
+        without_timestamps=True,
+        word_timestamps=False,
+        no_speech_threshold=0.45,
+        sample_len=COMMAND_MAX_TOKENS or None,  # a command is a few tokens; also bounds runaway hallucinations
+    ),
+    # Longer free-form speech: beam search with temperature fallback and word timings
+    "dictation": dict(
+        _BASE,
+        temperature=(0.0, 0.2, 0.4),
+        beam_size=5,
+        word_timestamps=True,
+        no_speech_threshold=0.6,
+    ),
+}
+
+
+# `options` is shared between requests: pass it as **options or copy it, never mutate it.
+# `vocabulary`: decode with the command-registry prompt and snap transcripts to known commands.
+Profile = collections.namedtuple("Profile", ["name", "options", "vocabulary"])
+
+_VOCABULARY_PROFILES = {"command"}
+
+PROFILES = {name: Profile(name, options, name in _VOCABULARY_PROFILES) for name, options in _PROFILE_OPTIONS.items()}
+if TRANSCRIBE_PROFILE not in PROFILES:
+    raise ValueError(f"TRANSCRIBE_PROFILE={TRANSCRIBE_PROFILE!r}; expected one of {sorted(PROFILES)}")
+DEFAULT_PROFILE = PROFILES[TRANSCRIBE_PROFILE]
+
+
+def set_vocabulary(prompt: str):
+    """Install the registry-derived initial prompt into vocabulary profiles. Call before serving."""
+    for profile in PROFILES.values():
+        if not profile.vocabulary:
+            continue
+        if prompt and TRANSCRIBE_VOCAB_PROMPT:
+            profile.options["initial_prompt"] = prompt
+        else:
+            profile.options.pop("initial_prompt", None)
+
+
+def get_profile(name=None) -> Profile:
+    """Profile by name (None/empty = the default); raises KeyError for unknown names."""
+    if not name:
+        return DEFAULT_PROFILE
+    return PROFILES[name.strip().lower()]
@@ -0,0 +1,152 @@
+# raw_audio.py
+# Declared raw upload formats (PCM samples, Opus frames): decoded in-process without a container demux
+import collections
+import importlib.util
+import math
+import struct
+
+import numpy as np
+
+from audio_pipeline import SAMPLE_RATE
+from decoder_pool import DECODER_CHUNK_BYTES, HAVE_PYAV, DecodeError
+
+HAVE_SCIPY = importlib.util.find_spec("scipy") is not None
+
+# Content-Type (parameters: rate, channels) -> sample codec. Anything else is treated as a container.
+#   audio/L16;rate=16000              big-endian 16-bit PCM (RFC 2586)
+#   audio/s16le;rate=16000;channels=1 little-endian 16-bit PCM (what Int16Array / numpy write)
+#   audio/f32le;rate=16000            little-endian float32 PCM (Web Audio's native format)
+#   audio/x-opus-frames;rate=48000    Opus packets, each prefixed by its length as a 2-byte big-endian int
+RAW_TYPES = {
+    "audio/l16": "s16be",
+    "audio/s16le": "s16le",
+    "audio/f32le": "f32le",
+    "audio/x-opus-frames": "opus",
+}
+_DTYPES = {"s16be": ">i2", "s16le": "<i2", "f32le": "<f4"}
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+RawFormat = collections.namedtuple("RawFormat", ["codec", "rate", "channels"])
+
+
+def parse_raw_format(content_type):
+    """RawFormat for a declared raw type, None for anything else (containers go to the decoder pool).
+
+    Raises DecodeError("unsupported") for a raw type with bad parameters, or Opus frames without PyAV.
+    """
+    if not content_type:
+        return None
+    mimetype, _, params = content_type.partition(";")
+    codec = RAW_TYPES.get(mimetype.strip().lower())
+    if codec is None:
+        return None
+    options = {}
+    for param in params.split(";"):
+        key, _, value = param.partition("=")
+        options[key.strip().lower()] = value.strip().strip('"')
+    try:
+        rate = int(options.get("rate") or (48000 if codec == "opus" else SAMPLE_RATE))
+        channels = int(options.get("channels") or 1)
+    except ValueError as exc:
+        raise DecodeError("unsupported", f"rate and channels must be integers in {content_type!r}") from exc
+    if not 8000 <= rate <= 192000 or not 1 <= channels <= 8:
+        raise DecodeError("unsupported", f"rate {rate} / channels {channels} out of range")
+    if codec == "opus":
+        if not HAVE_PYAV:
+            raise DecodeError("unsupported", "Opus frames need PyAV (pip install av) on the server")
+        if rate not in OPUS_RATES or channels > 2:
+            raise DecodeError("unsupported", f"Opus decodes at {OPUS_RATES} Hz, mono or stereo")
+    return RawFormat(codec, rate, channels)
+
+
+def _lowpass(audio: np.ndarray, cutoff: float) -> np.ndarray:
+    """Windowed-sinc FIR low-pass; `cutoff` is in cycles per sample (0.5 is Nyquist)."""
+    taps = 2 * int(math.ceil(4 / cutoff)) + 1  # transition band ~0.4 x cutoff (Hamming)
+    t = np.arange(taps) - taps // 2
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * t) * np.hamming(taps)
+    kernel /= kernel.sum()
+    return np.convolve(audio, kernel.astype(np.float32), mode="same")
+
+
+def resample(audio: np.ndarray, rate: int, target: int = SAMPLE_RATE) -> np.ndarray:
+    """Band-limited resample. Clients are expected to send 16 kHz; this covers the ones that don't.
+
+    Uses scipy's polyphase filter when installed; otherwise low-passes below the target's Nyquist before
+    linear interpolation, so energy above it (fans, sibilants at 44.1/48 kHz) does not fold into the speech band.
+    """
+    if rate == target or len(audio) == 0:
+        return audio
+    if HAVE_SCIPY:
+        from scipy.signal import resample_poly
+        g = math.gcd(rate, target)
+        return resample_poly(audio, target // g, rate // g).astype(np.float32)
+    if target < rate:
+        audio = _lowpass(audio, 0.45 * target / rate)
+    n = int(len(audio) * target / rate)
+    return np.interp(np.arange(n) * (rate / target), np.arange(len(audio)), audio).astype(np.float32)
+
+
+def _pcm(data: bytes, fmt: RawFormat) -> np.ndarray:
+    dtype = np.dtype(_DTYPES[fmt.codec])
+    if len(data) % (dtype.itemsize * fmt.channels):
+        raise DecodeError("invalid", f"{len(data)} bytes is not a whole number of {fmt.codec} frames "
+                                     f"of {fmt.channels} channel(s)")
+    audio = np.frombuffer(data, dtype=dtype).astype(np.float32)
+    if dtype.kind == "i":
+        audio /= 32768.0
+    elif not np.isfinite(audio).all():
+        raise DecodeError("invalid", "float samples contain NaN or infinity")
+    if fmt.channels > 1:
+        audio = audio.reshape(-1, fmt.channels).mean(axis=1)
+    return audio
+
+
+def _opus_frames(data: bytes, fmt: RawFormat) -> np.ndarray:
+    import av
+    decoder = av.CodecContext.create("opus", "r")
+    decoder.sample_rate = fmt.rate
+    decoder.layout = "stereo" if fmt.channels == 2 else "mono"
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=fmt.rate)
+    chunks, pos = [], 0
+    try:
+        while pos < len(data):
+            if pos + 2 > len(data):
+                raise DecodeError("invalid", f"truncated frame length at byte {pos}")
+            (size,) = struct.unpack_from(">H", data, pos)
+            packet = data[pos + 2:pos + 2 + size]
+            if len(packet) < size:
+                raise DecodeError("invalid", f"truncated Opus frame at byte {pos}")
+            pos += 2 + size
+            for frame in decoder.decode(av.Packet(packet)):
+                frame.pts = None
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+    except av.FFmpegError as exc:
+        raise DecodeError("invalid", f"bad Opus frame: {exc}") from exc
+    if not chunks:
+        raise DecodeError("no_audio", "no Opus frames decoded")
+    return np.concatenate(chunks)
+
+
+def read_raw(stream, fmt: RawFormat, max_seconds: float) -> bytes:
+    """Read a raw upload in DECODER_CHUNK_BYTES pieces; raises DecodeError("too_long") at the first PCM byte
+    past `max_seconds` instead of buffering the rest of the body (Opus length is only known once decoded)."""
+    limit = None
+    if fmt.codec != "opus":
+        limit = int(max_seconds * fmt.rate) * fmt.channels * np.dtype(_DTYPES[fmt.codec]).itemsize
+    data = bytearray()
+    for chunk in iter(lambda: stream.read(DECODER_CHUNK_BYTES), b""):
+        data += chunk
+        if limit is not None and len(data) > limit:
+            raise DecodeError("too_long", f"audio is longer than {max_seconds:.0f}s")
+    return bytes(data)
+
+
+def decode_raw(data: bytes, fmt: RawFormat, max_seconds: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Decode a declared raw upload to mono float32 PCM at `sample_rate`; raises DecodeError."""
+    if not data:
+        raise DecodeError("empty", "no audio data")
+    audio = _opus_frames(data, fmt) if fmt.codec == "opus" else _pcm(data, fmt)
+    if len(audio) > max_seconds * fmt.rate:
+        raise DecodeError("too_long", f"audio is longer than {max_seconds:.0f}s")
+    return resample(audio, fmt.rate, sample_rate)
@@ -0,0 +1,146 @@
+# scheduler.py
+# Dynamic micro-batching: requests arriving within a few ms share one batched model pass
+import concurrent.futures
+import logging
+import os
+import queue
+import threading
+import time
+
+WHISPER_BATCH_SIZE = int(os.environ.get("WHISPER_BATCH_SIZE", "8"))
+WHISPER_BATCH_WAIT_MS = float(os.environ.get("WHISPER_BATCH_WAIT_MS", "10"))
+WHISPER_BATCH_WORKERS = int(os.environ.get("WHISPER_BATCH_WORKERS", "1"))
+WHISPER_MAX_QUEUE = int(os.environ.get("WHISPER_MAX_QUEUE", "32"))  # clips waiting for the model, 0 = unbounded
+
+
+class EngineBusy(RuntimeError):
+    """Raised by submit() when the inference queue is full; callers should answer 429."""
+
+
+def options_key(options: dict):
+    """Hashable identity of a transcribe options dict; only clips with equal keys share a batch."""
+    return tuple(sorted((k, repr(v)) for k, v in options.items()))
+
+
+class _Job:
+    __slots__ = ("audio", "options", "key", "future", "enqueued")
+
+    def __init__(self, audio, options):
+        self.audio = audio
+        self.options = options
+        self.key = options_key(options)
+        self.future = concurrent.futures.Future()
+        self.enqueued = time.perf_counter()
+
+
+class BatchScheduler:
+    """Queue decoded audio and run it through `backend.transcribe_batch()` in small batches.
+
+    A worker blocks for the first job, then keeps collecting until `max_batch_size` jobs are
+    queued or `max_wait_ms` has passed. Jobs are grouped by options so every batch is
+    homogeneous, and each caller gets its own result through a Future.
+    """
+
+    def __init__(self, backend, max_batch_size: int = WHISPER_BATCH_SIZE,
+                 max_wait_ms: float = WHISPER_BATCH_WAIT_MS, workers: int = WHISPER_BATCH_WORKERS,
+                 max_queue: int = WHISPER_MAX_QUEUE):
+        self.backend = backend
+        self.max_queue = max_queue
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self.stats = {"requests": 0, "batches": 0, "batched_requests": 0, "rejected": 0}
+        self._stats_lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._run, name=f"whisper-batch-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._workers:
+            t.start()
+
+    def submit(self, audio, options: dict) -> concurrent.futures.Future:
+        """Queue one clip; the Future resolves to the backend's result dict."""
+        if self._stopped.is_set():
+            raise RuntimeError("scheduler is shut down")
+        if self.max_queue and self._queue.qsize() >= self.max_queue:
+            with self._stats_lock:
+                self.stats["rejected"] += 1
+            raise EngineBusy(f"inference queue is full ({self.max_queue} clips waiting)")
+        job = _Job(audio, dict(options))
+        self._queue.put(job)
+        return job.future
+
+    def transcribe(self, audio, **options) -> dict:
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(audio, options).result()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        batches = stats["batches"]
+        return dict(stats, type="scheduler", queued=self.qsize(), max_batch_size=self.max_batch_size,
+                    avg_batch_size=round(stats["requests"] / batches, 2) if batches else 0.0)
+
+    def shutdown(self):
+        self._stopped.set()
+        for _ in self._workers:
+            self._queue.put(None)
+        for t in self._workers:
+            t.join(timeout=5)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)  # let the sentinel reach this worker's next loop
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if batch is None:
+                return
+            groups = {}
+            for job in batch:
+                groups.setdefault(job.key, []).append(job)
+            for jobs in groups.values():
+                self._run_group(jobs)
+
+    def _run_group(self, jobs):
+        jobs = [j for j in jobs if j.future.set_running_or_notify_cancel()]
+        if not jobs:
+            return
+        started = time.perf_counter()
+        try:
+            results = self.backend.transcribe_batch([j.audio for j in jobs], **jobs[0].options)
+        except Exception as exc:
+            logging.exception(f"batch of {len(jobs)} failed")
+            for j in jobs:
+                j.future.set_exception(exc)
+            return
+        for j, res in zip(jobs, results):
+            j.future.set_result(res)
+        with self._stats_lock:
+            self.stats["requests"] += len(jobs)
+            self.stats["batches"] += 1
+            if len(jobs) > 1:
+                self.stats["batched_requests"] += len(jobs)
+        waited = max(started - j.enqueued for j in jobs)
+        logging.debug("Ran batch of %d in %.3fs (max queue wait %.1fms)", len(jobs), time.perf_counter() - started, waited * 1000)
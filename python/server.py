@@ -1,24 +1,3 @@
-# --- Helper: Convert webm to wav for Whisper compatibility ---
-def convert_webm_to_wav(webm_path):
-    """Convert a .webm file to .wav using ffmpeg. Returns wav path or None on failure."""
-    wav_path = webm_path.replace('.webm', '.wav')
-    cmd = [
-        'ffmpeg', '-y', '-i', webm_path,
-        '-ar', '16000',  # 16kHz sample rate optimal for speech
-        '-ac', '1',      # Mono channel
-        '-acodec', 'pcm_s16le',  # 16-bit PCM encoding
-        '-f', 'wav',     # WAV format
-        wav_path
-    ]
-    try:
-        result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if os.path.exists(wav_path) and os.path.getsize(wav_path) > 44:  # WAV header is 44 bytes
-            return wav_path
-        else:
-            return None
-    except Exception:
-        return None
-
 # --- Helper: Validate audio file ---
 def validate_audio_file(file_path):
     """Validate that the audio file exists and has reasonable content."""
@@ -29,7 +8,6 @@ def validate_audio_file(file_path):
     return True, ""
 
 from flask import Flask, request, jsonify
-import subprocess
 import os
 
 app = Flask(__name__)
@@ -85,35 +63,48 @@ APP_COMMANDS = {
 # ...existing code...
 import warnings
 warnings.filterwarnings("ignore", message="pkg_resources is deprecated")
+import time
+_IMPORT_STARTED = time.perf_counter()  # reported as the "server_import" startup phase
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 import os
-import tempfile
-import requests
-import whisper
-try:
-    from faster_whisper import WhisperModel
-    HAVE_FAST_WHISPER = True
-except Exception:
-    WhisperModel = None
-    HAVE_FAST_WHISPER = False
 import logging
 import json
-import platform
-import subprocess
 import webbrowser
-import re
-import time
+import multiprocessing
 import concurrent.futures
+import contextlib
+import functools
+import hmac
+import shutil
+import signal
+import threading
+import tempfile
 
-# optional: screenshot
-try:
-    import pyautogui
-except Exception:
-    pyautogui = None
+from asr_backends import WHISPER_BACKEND, load_backend
+from batch_transcribe import iter_inputs, transcribe_items
+from cascade import WHISPER_CASCADE_MODEL, CascadeEngine
+from audio_pipeline import SAMPLE_RATE, trim_silence
+from app_index import APP_INDEX, allow_path_executables
+from command_registry import COMMANDS_FILE, CommandRegistry
+from decoder_pool import DECODER, BoundedStream, DecodeError
+from llm_client import GEMINI_API_KEY, GeminiClient
+from log_setup import capped, dropped_records, sample, setup_logging
+from metrics import (CACHE_LOOKUPS, CASCADE_ESCALATIONS, CONTENT_TYPE, DECODE_FAILURES, ENGINE_REJECTS, LLM_ERRORS,
+                     LLM_FIRST_TOKEN_SECONDS, REQUEST_SECONDS, REQUESTS, VAD_REJECTS, Gauge, end_trace, stage, start_trace)
+from metrics import REGISTRY as METRICS
+from model_loader import EngineLoader, EngineNotReady, warm_up
+from profiler import PROFILE_INTERVAL_MS, PROFILER, RequestProfile
+from profiles import DEFAULT_PROFILE, PROFILES, get_profile, set_vocabulary
+from raw_audio import decode_raw, parse_raw_format, read_raw
+from scheduler import BatchScheduler, EngineBusy
+from worker_pool import WHISPER_WORKER_PROCESSES, WORKER_NAME_PREFIX, WorkerPool
+from streaming import StreamRegistry, TooManyStreams, sse_event
+from transcript_cache import TRANSCRIPT_CACHE, TranscriptCache, audio_fingerprint, cache_key
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+# LOG_LEVEL, LOG_FORMAT=json, LOG_FILE rotation and debug sampling live in log_setup.py
+setup_logging()
 
 app = Flask(__name__)
 CORS(app)
@@ -121,86 +112,166 @@ CORS(app)
 
 # Configuration
 MODEL_NAME = os.environ.get("WHISPER_MODEL", "tiny")
+# Engine selection (WHISPER_BACKEND, WHISPER_COMPUTE_TYPE, WHISPER_THREADS) lives in asr_backends.py
+# Run recognized commands straight from /transcribe; override per request with ?execute=0/1
+FUSED_EXECUTE = os.environ.get("FUSED_EXECUTE", "1").lower() in ("1", "true", "yes", "on")
+# Parse and dispatch commands without launching anything (benchmarks, CI)
+COMMANDS_DRY_RUN = os.environ.get("COMMANDS_DRY_RUN", "0").lower() in ("1", "true", "yes", "on")
+# How long an app command waits for its exec before answering "Launching X" instead of "Opened X" (0 = never)
+APP_LAUNCH_CONFIRM_SECONDS = float(os.environ.get("APP_LAUNCH_CONFIRM_SECONDS", "0.5"))
+# Let /transcribe/batch read a directory or manifest from this machine's disk (off: uploads only)
+BATCH_LOCAL_PATHS = os.environ.get("BATCH_LOCAL_PATHS", "0").lower() in ("1", "true", "yes", "on")
+# Request body limits. Werkzeug answers 413 from Content-Length before anything is read; chunked
+# bodies are cut off at the limit while streaming. Decoded length is capped by DECODER_MAX_SECONDS.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+BATCH_MAX_UPLOAD_BYTES = int(os.environ.get("BATCH_MAX_UPLOAD_BYTES", str(2 * 1024 * 1024 * 1024)))
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+# Shared secret for /admin/* and per-request profiling (X-Admin-Token header); unset = admin endpoints are off
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# `kill -USR2 <pid>` samples all threads for this many seconds (0 = no signal handler)
+PROFILE_SIGNAL_SECONDS = float(os.environ.get("PROFILE_SIGNAL_SECONDS", "30"))
 
-# Gemini API config
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+# Gemini API config (GEMINI_API_KEY, GEMINI_API_URL, timeouts, retries, cache) lives in llm_client.py
+LLM = GeminiClient()
 
 def ask_gemini(question: str) -> str:
     """Send a prompt to Gemini and return the response text."""
     if not GEMINI_API_KEY:
         logging.error("GEMINI_API_KEY not set in environment or .env file.")
         return "[Gemini API key not configured]"
-    headers = {"Content-Type": "application/json"}
-    params = {"key": GEMINI_API_KEY}
-    payload = {
-        "contents": [
-            {"parts": [{"text": question}]}
-        ]
-    }
     try:
-        res = requests.post(GEMINI_API_URL, headers=headers, params=params, json=payload, timeout=60)
-        res.raise_for_status()
-        data = res.json()
-        # Gemini returns candidates[0].content.parts[0].text
-        candidates = data.get("candidates", [])
-        if candidates:
-            content = candidates[0].get("content", {})
-            parts = content.get("parts", [])
-            if parts:
-                return parts[0].get("text", "")
-        return "[Gemini returned no answer]"
+        with stage("llm"):
+            return LLM.ask(question)
     except Exception as e:
-        logging.exception("Gemini request failed")
+        LLM_ERRORS.inc()
+        logging.error("Gemini request failed: %s", e)
         return f"[Gemini error: {e}]"
 
 
+def ask_gemini_stream(question: str):
+    """ask_gemini() as a generator of answer pieces; a failure ends it with the same "[Gemini ...]" text."""
+    if not GEMINI_API_KEY:
+        logging.error("GEMINI_API_KEY not set in environment or .env file.")
+        yield "[Gemini API key not configured]"
+        return
+    started = time.perf_counter()
+    first = True
+    try:
+        # closing(): if our consumer goes away mid-answer, the upstream connection is dropped too
+        with contextlib.closing(LLM.stream(question)) as pieces:
+            for piece in pieces:
+                if first:
+                    LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+                    first = False
+                yield piece
+    except Exception as e:
+        LLM_ERRORS.inc()
+        logging.error("Gemini stream failed: %s", e)
+        yield f"[Gemini error: {e}]"
 
 
-# Device / executor setup for whisper
-try:
-    import torch
-    CUDA_AVAILABLE = torch.cuda.is_available()
-except Exception:
-    CUDA_AVAILABLE = False
-
+# Executor / model setup for whisper
 EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=int(os.environ.get("WHISPER_MAX_WORKERS", "2")))
 
-device = "cuda" if CUDA_AVAILABLE else "cpu"
-logging.info(f"Loading Whisper model: {MODEL_NAME} on device={device} (CUDA_AVAILABLE={CUDA_AVAILABLE})")
-try:
-    model = whisper.load_model(MODEL_NAME, device=device)
-except Exception:
-    logging.exception("Failed to load model with device hint; falling back to default load")
-    model = whisper.load_model(MODEL_NAME)
-
-
-def transcribe_audio(audio_path: str) -> str:
-    """Generic transcription wrapper: prefer faster-whisper, fall back to whisper."""
-    # Validate audio file first
-    is_valid, msg = validate_audio_file(audio_path)
-    if not is_valid:
-        logging.error(f"Audio validation failed: {msg}")
-        return ""
-    
-    logging.info(f"Attempting transcription of {audio_path} (size: {os.path.getsize(audio_path)} bytes)")
-    
+# The model loads on a background thread so the port binds immediately (see /ready)
+WHISPER_WARMUP = os.environ.get("WHISPER_WARMUP", "1").lower() in ("1", "true", "yes", "on")
+# Debugger on request only; the reloader imports this module twice, so it needs its own opt-in
+FLASK_DEBUG = os.environ.get("FLASK_DEBUG", "0").lower() in ("1", "true", "yes", "on")
+FLASK_RELOAD = os.environ.get("FLASK_RELOAD", "0").lower() in ("1", "true", "yes", "on")
+
+
+def build_engine(phase):
+    """Load and warm up the inference engine; runs on the loader thread."""
+    engine = build_model(phase, MODEL_NAME)
+    if WHISPER_CASCADE_MODEL:
+        # Both models stay resident; only clips the small one is unsure of reach the larger one
+        accurate = build_model(phase, WHISPER_CASCADE_MODEL, prefix="cascade_")
+        engine = CascadeEngine(engine, accurate, check=cascade_check)
+    return engine
+
+
+def build_model(phase, model_name, prefix=""):
+    """One model behind its scheduler (or worker pool), loaded and warmed up."""
+    if WHISPER_WORKER_PROCESSES > 0:
+        # Worker-pool mode: each worker process loads and warms up its own copy of the model
+        with phase(f"{prefix}worker_pool"):
+            pool = WorkerPool(WHISPER_WORKER_PROCESSES, model_name=model_name,
+                              warmup_options=dict(DEFAULT_PROFILE.options) if WHISPER_WARMUP else None)
+            pool.wait_ready()
+        return pool
+    with phase(f"{prefix}model_load"):
+        logging.info("Loading Whisper model: %s", model_name)
+        backend = load_backend(model_name=model_name)
+    if WHISPER_WARMUP:
+        with phase(f"{prefix}warmup"):
+            warm_up(backend, DEFAULT_PROFILE.options)
+    # All inference goes through the scheduler so concurrent requests share batched passes
+    return BatchScheduler(backend)
+
+
+LOADER = EngineLoader(build_engine)
+
+
+def get_engine():
+    """Return the in-process BatchScheduler or the model worker pool; raises EngineNotReady while loading."""
+    return LOADER.get()
+
+
+# Decode options come from the request's transcription profile (profiles.py); TRANSCRIBE_PROFILE sets the default
+
+# Optional transcript cache for repeated utterances (TRANSCRIPT_CACHE=1)
+CACHE = TranscriptCache() if TRANSCRIPT_CACHE else None
+ENGINE_MODELS = f"{MODEL_NAME}>{WHISPER_CASCADE_MODEL}" if WHISPER_CASCADE_MODEL else MODEL_NAME
+
+
+def cascade_check(text: str):
+    """Cascade escalation reason for a transcript that reads as "open <x>" where x is nothing we can open.
+
+    Until the first app scan finishes every lookup misses, so nothing counts as a miss yet (otherwise each
+    "open X" during startup would be re-run on the accurate model).
+    """
+    if not APP_INDEX.ready:
+        return None
+    target = REGISTRY.unmatched_target(text)
+    if target and resolve_app(target) is None:
+        return "command_miss"
+    return None
+
+
+def transcribe_audio(audio, profile=DEFAULT_PROFILE) -> str:
+    """Generic transcription wrapper. `audio` is a 16kHz mono float32 array or a file path."""
+    if isinstance(audio, str):
+        # Validate audio file first
+        is_valid, msg = validate_audio_file(audio)
+        if not is_valid:
+            logging.error("Audio validation failed: %s", msg)
+            return ""
+        logging.info("Attempting transcription of %s (size: %d bytes)", audio, os.path.getsize(audio))
+    else:
+        logging.debug("Attempting transcription of in-memory audio (%.2fs)", len(audio) / SAMPLE_RATE)
+
     try:
-        logging.info("Attempting whisper transcription with enhanced options")
-        res = model.transcribe(
-            audio_path,
-            language="en",  # Force English for better accuracy
-            task="transcribe",
-            verbose=False,
-            word_timestamps=True,  # Enable to get confidence info
-            # Audio preprocessing options
-            condition_on_previous_text=False,  # Don't use previous context
-            temperature=0.0,  # More deterministic output
-            compression_ratio_threshold=2.4,  # Detect repetitive content
-            logprob_threshold=-1.0,  # Confidence threshold
-            no_speech_threshold=0.6,  # Higher threshold for no speech detection
-        )
+        res = None
+        key = None
+        if CACHE is not None and not isinstance(audio, str):
+            key = cache_key(audio_fingerprint(audio), f"{WHISPER_BACKEND}:{ENGINE_MODELS}:{profile.name}", profile.options)
+            res = CACHE.get(key)
+            CACHE_LOOKUPS.inc(result="miss" if res is None else "hit")
+            if res is not None:
+                logging.debug("Transcript cache hit")
+        if res is None:
+            with stage("transcribe"):
+                res = get_engine().transcribe(audio, **profile.options)
+            if res.get("escalated"):
+                CASCADE_ESCALATIONS.inc(reason=res["escalated"])
+            if key is not None:
+                CACHE.put(key, res)
         text = res.get("text", "").strip()
+        if text and profile.vocabulary:
+            snapped = REGISTRY.snap(text)
+            if snapped != text:
+                logging.debug("Snapped transcript %r -> %r", text, snapped)
+                text = snapped
         # Additional quality checks for noisy environments
         if text:
             words = text.lower().split()
@@ -208,16 +279,19 @@ def transcribe_audio(audio_path: str) -> str:
                 unique_words = len(set(words))
                 repetition_ratio = unique_words / len(words)
                 if repetition_ratio < 0.3:
-                    logging.warning(f"High repetition detected: {repetition_ratio:.2f}")
+                    logging.warning("High repetition detected: %.2f", repetition_ratio)
                     return ""
             if len(words) < 2 and len(text) < 5:
-                logging.warning(f"Transcript too short to be meaningful: '{text}'")
+                logging.warning("Transcript too short to be meaningful: %r", text)
                 return ""
-            logging.info(f"Whisper succeeded: '{text}'")
+            logging.info("Whisper succeeded: %r", capped(text))
         else:
             logging.warning("Whisper returned empty transcript")
-            logging.info(f"Full whisper result: {res}")
+            if sample():
+                logging.debug("Full whisper result: %s", capped(res))
         return text
+    except (EngineBusy, EngineNotReady):
+        raise
     except Exception as e:
         logging.exception("whisper.transcribe failed")
         return ""
@@ -228,296 +302,747 @@ def transcribe_audio(audio_path: str) -> str:
 
 
 
+NO_SPEECH_ERROR = {"error": "no speech detected", "details": "The audio file may be too quiet, too short, or contain no clear speech"}
+
+
+def transcribe_speech(audio, profile=DEFAULT_PROFILE):
+    """Trim silence with VAD, then transcribe. Returns (transcript, speech_seconds).
+
+    Clips where VAD finds no speech return ("", 0.0) without running the model.
+    """
+    with stage("vad"):
+        trimmed, speech_seconds = trim_silence(audio)
+    if speech_seconds == 0.0:
+        VAD_REJECTS.inc()
+        logging.warning("VAD found no speech in %.2fs of audio; skipping model", len(audio) / SAMPLE_RATE)
+        return "", 0.0
+    logging.debug("VAD: %.2fs of speech, trimmed %.2fs -> %.2fs",
+                  speech_seconds, len(audio) / SAMPLE_RATE, len(trimmed) / SAMPLE_RATE)
+    return transcribe_audio(trimmed, profile), speech_seconds
+
+
+def decode_upload(body, content_type=None):
+    """Decode an upload (bytes, path or stream) to 16kHz mono PCM; raises DecodeError (counted by reason).
+
+    Declared raw formats (PCM, Opus frames; see raw_audio.py) skip container probing and the decoder pool.
+    """
+    try:
+        fmt = parse_raw_format(content_type)
+        if fmt is not None:
+            with stage("decode", backend=fmt.codec):
+                data = read_raw(body, fmt, DECODER.max_seconds) if hasattr(body, "read") else body
+                return decode_raw(data, fmt, DECODER.max_seconds)
+        with stage("decode", backend=DECODER.backend):
+            return DECODER.decode(body)
+    except DecodeError as exc:
+        DECODE_FAILURES.inc(reason=exc.reason)
+        raise
+
+
+def decode_error_response(exc: DecodeError):
+    """(payload, status, headers) for a failed decode: 429 when the pool is saturated, 415 for an unsupported
+    declared format, 413 over a limit, else 400."""
+    if exc.reason == "busy":
+        return dict(BUSY_ERROR), 429, {"Retry-After": "1"}
+    if exc.reason == "unsupported":
+        return {"error": "unsupported audio format", "reason": exc.reason, "details": str(exc)}, 415, {}
+    if exc.reason in ("too_large", "too_long"):
+        error = "upload too large" if exc.reason == "too_large" else "audio too long"
+        return {"error": error, "reason": exc.reason, "details": str(exc)}, 413, {}
+    return {"error": "invalid audio file: could not decode audio", "reason": exc.reason, "details": str(exc)}, 400, {}
+
+
+def execute_transcript(transcript: str):
+    """Run the transcript if it is an app/website command; returns the response payload or None.
+
+    A bare "<verb> <anything>" fallback only counts as a command when it names an installed app,
+    so questions like "how do I start a business" still reach the LLM.
+    """
+    parsed = parse_command(transcript)
+    if parsed["type"] not in ("app", "website"):
+        return None
+    if parsed.get("match") == "fallback" and resolve_app(parsed["app"]) is None:
+        return None
+    result, _ = run_command(parsed, transcript)
+    logging.info("Executed command from transcript: %s -> %s", parsed.get("type"), result["message"])
+    return {"text": result["message"], "question": transcript, "command_executed": True,
+            "ok": result.get("ok", False), "command": parsed}
+
+
+BUSY_ERROR = {"error": "server busy", "details": "Too many transcriptions are queued; retry shortly"}
+NOT_READY_ERROR = {"error": "model not ready", "details": "The speech model is still loading; retry shortly"}
+
+
+def answer_transcript(transcript: str, execute: bool = FUSED_EXECUTE):
+    """Turn a transcript into the /transcribe response payload. Returns (payload, status).
+
+    With `execute`, commands are run server-side and flagged with command_executed; everything
+    else goes to Gemini.
+    """
+    if not transcript or transcript.strip() == "":
+        logging.error("TRANSCRIPTION FAILED: Empty transcript returned")
+        return dict(NO_SPEECH_ERROR), 400
+
+    # Fast path: recognized app/website commands run here, skipping the LLM and the client's /api/execute hop
+    if execute:
+        payload = execute_transcript(transcript)
+        if payload is not None:
+            return payload, 200
+
+    answer = ask_gemini(transcript)
+    # If Gemini is not available, return a clean message only
+    if answer.startswith('[Gemini'):
+        logging.info("Gemini unavailable: %s", answer)
+        return {"text": answer, "question": transcript}, 200
+    logging.info("Gemini answered (%d chars)", len(answer))
+    if sample():
+        logging.debug("Gemini answer: %r", capped(answer))
+    return {"text": answer, "question": transcript}, 200
+
+
+def stream_answer(transcript: str, execute: bool, extra: dict, on_final=None):
+    """answer_transcript() as server-sent events, for a transcript that is not empty.
+
+    "transcript" goes out as soon as speech is recognized, then one "token" per piece of Gemini's
+    answer as it arrives, then "final" with the payload /transcribe returns as JSON (also handed to
+    `on_final`). Commands that run server-side skip straight to "final".
+    """
+    yield sse_event("transcript", dict(extra, question=transcript))
+    payload = execute_transcript(transcript) if execute else None
+    if payload is None:
+        pieces = []
+        for piece in ask_gemini_stream(transcript):
+            pieces.append(piece)
+            yield sse_event("token", {"text": piece})
+        payload = {"text": "".join(pieces), "question": transcript}
+        logging.info("Gemini streamed answer (%d chars in %d pieces)", len(payload["text"]), len(pieces))
+    payload.update(extra)
+    if on_final is not None:
+        on_final(payload)
+    yield sse_event("final", payload)
+
+
+def wants_stream() -> bool:
+    """Stream the answer as server-sent events: `Accept: text/event-stream`, or ?stream=1."""
+    value = request.values.get("stream")
+    if value is not None:
+        return value.lower() in ("1", "true", "yes", "on")
+    return "text/event-stream" in request.headers.get("Accept", "")
+
+
+def sse_response(events):
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(events), mimetype="text/event-stream", headers=headers)
+
+
+def wants_execute() -> bool:
+    """Per-request override of FUSED_EXECUTE via an `execute` query/form field."""
+    value = request.values.get("execute")
+    if value is None:
+        return FUSED_EXECUTE
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def request_profile():
+    """Transcription profile named by the `profile` query/form field or X-Transcribe-Profile header.
+
+    Raises KeyError for unknown names.
+    """
+    return get_profile(request.values.get("profile") or request.headers.get("X-Transcribe-Profile"))
+
+
+def unknown_profile_error():
+    return {"error": "unknown transcription profile", "details": f"expected one of: {', '.join(sorted(PROFILES))}"}
+
+
 @app.route("/transcribe", methods=["POST"])
 def transcribe():
-    logging.info("=" * 60)
-    logging.info("Received /transcribe request")
-    logging.info(f"Headers: {dict(request.headers)}")
-    logging.info(f"Content-Length: {request.content_length}")
-    logging.info(f"Content-Type: {request.content_type}")
-    logging.info(f"Method: {request.method}")
-    logging.info(f"Remote address: {request.remote_addr}")
-
-    tmp_path = None
+    # Set before anything touches request.values, which fixes the stream's limit. One byte of headroom
+    # so BoundedStream, not werkzeug, reports an oversized chunked body as a decode failure.
+    request.max_content_length = MAX_UPLOAD_BYTES + 1
     try:
-        if "file" in request.files:
-            f = request.files["file"]
-            logging.info(f"File field found: filename={f.filename}, content_type={f.content_type}")
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".webm")
-            tmp_path = tmp.name
-            f.save(tmp_path)
-            tmp.close()
-            logging.info(f"Saved uploaded file from form to {tmp_path}")
-        else:
-            body = request.get_data()
-            logging.info(f"No file field, reading raw body. Body length: {len(body) if body else 0}")
-            if not body or len(body) == 0:
-                logging.warning("No file field and empty body")
-                return jsonify({"error": "no file provided"}), 400
-            
-            # Log first few bytes to see what we're getting
-            logging.info(f"First 50 bytes of body: {body[:50]}")
-            
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".webm")
-            tmp_path = tmp.name
-            with open(tmp_path, "wb") as wf:
-                wf.write(body)
-            logging.info(f"Saved raw body to {tmp_path} size={os.path.getsize(tmp_path)}")
-
-        size = os.path.getsize(tmp_path)
-        logging.info(f"Uploaded file size: {size} bytes")
-        
-        # Try to identify the file type
-        with open(tmp_path, 'rb') as f:
-            header = f.read(16)
-            logging.info(f"File header (hex): {header.hex()}")
-            logging.info(f"File header (first 16 bytes): {header}")
+        profile = request_profile()
+    except KeyError:
+        return jsonify(unknown_profile_error()), 400
+    verbose = sample()
+    if verbose:
+        logging.debug("/transcribe headers: %s", capped(dict(request.headers)))
+
+    try:
+        # The body is never read into one bytes object: multipart files are spooled to disk by
+        # werkzeug past 500KB, and a raw body is decoded straight from the request stream.
+        with stage("upload"):
+            if "file" in request.files:
+                f = request.files["file"]
+                content_type = f.content_type
+                body = f.stream
+                size = body.seek(0, os.SEEK_END)
+                body.seek(0)
+            else:
+                content_type = request.content_type
+                size = request.content_length  # None for a chunked upload
+                if size is None and "chunked" not in request.headers.get("Transfer-Encoding", "").lower():
+                    size = 0  # no body at all
+                body = BoundedStream(request.stream, MAX_UPLOAD_BYTES)
+        if size == 0 and "file" not in request.files:
+            logging.warning("No file field and empty body")
+            return jsonify({"error": "no file provided"}), 400
+
+        logging.info("POST /transcribe: %s bytes (%s) from %s", size, content_type, request.remote_addr,
+                     extra={"endpoint": "/transcribe", "bytes": size})
+        if verbose and "file" in request.files:
+            logging.debug("Audio header (hex): %s", capped(body.read(16)))
+            body.seek(0)
         # lower threshold to allow short recordings; still reject obviously empty files
-        if size < 100:
+        if size is not None and size < 100:
             logging.warning("Uploaded file too small to contain speech")
             return jsonify({"error": "uploaded file is too small or empty"}), 400
 
-        # Validate the uploaded file
-        is_valid, validation_msg = validate_audio_file(tmp_path)
-        if not is_valid:
-            logging.error(f"Audio file validation failed: {validation_msg}")
-            return jsonify({"error": f"invalid audio file: {validation_msg}"}), 400
-
-        logging.info("Starting transcription (faster-whisper preferred)")
-        
-        # --- Convert webm to wav for Whisper compatibility ---
-        logging.info("Attempting audio conversion with ffmpeg...")
-        wav_path = convert_webm_to_wav(tmp_path)
-        if wav_path and os.path.exists(wav_path):
-            wav_size = os.path.getsize(wav_path)
-            logging.info(f"Successfully converted {tmp_path} to {wav_path} (size: {wav_size} bytes)")
-            transcript = transcribe_audio(wav_path)
-        else:
-            logging.warning("ffmpeg conversion failed or wav not found; using original file")
-            transcript = transcribe_audio(tmp_path)
-        
-        logging.info(f"Final transcript result: '{transcript}' (length: {len(transcript) if transcript else 0})")
+        # --- Decode while reading: upload stream -> decoder pool -> 16kHz mono PCM ---
+        try:
+            audio = decode_upload(body, content_type)
+        except DecodeError as exc:
+            payload, status, headers = decode_error_response(exc)
+            return jsonify(payload), status, headers
+        logging.debug("Decoded %s bytes to %.2fs of PCM", getattr(body, "bytes_read", size), len(audio) / SAMPLE_RATE)
 
+        transcript, speech_seconds = transcribe_speech(audio, profile)
+        if speech_seconds == 0.0:
+            return jsonify(dict(NO_SPEECH_ERROR, speech_duration=0.0)), 400
         if not transcript or transcript.strip() == "":
-            logging.error("TRANSCRIPTION FAILED: Empty transcript returned")
-            logging.error(f"Original file: {tmp_path} ({size} bytes)")
-            if wav_path:
-                wav_size = os.path.getsize(wav_path) if os.path.exists(wav_path) else 0
-                logging.error(f"Converted file: {wav_path} ({wav_size} bytes)")
-            return jsonify({"error": "no speech detected", "details": "The audio file may be too quiet, too short, or contain no clear speech"}), 400
-
-        # If you want to support direct app opening from transcript, call /open_app from frontend after transcription.
-        # Otherwise, just return the transcript and let the frontend handle app opening.
-        answer = ask_gemini(transcript)
-        # If Gemini is not available, return a clean message only
-        if answer.startswith('[Gemini'):
-            logging.info(f"Gemini unavailable: {answer}")
-            return jsonify({"text": answer, "question": transcript}), 200
-        logging.info(f"Gemini answer: {answer!r}")
-        return jsonify({"text": answer, "question": transcript}), 200
+            logging.error("Empty transcript for %s bytes, decoded %.2fs", size, len(audio) / SAMPLE_RATE)
+        elif wants_stream():
+            extra = {"speech_duration": round(speech_seconds, 2), "profile": profile.name}
+            return sse_response(stream_answer(transcript, wants_execute(), extra))
+        payload, status = answer_transcript(transcript, execute=wants_execute())
+        payload["speech_duration"] = round(speech_seconds, 2)
+        payload["profile"] = profile.name
+        return jsonify(payload), status
+    except EngineBusy as exc:
+        ENGINE_REJECTS.inc(reason="busy")
+        logging.warning("Rejecting /transcribe: %s", exc)
+        return jsonify(BUSY_ERROR), 429, {"Retry-After": "1"}
+    except EngineNotReady as exc:
+        ENGINE_REJECTS.inc(reason="not_ready")
+        logging.warning("Rejecting /transcribe: %s", exc)
+        return jsonify(dict(NOT_READY_ERROR, state=LOADER.state)), 503, {"Retry-After": "2"}
     except Exception as exc:
         logging.exception("transcribe handler error")
         return jsonify({"error": str(exc)}), 500
-    finally:
+
+
+@app.route("/transcribe/batch", methods=["POST"])
+def transcribe_batch():
+    """Transcribe many clips in one request; results stream back as JSON lines in completion order.
+
+    Multipart uploads (any number of `file` fields), or with BATCH_LOCAL_PATHS=1 a JSON body
+    {"source": "<directory or manifest>"} on the server's disk. Gemini is only asked with ?llm=1;
+    commands are parsed but never executed.
+    """
+    request.max_content_length = BATCH_MAX_UPLOAD_BYTES  # a whole archive, spooled to disk below
+    try:
+        profile = request_profile()
+    except KeyError:
+        return jsonify(unknown_profile_error()), 400
+    if LOADER.state != "ready":
+        return jsonify(dict(NOT_READY_ERROR, state=LOADER.state)), 503, {"Retry-After": "2"}
+    ask_llm = request.values.get("llm", "0").lower() in ("1", "true", "yes", "on")
+
+    files = request.files.getlist("file")
+    spool = None
+    if files:
+        # Spooled to disk: the upload streams close with the request, and ffmpeg can seek in files
+        spool = tempfile.mkdtemp(prefix="voice-batch-")
+        items = []
+        for i, f in enumerate(files):
+            path = os.path.join(spool, f"{i:05d}{os.path.splitext(f.filename or '')[1]}")
+            f.save(path)
+            items.append((f.filename or f"file{i}", path))
+    else:
+        data = request.get_json(silent=True) or {}
+        if not data.get("source"):
+            return jsonify({"error": "no files provided"}), 400
+        if not BATCH_LOCAL_PATHS:
+            return jsonify({"error": "server-side paths are disabled (set BATCH_LOCAL_PATHS=1)"}), 403
+        if not os.path.exists(data["source"]):
+            return jsonify({"error": f"not found: {data['source']}"}), 404
+        items = iter_inputs(data["source"])
+
+    def annotate(text):
+        fields = {"command": parse_command(text)}
+        if ask_llm:
+            fields["answer"] = ask_gemini(text)
+        return fields
+
+    def generate():
         try:
-            if tmp_path and os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-            # Clean up wav file if created
-            wav_path = tmp_path.replace('.webm', '.wav')
-            if os.path.exists(wav_path):
-                os.unlink(wav_path)
-        except Exception:
-            logging.exception("failed to delete tmp/wav file")
+            for result in transcribe_items(items, lambda audio: transcribe_speech(audio, profile), annotate,
+                                           decode=decode_upload):
+                if spool is not None:
+                    result.pop("path", None)
+                result["profile"] = profile.name
+                yield json.dumps(result) + "\n"
+        finally:
+            if spool is not None:
+                shutil.rmtree(spool, ignore_errors=True)
+
+    logging.info("POST /transcribe/batch: %s", f"{len(files)} uploads" if files else data["source"])
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+# --- Metrics: request timing hooks, /metrics (Prometheus text format) and optional trace spans ---
+QUEUE_DEPTH = Gauge("voice_engine_queue_depth", "Clips waiting for (or in) the inference engine",
+                    fn=lambda: get_engine().qsize() if LOADER.state == "ready" else 0)
+ENGINE_READY = Gauge("voice_engine_ready", "1 once the model is loaded and warmed up",
+                     fn=lambda: int(LOADER.state == "ready"))
+LOG_DROPPED = Gauge("voice_log_records_dropped", "Log records dropped because the log queue was full",
+                    fn=dropped_records)
+
+
+@app.before_request
+def _start_request_timer():
+    request.environ["voice.started"] = time.perf_counter()
+    if request.path != "/metrics":
+        start_trace(request.path, method=request.method)
+    if request.headers.get("X-Profile-Request") == "1" and is_admin():
+        request.environ["voice.profile"] = RequestProfile(request.path)
+
+
+@app.after_request
+def _record_request(response):
+    started = request.environ.get("voice.started")
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    if started is not None and endpoint != "/metrics":
+        REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        if not endpoint.startswith("/admin/"):
+            PROFILER.request_done()
+    end_trace(status=response.status_code)
+    profile = request.environ.get("voice.profile")
+    if profile is not None and profile.written:
+        response.headers["X-Profile-File"] = os.path.basename(profile.path)
+    return response
+
+
+_dispatch_request = app.dispatch_request
+
+
+def _dispatch_profiled():
+    """Run the view under the request's RequestProfile, if it asked for one (see _start_request_timer)."""
+    profile = request.environ.get("voice.profile")
+    return _dispatch_request() if profile is None else profile.run(_dispatch_request)
+
+
+app.dispatch_request = _dispatch_profiled
+
+
+def is_admin() -> bool:
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def admin_required(view):
+    """404 while ADMIN_TOKEN is unset (the endpoints don't exist), 403 without the right X-Admin-Token."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"status": "error", "message": f"Not found: {request.path}"}), 404
+        if not is_admin():
+            return jsonify({"error": "forbidden", "details": "missing or wrong X-Admin-Token"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.route("/admin/profiler", methods=["POST"])
+@admin_required
+def profiler_start():
+    """Sample every thread's stack for `seconds` or until `requests` more requests finish.
+
+    Query or JSON fields: seconds (default 30), requests (0 = no limit), interval_ms, idle=1 to keep
+    threads parked waiting for work. Answers 409 while a session is already running.
+    """
+    options = dict(request.args)
+    options.update(request.get_json(silent=True) or {})
+    try:
+        status = PROFILER.start(seconds=float(options.get("seconds", 30)),
+                                requests=int(options.get("requests", 0)),
+                                interval_ms=float(options.get("interval_ms", PROFILE_INTERVAL_MS)),
+                                idle=str(options.get("idle", "0")).lower() in ("1", "true", "yes", "on"))
+    except ValueError as exc:
+        return jsonify({"error": "invalid profiler options", "details": str(exc)}), 400
+    except RuntimeError as exc:
+        return jsonify(dict(PROFILER.status(), error=str(exc))), 409
+    return jsonify(status), 202
+
+
+def start_signal_profile():
+    try:
+        PROFILER.start(seconds=PROFILE_SIGNAL_SECONDS)
+    except RuntimeError as exc:
+        logging.warning("SIGUSR2 ignored: %s", exc)
+
+
+@app.route("/admin/profiler", methods=["GET"])
+@admin_required
+def profiler_status():
+    """The running session (if any), the last finished one and the profile files on disk."""
+    try:
+        files = sorted(os.listdir(PROFILER.directory))
+    except OSError:
+        files = []
+    return jsonify(dict(PROFILER.status(), files=files)), 200
+
+
+@app.route("/admin/profiler", methods=["DELETE"])
+@admin_required
+def profiler_stop():
+    """Stop the running session now; its collapsed-stack file is written as usual."""
+    return jsonify(PROFILER.stop()), 200
+
+
+@app.route("/admin/profiler/files/<path:name>", methods=["GET"])
+@admin_required
+def profiler_file(name):
+    """Download a .collapsed (flamegraph) or .prof (pstats / snakeviz) file."""
+    return send_from_directory(PROFILER.directory, name, as_attachment=True)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(METRICS.render(), content_type=CONTENT_TYPE)
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Liveness: the process is up and serving HTTP (the model may still be loading)."""
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: 200 once the model is loaded and warmed up, 503 before that. Includes startup phase timings."""
+    status = LOADER.status()
+    if status["state"] == "ready":
+        return jsonify(status), 200
+    return jsonify(status), 503, {"Retry-After": "2"}
+
+
+@app.route("/decoder/stats", methods=["GET"])
+def decoder_stats():
+    """Decode counts, timing and failure reasons for the audio decoder pool."""
+    return jsonify(DECODER.snapshot()), 200
+
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Hit/miss counters for the transcript cache."""
+    if CACHE is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify(dict(CACHE.snapshot(), enabled=True)), 200
+
+
+@app.route("/llm/stats", methods=["GET"])
+def llm_stats():
+    """Request, coalescing, cache and circuit-breaker counters for the Gemini client."""
+    return jsonify(LLM.snapshot()), 200
+
+
+@app.route("/engine/stats", methods=["GET"])
+def engine_stats():
+    """Batching counters of the in-process scheduler, or per-worker state of the model worker pool."""
+    if LOADER.state != "ready":
+        return jsonify({"state": LOADER.state}), 200
+    engine = get_engine()
+    if isinstance(engine, CascadeEngine):
+        return jsonify({"state": "ready", "fast": engine.fast.snapshot(), "accurate": engine.accurate.snapshot()}), 200
+    return jsonify(dict(engine.snapshot(), state="ready")), 200
+
+
+@app.route("/cascade/stats", methods=["GET"])
+def cascade_stats():
+    """Escalation rate, reasons, thresholds and per-model time for the model cascade."""
+    if not WHISPER_CASCADE_MODEL:
+        return jsonify({"enabled": False}), 200
+    models = {"enabled": True, "fast_model": MODEL_NAME, "accurate_model": WHISPER_CASCADE_MODEL}
+    if LOADER.state != "ready":
+        return jsonify(dict(models, state=LOADER.state)), 200
+    return jsonify(dict(get_engine().snapshot(), **models)), 200
+
+
+@app.route("/apps/stats", methods=["GET"])
+def apps_stats():
+    """Size and scan/launch counters for the installed-application index."""
+    return jsonify(APP_INDEX.snapshot()), 200
+
+
+# --- Streaming transcription: chunks in, partial/final transcripts out over SSE ---
+STREAMS = StreamRegistry(max_bytes=MAX_UPLOAD_BYTES, max_seconds=DECODER.max_seconds)
+
+
+@app.route("/transcribe/stream", methods=["POST"])
+def stream_start():
+    """Open a streaming session. Chunks are POSTed to /transcribe/stream/<id>, events read from .../events."""
+    try:
+        profile = request_profile()
+    except KeyError:
+        return jsonify(unknown_profile_error()), 400
+    try:
+        session = STREAMS.create(lambda audio: transcribe_speech(audio, profile)[0], EXECUTOR, profile)
+    except TooManyStreams as exc:
+        return jsonify({"error": "too many open streams", "details": str(exc)}), 429, {"Retry-After": "5"}
+    except Exception as exc:
+        logging.exception("failed to start stream decoder")
+        return jsonify({"error": f"could not start stream: {exc}"}), 500
+    logging.info("Opened stream session %s", session.id)
+    return jsonify({"session_id": session.id}), 201
+
+
+@app.route("/transcribe/stream/<session_id>", methods=["POST"])
+def stream_chunk(session_id):
+    session = STREAMS.get(session_id)
+    if session is None or session.finished:
+        return jsonify({"error": "unknown or finished stream session"}), 404
+    chunk = request.files["file"].read() if "file" in request.files else request.get_data()
+    try:
+        ok = not chunk or session.feed(chunk)
+    except DecodeError as exc:
+        # Over the per-session byte or duration limit: end the session like a failed decode
+        STREAMS.pop(session_id)
+        payload, status, headers = decode_error_response(exc)
+        session.fail(payload)
+        return jsonify(payload), status, headers
+    if not ok:
+        STREAMS.pop(session_id)
+        session.emit("error", {"error": "could not decode audio stream"})
+        return jsonify({"error": "invalid audio file: could not decode audio stream"}), 400
+    return jsonify({"status": "ok", "received": session.bytes_received, "partial": session.partial}), 200
+
+
+@app.route("/transcribe/stream/<session_id>/events", methods=["GET"])
+def stream_events(session_id):
+    session = STREAMS.get(session_id)
+    if session is None:
+        return jsonify({"error": "unknown stream session"}), 404
+    return sse_response(session.sse())
+
+
+@app.route("/transcribe/stream/<session_id>/finish", methods=["POST"])
+def stream_finish(session_id):
+    """Flush the decoder, transcribe the full utterance and answer it like /transcribe does."""
+    session = STREAMS.pop(session_id)
+    if session is None:
+        return jsonify({"error": "unknown stream session"}), 404
+    try:
+        try:
+            audio = session.finish()
+        except DecodeError as exc:
+            payload, status, headers = decode_error_response(exc)
+            session.emit("error", payload)
+            return jsonify(payload), status, headers
+        logging.info("Stream %s finished: %d bytes, %.2fs of PCM", session_id, session.bytes_received, len(audio) / SAMPLE_RATE)
+        if len(audio) == 0:
+            session.emit("error", {"error": "could not decode audio stream"})
+            return jsonify({"error": "invalid audio file: could not decode audio stream"}), 400
+        transcript, speech_seconds = transcribe_speech(audio, session.profile)
+        if speech_seconds > 0.0 and transcript.strip() and wants_stream():
+            extra = {"speech_duration": round(speech_seconds, 2), "profile": session.profile.name}
+            return sse_response(stream_answer(transcript, wants_execute(), extra,
+                                              on_final=lambda payload: session.emit("final", payload)))
+        if speech_seconds == 0.0:
+            payload, status = dict(NO_SPEECH_ERROR), 400
+        else:
+            payload, status = answer_transcript(transcript, execute=wants_execute())
+        payload["speech_duration"] = round(speech_seconds, 2)
+        payload["profile"] = session.profile.name
+        session.emit("final" if status == 200 else "error", payload)
+        return jsonify(payload), status
+    except Exception as exc:
+        logging.exception("stream finish error")
+        session.emit("error", {"error": str(exc)})
+        return jsonify({"error": str(exc)}), 500
+
+
+@app.route("/transcribe/stream/<session_id>", methods=["DELETE"])
+def stream_cancel(session_id):
+    session = STREAMS.pop(session_id)
+    if session is None:
+        return jsonify({"error": "unknown stream session"}), 404
+    session.cancel()
+    logging.info("Cancelled stream session %s", session_id)
+    return jsonify({"status": "cancelled"}), 200
+
+
+# --- Helper: Command intents (compiled once at startup) ---
+REGISTRY = CommandRegistry(APP_COMMANDS)
+if COMMANDS_FILE:
+    try:
+        APP_COMMANDS.update(REGISTRY.load_file(COMMANDS_FILE))
+    except Exception:
+        logging.exception("Failed to load custom commands from %s", COMMANDS_FILE)
+# Bias the "command" profile toward the names above; the prompt is tokenized once per engine
+set_vocabulary(REGISTRY.vocabulary_prompt())
 
 
 def parse_command(text):
     """Enhanced command parsing with natural language understanding."""
-    text = text.lower().strip()
-    
-    # Handle websites first
-    website_patterns = {
-        r'(open|go to|visit)\s*(youtube|you\s*tube)': 'https://youtube.com',
-        r'(open|go to|visit)\s*google': 'https://google.com',
-        r'(open|go to|visit)\s*(facebook|fb)': 'https://facebook.com',
-        r'(open|go to|visit)\s*twitter': 'https://twitter.com',
-        r'(open|go to|visit)\s*instagram': 'https://instagram.com',
-        r'(open|go to|visit)\s*github': 'https://github.com',
-        r'(open|go to|visit)\s*stackoverflow': 'https://stackoverflow.com',
-    }
-    
-    for pattern, url in website_patterns.items():
-        if re.search(pattern, text):
-            return {"type": "website", "url": url, "name": pattern.split('\\s*')[-1].replace(')', '')}
-    
-    # Handle app opening commands
-    app_patterns = {
-        r'(open|start|launch)\s+(notepad|text\s*editor)': 'notepad',
-        r'(open|start|launch)\s+(calculator|calc)': 'calculator',
-        r'(open|start|launch)\s+(chrome|google\s*chrome)': 'chrome',
-        r'(open|start|launch)\s+(brave|brave\s*browser)': 'brave',
-        r'(open|start|launch)\s+(edge|microsoft\s*edge)': 'edge',
-        r'(open|start|launch)\s+(firefox|mozilla)': 'firefox',
-        r'(open|start|launch)\s+(vs\s*code|visual\s*studio\s*code|code)': 'vs code',
-        r'(open|start|launch)\s+(word|microsoft\s*word)': 'word',
-        r'(open|start|launch)\s+(excel|microsoft\s*excel)': 'excel',
-        r'(open|start|launch)\s+(powerpoint|microsoft\s*powerpoint|power\s*point)': 'powerpoint',
-        r'(open|start|launch)\s+(explorer|file\s*explorer|files?)': 'explorer',
-        r'(open|start|launch)\s+(paint|ms\s*paint)': 'paint',
-        r'(open|start|launch)\s+(browser|web\s*browser)': 'edge',
-    }
-    
-    for pattern, app in app_patterns.items():
-        if re.search(pattern, text):
-            return {"type": "app", "app": app}
-    
-    # Fallback: try to extract app name after common trigger words
-    open_match = re.search(r'(open|start|launch)\s+(.+)', text)
-    if open_match:
-        app_name = open_match.group(2).strip()
-        # Clean up common suffixes
-        app_name = re.sub(r'\s+(app|application|program)$', '', app_name)
-        return {"type": "app", "app": app_name}
-    
-    return {"type": "unknown", "text": text}
+    return REGISTRY.parse(text)
 
 
 @app.route("/api/execute", methods=["POST"])
 def execute_command():
     """Execute commands based on recognized text with enhanced natural language processing."""
-    logging.info("Received /api/execute request")
     try:
-        data = request.get_json()
-        if not data or 'text' not in data:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('text'), str):
             return jsonify({"status": "error", "message": "Missing 'text' field"}), 400
         
         text = data['text'].strip()
-        logging.info(f"Executing command: {text}")
         
         # Parse the command using enhanced parsing
         parsed = parse_command(text)
-        logging.info(f"Parsed command: {parsed}")
-        
-        if parsed["type"] == "website":
-            try:
-                import webbrowser
-                webbrowser.open(parsed["url"])
-                return jsonify({"status": "success", "message": f"Opened {parsed['name']}", "ok": True})
-            except Exception as e:
-                return jsonify({"status": "error", "message": f"Failed to open {parsed['name']}: {e}"}), 500
-        
-        elif parsed["type"] == "app":
-            try:
-                result = execute_app_command(parsed["app"])
-                if result.get("status") == "success":
-                    return jsonify({"status": "success", "message": result.get("message", "App opened"), "ok": True})
-                else:
-                    return jsonify({"status": "error", "message": result.get("message", "Failed to open app")}), 404
-            except Exception as e:
-                return jsonify({"status": "error", "message": f"Failed to open {parsed['app']}: {e}"}), 500
-        
-        else:
-            # If no specific command matched, return info but don't treat as error
-            return jsonify({"status": "info", "message": f"Command '{text}' not recognized as an app or website command", "ok": False})
+        logging.info("POST /api/execute: %r -> %s (%s)", capped(text, 200), parsed["type"], parsed.get("match"),
+                     extra={"endpoint": "/api/execute"})
+        payload, status = run_command(parsed, text)
+        return jsonify(payload), status
         
     except Exception as e:
         logging.exception("Error in execute_command")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-def execute_app_command(app_name):
-    """Enhanced app launching function with multiple fallback methods."""
-    app_name = app_name.lower().strip()
-    logging.info(f"Attempting to open app: {app_name}")
-    
-    # Try direct command mapping first
-    command = APP_COMMANDS.get(app_name)
-    if command:
+@stage("execute")
+def run_command(parsed, text):
+    """Carry out a parse_command() result. Returns (payload, status) in the /api/execute shape."""
+    if COMMANDS_DRY_RUN and parsed["type"] in ("app", "website"):
+        target = parsed.get("name") or parsed.get("app")
+        return {"status": "success", "message": f"Would open {target}", "ok": True, "dry_run": True}, 200
+    if parsed["type"] == "website":
         try:
-            if command.endswith('.exe'):
-                logging.info(f"Using os.startfile for: {command}")
-                os.startfile(command)
-            else:
-                logging.info(f"Using shell command: {command}")
-                subprocess.Popen(["start", command], shell=True)
-            return {"status": "success", "message": f"Opened {app_name}"}
+            webbrowser.open(parsed["url"])
+            return {"status": "success", "message": f"Opened {parsed['name']}", "ok": True}, 200
         except Exception as e:
-            logging.warning(f"Direct command failed for {app_name}: {e}")
-            # Continue to fallback methods
-    
-    # Fallback method: try common app variations
-    fallback_attempts = []
+            return {"status": "error", "message": f"Failed to open {parsed['name']}: {e}"}, 500
     
-    if "notepad" in app_name:
-        fallback_attempts.append(("notepad.exe", "notepad"))
-    elif "calculator" in app_name or "calc" in app_name:
-        fallback_attempts.append(("calc.exe", "calculator"))
-    elif "chrome" in app_name:
-        fallback_attempts.extend([
-            ("start chrome", "Google Chrome"),
-            ("start chrome.exe", "Google Chrome")
-        ])
-    elif "brave" in app_name:
-        fallback_attempts.append(("start brave", "Brave Browser"))
-    elif "edge" in app_name:
-        fallback_attempts.extend([
-            ("start msedge", "Microsoft Edge"),
-            ("start edge", "Microsoft Edge")
-        ])
-    elif "firefox" in app_name:
-        fallback_attempts.append(("start firefox", "Firefox"))
-    elif "explorer" in app_name or "file" in app_name:
-        fallback_attempts.append(("explorer.exe", "File Explorer"))
-    elif "paint" in app_name:
-        fallback_attempts.append(("mspaint.exe", "Paint"))
-    elif "word" in app_name:
-        fallback_attempts.extend([
-            ("start winword", "Microsoft Word"),
-            ("start word", "Microsoft Word")
-        ])
-    elif "excel" in app_name:
-        fallback_attempts.extend([
-            ("start excel", "Microsoft Excel"),
-            ("start xlsx", "Microsoft Excel")
-        ])
-    elif "powerpoint" in app_name:
-        fallback_attempts.extend([
-            ("start powerpnt", "Microsoft PowerPoint"),
-            ("start powerpoint", "Microsoft PowerPoint")
-        ])
-    elif "vs code" in app_name or "visual studio code" in app_name or app_name == "code":
-        fallback_attempts.extend([
-            ("code", "VS Code"),
-            ("start code", "VS Code")
-        ])
-    
-    # Try fallback methods
-    for command, display_name in fallback_attempts:
+    elif parsed["type"] == "app":
         try:
-            logging.info(f"Trying fallback command: {command}")
-            if command.startswith("start "):
-                subprocess.Popen(command.split(), shell=True)
+            result = execute_app_command(parsed["app"])
+            if result.get("status") == "success":
+                return {"status": "success", "message": result.get("message", "App opened"), "ok": True}, 200
+            elif result.get("retry"):
+                return {"status": "error", "message": result["message"], "retry": True}, 503
             else:
-                subprocess.Popen(command, shell=True)
-            return {"status": "success", "message": f"Opened {display_name}"}
+                return {"status": "error", "message": result.get("message", "Failed to open app")}, 404
         except Exception as e:
-            logging.warning(f"Fallback command failed: {command} - {e}")
-            continue
+            return {"status": "error", "message": f"Failed to open {parsed['app']}: {e}"}, 500
     
-    # If all else fails, try a generic start command
-    try:
-        logging.info(f"Trying generic start command for: {app_name}")
-        subprocess.Popen(["start", app_name], shell=True)
-        return {"status": "success", "message": f"Attempted to open {app_name}"}
-    except Exception as e:
-        logging.error(f"All methods failed for {app_name}: {e}")
+    # If no specific command matched, return info but don't treat as error
+    return {"status": "info", "message": f"Command '{text}' not recognized as an app or website command", "ok": False}, 200
+
+
+# Executable names per canonical app, tried in order after APP_COMMANDS (Windows, then Linux/macOS names)
+APP_FALLBACKS = {
+    "notepad": ["notepad", "gnome-text-editor", "gedit", "kate", "mousepad", "TextEdit"],
+    "calculator": ["calc", "gnome-calculator", "kcalc", "galculator", "Calculator"],
+    "chrome": ["chrome", "google-chrome", "google-chrome-stable", "Google Chrome", "chromium"],
+    "brave": ["brave", "brave-browser", "Brave Browser"],
+    "edge": ["msedge", "microsoft-edge", "microsoft-edge-stable", "Microsoft Edge"],
+    "firefox": ["firefox", "Firefox"],
+    "explorer": ["explorer", "nautilus", "dolphin", "thunar", "nemo", "Finder"],
+    "paint": ["mspaint", "kolourpaint", "pinta"],
+    "word": ["winword", "Microsoft Word", "libreoffice --writer"],
+    "excel": ["excel", "Microsoft Excel", "libreoffice --calc"],
+    "powerpoint": ["powerpnt", "Microsoft PowerPoint", "libreoffice --impress"],
+    "vs code": ["code", "Visual Studio Code", "codium"],
+}
+# Only the executables named above (and APP_PATH_ALLOWLIST) may be launched from PATH or by absolute path
+allow_path_executables(list(APP_COMMANDS.values()) +
+                       [name.partition(" --")[0] for names in APP_FALLBACKS.values() for name in names])
+
+
+def resolve_app(app_name):
+    """LaunchTarget for a spoken app name via the installed-app index, or None if nothing matches."""
+    canonical = REGISTRY.resolve_app(app_name)
+    candidates = [app_name, APP_COMMANDS.get(app_name), canonical, APP_COMMANDS.get(canonical)]
+    extra_args = {}
+    for name in APP_FALLBACKS.get(canonical, []):
+        # "libreoffice --writer": look up the executable, keep the arguments
+        executable, _, args = name.partition(" --")
+        candidates.append(executable if args else name)
+        if args:
+            extra_args[executable] = ["--" + args]
+    name, target = APP_INDEX.match(*candidates)
+    args = extra_args.get(name)
+    return target._replace(argv=target.argv + args) if args else target
+
+
+def execute_app_command(app_name):
+    """Launch an installed app by name: O(1) index lookups, then exec on a background thread (no shell).
+
+    Waits up to APP_LAUNCH_CONFIRM_SECONDS for the exec, so a failed launch is reported as an error; a slower
+    one is answered with "Launching X" and `"launching": true` rather than claimed as opened.
+    """
+    app_name = app_name.lower().strip()
+    target = resolve_app(app_name)
+    if target is None and not APP_INDEX.ready:
+        return {"status": "error", "retry": True,
+                "message": f"Could not open {app_name} yet: still indexing installed apps, try again shortly."}
+    if target is None:
+        logging.info("No installed app matches: %s", app_name)
         return {"status": "error", "message": f"Could not open {app_name}. App may not be installed or accessible."}
+    logging.info("Opening %s via %s: %s", app_name, target.source, target.argv)
+    launched = APP_INDEX.launch(target)
+    try:
+        launched.result(timeout=APP_LAUNCH_CONFIRM_SECONDS)
+    except concurrent.futures.TimeoutError:
+        return {"status": "success", "launching": True, "message": f"Launching {target.name}",
+                "target": target.argv[0]}
+    except OSError as exc:
+        return {"status": "error", "message": f"Could not open {target.name}: {exc.strerror or exc}",
+                "target": target.argv[0]}
+    return {"status": "success", "message": f"Opened {target.name}", "target": target.argv[0]}
 
 
 # 404 error handler must be after app is defined and all routes
+@app.errorhandler(413)
+def handle_413(e):
+    # Raised from Content-Length before the body is read, or once a chunked body passes the limit
+    logging.warning("413 Payload Too Large: %s content_length=%s", request.path, request.content_length)
+    return jsonify({"error": "upload too large", "reason": "too_large",
+                    "details": f"request bodies are limited to {request.max_content_length} bytes"}), 413
+
+
 @app.errorhandler(404)
 def handle_404(e):
-    logging.error(f"404 Not Found: {request.path} method={request.method} data={request.get_data(as_text=True)}")
+    # Never read the body here: it may be a multi-megabyte upload to a mistyped URL
+    logging.error("404 Not Found: %s method=%s content_length=%s", request.path, request.method, request.content_length)
     return jsonify({"status": "error", "message": f"Not found: {request.path}"}), 404
 
+LOADER.phases["server_import"] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+
+def _sample_on_signal(signum, frame):
+    # Start from a thread: the handler may interrupt code that holds the profiler's lock
+    threading.Thread(target=start_signal_profile, daemon=True).start()
+
+
+def start_background():
+    """Start loading the model and indexing installed apps, and hook SIGUSR2 up to the profiler. Idempotent."""
+    LOADER.start()
+    APP_INDEX.start()
+    if PROFILE_SIGNAL_SECONDS > 0 and hasattr(signal, "SIGUSR2"):
+        try:
+            signal.signal(signal.SIGUSR2, _sample_on_signal)
+        except ValueError:
+            pass  # called off the main thread; the HTTP endpoint still works
+
+
+# Start loading the model now, except where this import must not start anything: model workers, the
+# reloader's file watcher, and any spawned child still re-importing the main module (it cannot start
+# processes yet). uvicorn's workers are such children; asgi_app's lifespan starts them once they are up.
+_is_model_worker = multiprocessing.current_process().name.startswith(WORKER_NAME_PREFIX)
+_is_bootstrapping = getattr(multiprocessing.current_process(), "_inheriting", False)
+_is_reloader_watcher = __name__ == "__main__" and FLASK_DEBUG and FLASK_RELOAD and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+if not (_is_model_worker or _is_bootstrapping or _is_reloader_watcher):
+    start_background()
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000, debug=FLASK_DEBUG, use_reloader=FLASK_DEBUG and FLASK_RELOAD)
\ No newline at end of file
@@ -0,0 +1,202 @@
+# streaming.py
+# Chunked transcription sessions: MediaRecorder chunks in, partial/final transcripts out (SSE)
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from audio_pipeline import StreamDecoder
+from decoder_pool import DECODER_MAX_SECONDS, DecodeError
+
+STREAM_WINDOW_SECONDS = float(os.environ.get("STREAM_WINDOW_SECONDS", "30"))  # Whisper's native window
+STREAM_STEP_SECONDS = float(os.environ.get("STREAM_STEP_SECONDS", "1.0"))  # new audio needed before re-running
+STREAM_IDLE_TIMEOUT = float(os.environ.get("STREAM_IDLE_TIMEOUT", "60"))
+# Each open session holds an ffmpeg process and its PCM, so they are capped separately from the decoder pool
+STREAM_MAX_SESSIONS = int(os.environ.get("STREAM_MAX_SESSIONS", "8"))
+
+
+class TooManyStreams(RuntimeError):
+    """Raised by StreamRegistry.create() when STREAM_MAX_SESSIONS are open; callers should answer 429."""
+
+
+def sse_event(event: str, data: dict) -> str:
+    """One server-sent event frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StreamSession:
+    """One in-progress recording: incremental decode plus sliding-window partial transcripts."""
+
+    def __init__(self, transcribe_fn, executor, profile=None, max_bytes: int = 0,
+                 max_seconds: float = DECODER_MAX_SECONDS):
+        self.id = uuid.uuid4().hex
+        self.profile = profile  # transcription profile chosen when the session was opened
+        self.max_bytes = max_bytes  # encoded bytes across all chunks; 0 = no limit
+        self.max_seconds = max_seconds
+        self.decoder = StreamDecoder(max_seconds=max_seconds)
+        self.events = queue.Queue()
+        self.partial = ""
+        self.bytes_received = 0
+        self.finished = False
+        self.last_activity = time.monotonic()
+        self._transcribe_fn = transcribe_fn
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._busy = False
+        self._last_run_seconds = 0.0
+
+    def feed(self, chunk: bytes) -> bool:
+        """Append an encoded chunk and schedule a partial pass if enough new audio arrived.
+
+        Returns False if the decoder has failed; raises DecodeError ("too_large" or "too_long")
+        once the session passes its byte or duration limit.
+        """
+        self.last_activity = time.monotonic()
+        self.bytes_received += len(chunk)
+        if self.max_bytes and self.bytes_received > self.max_bytes:
+            raise DecodeError("too_large", f"stream exceeds {self.max_bytes} bytes")
+        ok = self.decoder.feed(chunk)
+        self.check_length()
+        self._maybe_schedule_partial()
+        return ok
+
+    def check_length(self):
+        if self.decoder.overflowed:
+            raise DecodeError("too_long", f"audio is longer than {self.max_seconds:.0f}s")
+
+    def _maybe_schedule_partial(self):
+        with self._lock:
+            if self._busy or self.finished:
+                return
+            if self.decoder.seconds - self._last_run_seconds < STREAM_STEP_SECONDS:
+                return
+            self._busy = True
+        self._executor.submit(self._run_partial)
+
+    def _run_partial(self):
+        try:
+            self._last_run_seconds = self.decoder.seconds
+            audio = self.decoder.samples(last_seconds=STREAM_WINDOW_SECONDS)
+            text = self._transcribe_fn(audio) if len(audio) else ""
+            if text and not self.finished and text != self.partial:
+                self.partial = text
+                self.emit("partial", {"text": text, "seconds": round(self._last_run_seconds, 2)})
+        except Exception:
+            logging.exception("partial transcription failed for stream %s", self.id)
+        finally:
+            with self._lock:
+                self._busy = False
+        # Audio may have kept arriving while the model was busy
+        self._maybe_schedule_partial()
+
+    def finish(self):
+        """Close the decoder and return the complete PCM for the final transcription."""
+        with self._lock:
+            self.finished = True
+        audio = self.decoder.close()
+        self.check_length()
+        return audio
+
+    def cancel(self):
+        with self._lock:
+            self.finished = True
+        self.decoder.abort()
+        self.emit("cancelled", {})
+
+    def fail(self, payload: dict):
+        """Stop decoding and end the event stream with an error."""
+        with self._lock:
+            self.finished = True
+        self.decoder.abort()
+        self.emit("error", payload)
+
+    def emit(self, event: str, data: dict):
+        self.events.put((event, data))
+
+    def sse(self, heartbeat: float = 15.0):
+        """Yield server-sent events until the session reaches a terminal event."""
+        while True:
+            try:
+                event, data = self.events.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_event(event, data)
+            if event in ("final", "error", "cancelled"):
+                return
+
+
+class StreamRegistry:
+    """Thread-safe map of session id -> StreamSession with idle expiry.
+
+    Idle sessions are reaped by a background thread (started with the first session) and on every
+    lookup, so an abandoned recording releases its ffmpeg process without waiting for a new session.
+    """
+
+    def __init__(self, max_sessions: int = STREAM_MAX_SESSIONS, idle_timeout: float = STREAM_IDLE_TIMEOUT,
+                 max_bytes: int = 0, max_seconds: float = DECODER_MAX_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_bytes = max_bytes  # per-session limits, the same ones a single upload gets
+        self.max_seconds = max_seconds
+        self._sessions = {}
+        self._pending = 0  # slots reserved by create() calls still starting their decoder
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def create(self, transcribe_fn, executor, profile=None) -> StreamSession:
+        self.reap()
+        with self._lock:
+            # The slot is reserved before ffmpeg starts, so concurrent creates cannot overshoot the cap
+            if self.max_sessions and len(self._sessions) + self._pending >= self.max_sessions:
+                raise TooManyStreams(f"{len(self._sessions) + self._pending} stream sessions already open")
+            self._pending += 1
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_forever, name="stream-reaper", daemon=True)
+                self._reaper.start()
+        try:
+            session = StreamSession(transcribe_fn, executor, profile, self.max_bytes, self.max_seconds)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        with self._lock:
+            self._pending -= 1
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str):
+        self.reap()
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _reap_forever(self):
+        interval = max(0.5, min(self.idle_timeout / 4, 5.0))
+        while True:
+            time.sleep(interval)
+            try:
+                self.reap()
+            except Exception:
+                logging.exception("stream reaper failed")
+
+    def pop(self, session_id: str):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def reap(self):
+        """Drop sessions that have not received data for `idle_timeout` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [s for s in self._sessions.values() if now - s.last_activity > self.idle_timeout]
+            for s in stale:
+                del self._sessions[s.id]
+        for s in stale:
+            logging.info("Expiring idle stream session %s", s.id)
+            s.cancel()
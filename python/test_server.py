@@ -3,7 +3,6 @@
 # Simple test server to check if basic functionality works
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import os
 import subprocess
 import logging
 
@@ -0,0 +1,10 @@
+# tests/conftest.py
+# Make the server modules (one directory up) importable, with settings that keep tests offline and side-effect free
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("WHISPER_BACKEND", "stub")  # fixed transcript, no model download
+os.environ.setdefault("COMMANDS_DRY_RUN", "1")  # "open X" reports what it would launch
+os.environ["GEMINI_API_KEY"] = ""
@@ -0,0 +1,130 @@
+# tests/test_app_index.py
+# AppIndex: the PATH allowlist, lookups before and after the first scan, incremental refresh and launch failures
+import concurrent.futures
+import os
+import sys
+
+import pytest
+
+import app_index
+from app_index import AppIndex, LaunchTarget, PathScanner
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="POSIX executables and PATH layout")
+
+
+def make_executable(directory, name, mode=0o755):
+    path = directory / name
+    path.write_text("#!/bin/sh\nexit 0\n")
+    path.chmod(mode)
+    return str(path)
+
+
+@pytest.fixture
+def bin_dir(tmp_path, monkeypatch):
+    """A PATH of one directory holding gedit, reboot, python3.11-config and a non-executable notes file."""
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    for name in ("gedit", "reboot", "python3.11-config"):
+        make_executable(directory, name)
+    make_executable(directory, "notes", mode=0o644)
+    monkeypatch.setenv("PATH", str(directory))
+    monkeypatch.setattr(app_index, "_path_allowed", {"gedit", "notes", "python3"})
+    return directory
+
+
+def scanned_index(**kwargs):
+    index = AppIndex(scanners=[PathScanner()], **kwargs)
+    index.refresh()
+    return index
+
+
+def test_path_scanner_only_indexes_allowlisted_executables(bin_dir):
+    index = scanned_index()
+    assert index.lookup("gedit").argv == [str(bin_dir / "gedit")]
+    assert index.lookup("reboot") is None  # on PATH but not allowlisted
+    assert index.lookup("notes") is None  # allowlisted but not executable
+    assert index.lookup("python3") is None  # POSIX names have no extension to strip
+
+
+def test_allow_path_executables_adds_names_and_absolute_paths(monkeypatch):
+    monkeypatch.setattr(app_index, "_path_allowed", set())
+    app_index.allow_path_executables(["Gedit", "/opt/tools/mytool", ""])
+    assert app_index.path_allowed("gedit")
+    assert app_index.path_allowed("/opt/tools/mytool")
+    assert app_index.path_allowed("mytool")
+
+
+def test_match_returns_the_first_indexed_candidate(bin_dir):
+    index = scanned_index()
+    assert index.match(None, "text editor", "GEDIT") == ("GEDIT", index.lookup("gedit"))
+    assert index.match("nothing", "else") == (None, None)
+    assert index.stats["lookups"] == 3
+    assert index.stats["misses"] == 1
+
+
+def test_match_accepts_only_allowlisted_absolute_paths(bin_dir, monkeypatch):
+    index = scanned_index()
+    gedit, reboot = str(bin_dir / "gedit"), str(bin_dir / "reboot")
+    monkeypatch.setattr(app_index, "_path_allowed", {"gedit", app_index.normalize(gedit)})
+    assert index.match(gedit)[1] == LaunchTarget("gedit", [gedit], "path", False)
+    assert index.match(reboot) == (None, None)
+
+
+def test_lookups_miss_until_the_first_scan(bin_dir):
+    index = AppIndex(scanners=[PathScanner()], refresh_seconds=0)
+    assert not index.ready
+    assert index.lookup("gedit") is None
+    index.start()
+    assert index._ready.wait(5)
+    assert index.ready
+    assert index.lookup("gedit") is not None
+
+
+def test_refresh_rescans_only_changed_roots(bin_dir, monkeypatch):
+    index = scanned_index()
+    assert index.refresh() == 1
+    assert index.stats["roots_reused"] == 1
+    make_executable(bin_dir, "vlc")
+    monkeypatch.setattr(app_index, "_path_allowed", {"gedit", "vlc"})
+    os.utime(bin_dir, ns=(0, os.stat(bin_dir).st_mtime_ns + 10**9))
+    index.refresh()
+    assert index.stats["roots_scanned"] == 2
+    assert index.lookup("vlc") is not None
+
+
+def test_launch_resolves_to_the_child_pid(bin_dir):
+    index = scanned_index()
+    assert isinstance(index.launch(index.lookup("gedit")).result(timeout=5), int)
+    assert index.stats["launches"] == 1
+
+
+def test_failed_launch_raises_and_drops_the_entry(bin_dir):
+    index = scanned_index()
+    target = index.lookup("gedit")
+    os.remove(target.argv[0])
+    with pytest.raises(OSError):
+        index.launch(target).result(timeout=5)
+    assert index.stats["launch_failures"] == 1
+    assert index.lookup("gedit") is None
+    assert index._wake.is_set()  # rescan requested
+
+
+def test_execute_app_command_reports_a_failed_launch(bin_dir, monkeypatch):
+    import server
+    missing = LaunchTarget("missing", [str(bin_dir / "missing")], "path", False)
+    monkeypatch.setattr(server, "resolve_app", lambda name: missing)
+    result = server.execute_app_command("missing")
+    assert result["status"] == "error"
+    assert result["message"].startswith("Could not open missing")
+
+
+def test_execute_app_command_does_not_claim_a_pending_launch(bin_dir, monkeypatch):
+    import server
+    pending = concurrent.futures.Future()
+    monkeypatch.setattr(server, "resolve_app", lambda name: LaunchTarget(name, ["/bin/true"], "path", False))
+    monkeypatch.setattr(server.APP_INDEX, "launch", lambda target: pending)
+    monkeypatch.setattr(server, "APP_LAUNCH_CONFIRM_SECONDS", 0.01)
+    result = server.execute_app_command("slowapp")
+    assert result == {"status": "success", "launching": True, "message": "Launching slowapp", "target": "/bin/true"}
+    pending.set_result(1234)
+    assert server.execute_app_command("slowapp")["message"] == "Opened slowapp"
@@ -0,0 +1,63 @@
+# tests/test_asgi_app.py
+# ASGI entry point: request validation and per-request bookkeeping when a handler fails
+import asyncio
+import contextvars
+import types
+
+import pytest
+
+pytest.importorskip("starlette")
+from starlette.requests import Request
+from starlette.testclient import TestClient
+
+import asgi_app
+import metrics
+import server
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(asgi_app.app) as c:
+        yield c
+
+
+@pytest.mark.parametrize("body", [{}, {"text": 5}, {"text": None}, ["open notepad"], "open notepad"])
+def test_execute_rejects_bad_text(client, body):
+    res = client.post("/api/execute", json=body)
+    assert res.status_code == 400
+    assert res.json()["message"] == "Missing 'text' field"
+
+
+def test_execute_runs_command(client):
+    res = client.post("/api/execute", json={"text": "open notepad"})
+    assert res.status_code == 200
+    assert res.json()["dry_run"] is True
+
+
+def test_failed_handler_still_ends_trace(monkeypatch):
+    monkeypatch.setattr(metrics, "TRACE_FILE", "/dev/null")
+    ended = []
+    monkeypatch.setattr(asgi_app, "end_trace", lambda **attrs: ended.append(attrs))
+
+    @asgi_app._instrumented("/boom")
+    async def boom(request):
+        raise RuntimeError("boom")
+
+    scope = {"type": "http", "method": "POST", "path": "/boom", "headers": []}
+    with pytest.raises(RuntimeError):
+        asyncio.run(boom(Request(scope)))
+    assert ended == [{"status": 500}]
+
+
+def test_blocking_llm_fallback_keeps_context(monkeypatch):
+    # Without httpx the blocking client runs in a thread; the request's context must go with it
+    request_id = contextvars.ContextVar("request_id", default=None)
+    monkeypatch.setattr(asgi_app, "GEMINI_API_KEY", "test")
+    monkeypatch.setitem(asgi_app._state, "llm", None)
+    monkeypatch.setattr(server, "LLM", types.SimpleNamespace(ask=lambda question: request_id.get()))
+
+    async def run():
+        request_id.set("abc")
+        return await asgi_app.ask_gemini("what is rust")
+
+    assert asyncio.run(run()) == "abc"
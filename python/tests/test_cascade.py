@@ -0,0 +1,116 @@
+# tests/test_cascade.py
+# Model cascade: when the small model's result is escalated, and what happens when the large one is busy
+import pytest
+
+from app_index import AppIndex
+from cascade import CascadeEngine, Thresholds, escalation_reason
+from scheduler import EngineBusy
+
+THRESHOLDS = Thresholds(min_logprob=-0.6, max_no_speech=0.4, max_compression=2.0)
+
+
+def result(text="open notepad", **segment):
+    scores = {"avg_logprob": -0.2, "no_speech_prob": 0.1, "compression_ratio": 1.2}
+    scores.update(segment)
+    return {"text": text, "segments": [scores, {"avg_logprob": -0.1, "no_speech_prob": 0.0, "compression_ratio": 1.0}]}
+
+
+class FixedEngine:
+    """Engine stand-in returning a copy of `result` (or raising `error`), counting calls."""
+
+    def __init__(self, result=None, error=None, queued=0):
+        self.result = result
+        self.error = error
+        self.queued = queued
+        self.calls = 0
+
+    def transcribe(self, audio, **options):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return dict(self.result)
+
+    def qsize(self):
+        return self.queued
+
+
+@pytest.mark.parametrize("res, reason", [
+    (result(), None),
+    (result(text="  "), "empty"),
+    ({"text": "open notepad", "segments": []}, "empty"),
+    (result(avg_logprob=-0.9), "low_logprob"),
+    (result(no_speech_prob=0.7), "no_speech"),
+    (result(compression_ratio=2.6), "compression"),
+    (result(avg_logprob=-0.6, no_speech_prob=0.4, compression_ratio=2.0), None),  # thresholds are exclusive
+])
+def test_escalation_reason(res, reason):
+    assert escalation_reason(res, THRESHOLDS) == reason
+
+
+def test_confident_result_stays_on_the_fast_model():
+    fast, accurate = FixedEngine(result()), FixedEngine(result(text="open notes"))
+    engine = CascadeEngine(fast, accurate, THRESHOLDS)
+    assert engine.transcribe(None)["text"] == "open notepad"
+    assert accurate.calls == 0
+    assert engine.snapshot()["escalation_rate"] == 0.0
+
+
+def test_uncertain_result_is_rerun_on_the_accurate_model():
+    fast, accurate = FixedEngine(result(avg_logprob=-1.5)), FixedEngine(result(text="open notes"))
+    engine = CascadeEngine(fast, accurate, THRESHOLDS)
+    out = engine.transcribe(None, language="en")
+    assert out == dict(result(text="open notes"), escalated="low_logprob")
+    snapshot = engine.snapshot()
+    assert snapshot["escalated"] == 1
+    assert snapshot["reasons"] == {"low_logprob": 1}
+
+
+def test_check_hook_escalates_a_confident_result():
+    seen = []
+
+    def check(text):
+        seen.append(text)
+        return "command_miss"
+
+    engine = CascadeEngine(FixedEngine(result()), FixedEngine(result(text="open notes")), THRESHOLDS, check=check)
+    assert engine.transcribe(None)["escalated"] == "command_miss"
+    assert seen == ["open notepad"]
+
+
+def test_check_hook_is_skipped_once_scores_escalate():
+    def check(text):
+        raise AssertionError("check should not run")
+
+    engine = CascadeEngine(FixedEngine(result(no_speech_prob=0.9)), FixedEngine(result()), THRESHOLDS, check=check)
+    assert engine.transcribe(None)["escalated"] == "no_speech"
+
+
+def test_busy_accurate_model_keeps_the_fast_result():
+    fast = FixedEngine(result(avg_logprob=-1.5), queued=2)
+    accurate = FixedEngine(error=EngineBusy("full"), queued=3)
+    engine = CascadeEngine(fast, accurate, THRESHOLDS)
+    assert engine.transcribe(None) == result(avg_logprob=-1.5)
+    assert engine.snapshot()["busy"] == 1
+    assert engine.snapshot()["escalated"] == 0
+    assert engine.qsize() == 5
+
+
+@pytest.fixture
+def app_index(monkeypatch):
+    import server
+    index = AppIndex(scanners=[])
+    monkeypatch.setattr(server, "APP_INDEX", index)
+    return index
+
+
+def test_cascade_check_flags_unopenable_commands(app_index):
+    import server
+    app_index._ready.set()
+    assert server.cascade_check("open frobnicator") == "command_miss"
+    assert server.cascade_check("what is the weather like in paris today") is None
+
+
+def test_cascade_check_waits_for_the_app_index(app_index):
+    import server
+    assert not app_index.ready
+    assert server.cascade_check("open frobnicator") is None
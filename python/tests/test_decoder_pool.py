@@ -0,0 +1,91 @@
+# tests/test_decoder_pool.py
+# DecoderPool: backend choice, limits, and giving up on a hung PyAV decode
+import io
+import shutil
+import threading
+import time
+import wave
+
+import numpy as np
+import pytest
+
+import decoder_pool
+from decoder_pool import DecodeError, DecoderPool
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+
+
+def wav_bytes(seconds=1.0, rate=16000):
+    t = np.arange(int(seconds * rate)) / rate
+    pcm = (np.sin(2 * np.pi * 440 * t) * 12000).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+@pytest.fixture
+def no_pyav(monkeypatch):
+    monkeypatch.setattr(decoder_pool, "HAVE_PYAV", False)
+
+
+def test_auto_uses_ffmpeg_without_pyav(no_pyav):
+    pool = DecoderPool(backend="auto")
+    assert pool.backend == "ffmpeg"
+    audio = pool.decode(wav_bytes(1.0))
+    assert abs(len(audio) - 16000) < 200
+
+
+def test_pyav_backend_requires_pyav(no_pyav):
+    with pytest.raises(RuntimeError, match="PyAV"):
+        DecoderPool(backend="pyav")
+
+
+@pytest.mark.parametrize("backend", ["ffmpeg", "pyav"])
+def test_limits_and_errors(backend):
+    if backend == "pyav":
+        pytest.importorskip("av")
+    pool = DecoderPool(backend=backend, max_seconds=1.0)
+    with pytest.raises(DecodeError) as exc:
+        pool.decode(wav_bytes(2.0))
+    assert exc.value.reason == "too_long"
+    with pytest.raises(DecodeError) as exc:
+        pool.decode(b"")
+    assert exc.value.reason == "empty"
+    with pytest.raises(DecodeError) as exc:
+        pool.decode(b"definitely not audio" * 50)
+    assert exc.value.reason == "invalid"
+    assert pool.snapshot()["failure_reasons"] == {"too_long": 1, "empty": 1, "invalid": 1}
+
+
+def test_hung_pyav_decode_times_out_then_falls_back_to_ffmpeg(monkeypatch):
+    pytest.importorskip("av")
+    release = threading.Event()
+    real = decoder_pool._pyav_decode
+
+    def hang(*args):
+        release.wait()  # a libav call that never returns
+        return real(*args)
+
+    monkeypatch.setattr(decoder_pool, "_pyav_decode", hang)
+    pool = DecoderPool(backend="pyav", workers=2, timeout=0.3)
+    data = wav_bytes(1.0)
+    for _ in range(2):
+        started = time.monotonic()
+        with pytest.raises(DecodeError) as exc:
+            pool.decode(data)
+        assert exc.value.reason == "timeout"
+        assert time.monotonic() - started < 1.0  # the caller does not wait for the stuck thread
+    # Every slot's thread is stuck: the next decode goes to the killable ffmpeg subprocess
+    assert len(pool.decode(data)) > 0
+    stats = pool.snapshot()
+    assert (stats["abandoned"], stats["stuck"], stats["ffmpeg_fallbacks"]) == (2, 2, 1)
+
+    release.set()
+    deadline = time.monotonic() + 2
+    while pool.snapshot()["stuck"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool._use_pyav()  # back on PyAV once the stuck decodes finish
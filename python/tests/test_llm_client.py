@@ -0,0 +1,202 @@
+# tests/test_llm_client.py
+# GeminiClient against the local stub endpoint: coalescing, cache TTL, retries, breaker and streaming
+import asyncio
+import concurrent.futures
+import time
+
+import pytest
+
+from bench.stub_llm import StubLLM
+from llm_client import AsyncGeminiClient, CircuitBreaker, GeminiClient, LLMError
+
+
+@pytest.fixture
+def stub():
+    server = StubLLM(delay=0.2, chunk_delay=0.05).start()
+    yield server
+    server.stop()
+
+
+def make_client(stub, **options):
+    options.setdefault("backoff", 0.01)
+    return GeminiClient(api_key="test", url=stub.url, **options)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_concurrent_identical_prompts_share_one_call(stub):
+    client = make_client(stub)
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        answers = list(pool.map(client.ask, ["what is rust"] * 8))
+    assert answers == ["stub answer to: what is rust"] * 8
+    assert stub.calls == 1
+    assert client.stats["coalesced"] == 7
+
+
+def test_cache_serves_repeats_until_ttl(stub):
+    client = make_client(stub, cache_ttl=0.3)
+    client.ask("hello")
+    client.ask("hello")
+    assert stub.calls == 1
+    assert client.stats["cache_hits"] == 1
+    time.sleep(0.35)
+    client.ask("hello")
+    assert stub.calls == 2
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retryable_status_is_retried(stub, status):
+    client = make_client(stub.fail(status, status), retries=2)
+    assert client.ask("retry me") == "stub answer to: retry me"
+    assert stub.calls == 3
+    assert client.stats["retries"] == 2
+    assert client.breaker.state == "closed"
+
+
+def test_gives_up_after_retries(stub):
+    client = make_client(stub.fail(503, 503, 503), retries=2)
+    with pytest.raises(LLMError, match="after 3 attempts"):
+        client.ask("never")
+    assert stub.calls == 3
+    assert client.stats["errors"] == 1
+
+
+def test_client_error_is_not_retried(stub):
+    client = make_client(stub.fail(400), retries=2)
+    with pytest.raises(LLMError):
+        client.ask("bad request")
+    assert stub.calls == 1
+
+
+def test_breaker_opens_then_half_opens(stub):
+    client = make_client(stub.fail(500, 500), retries=0)
+    client.breaker = CircuitBreaker(threshold=2, cooldown=0.3)
+    for prompt in ("one", "two"):
+        with pytest.raises(LLMError):
+            client.ask(prompt)
+    assert client.breaker.state == "open"
+
+    with pytest.raises(LLMError, match="circuit open"):
+        client.ask("three")
+    assert stub.calls == 2
+    assert client.stats["rejected"] == 1
+
+    time.sleep(0.35)
+    assert client.breaker.state == "half-open"
+    assert client.ask("four") == "stub answer to: four"
+    assert client.breaker.state == "closed"
+
+
+def test_failed_half_open_trial_reopens(stub):
+    client = make_client(stub.fail(500, 500), retries=0)
+    client.breaker = CircuitBreaker(threshold=1, cooldown=0.2)
+    with pytest.raises(LLMError):
+        client.ask("one")
+    time.sleep(0.25)
+    with pytest.raises(LLMError):
+        client.ask("trial")
+    assert client.breaker.state == "open"
+
+
+def open_breaker(client):
+    """Trip a threshold-1 breaker and wait out its cooldown, so the next call is the half-open trial."""
+    client.breaker = CircuitBreaker(threshold=1, cooldown=0.2)
+    client.breaker.record(False)
+    time.sleep(0.25)
+    assert client.breaker.state == "half-open"
+
+
+def assert_trial_released(client, stub):
+    """The failed trial re-opened the breaker; after the cooldown another trial is let through."""
+    assert client.breaker.state == "open"
+    time.sleep(0.25)
+    assert client.ask("after") == "stub answer to: after"
+    assert client.breaker.state == "closed"
+
+
+@pytest.mark.parametrize("failure", ["not_json", "truncated", "redirect"])
+def test_failed_trial_does_not_wedge_breaker(stub, failure):
+    client = make_client(stub.fail(failure), retries=0)
+    open_breaker(client)
+    with pytest.raises(LLMError):
+        client.ask("trial")
+    assert_trial_released(client, stub)
+
+
+def test_invalid_url_trial_does_not_wedge_breaker(stub):
+    client = make_client(stub, retries=0)
+    open_breaker(client)
+    client.url, good_url = "http://", client.url
+    with pytest.raises(LLMError):
+        client.ask("trial")
+    client.url = good_url
+    assert_trial_released(client, stub)
+
+
+def test_failed_async_trial_does_not_wedge_breaker(stub):
+    pytest.importorskip("httpx")
+    stub.fail("redirect", "not_json")
+
+    async def run():
+        client = AsyncGeminiClient(api_key="test", url=stub.url, retries=0, backoff=0.01)
+        try:
+            for prompt in ("redirect", "not json"):
+                open_breaker(client)
+                with pytest.raises(LLMError):
+                    await client.ask(prompt)
+                assert client.breaker.state == "open"
+            await asyncio.sleep(0.25)
+            return await client.ask("after")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == "stub answer to: after"
+
+
+def test_stream_yields_pieces_and_caches(stub):
+    client = make_client(stub)
+    pieces = list(client.stream("tell me"))
+    assert len(pieces) > 1
+    assert "".join(pieces) == "stub answer to: tell me"
+    assert list(client.stream("tell me")) == ["stub answer to: tell me"]
+    assert stub.calls == 1
+
+
+def test_stream_retries_before_first_piece(stub):
+    client = make_client(stub.fail(429), retries=1)
+    assert "".join(client.stream("again")) == "stub answer to: again"
+    assert client.stats["retries"] == 1
+
+
+def test_closing_stream_cancels_upstream(stub):
+    client = make_client(stub)
+    stream = client.stream("a long answer that keeps going for a while")
+    next(stream)
+    stream.close()
+    assert client.stats["cancelled"] == 1
+    assert client.breaker.state == "closed"
+    assert client.snapshot()["cache_entries"] == 0  # a partial answer is never cached
+    assert wait_for(lambda: stub.httpd.cancelled == 1)
+
+
+def test_stream_decodes_utf8(stub):
+    client = make_client(stub)
+    assert "".join(client.stream("¿qué es 日本語?")) == "stub answer to: ¿qué es 日本語?"
+
+
+def test_async_stream_decodes_utf8(stub):
+    pytest.importorskip("httpx")
+
+    async def collect():
+        client = AsyncGeminiClient(api_key="test", url=stub.url, backoff=0.01)
+        try:
+            return [piece async for piece in client.stream("naïve café")]
+        finally:
+            await client.aclose()
+
+    assert "".join(asyncio.run(collect())) == "stub answer to: naïve café"
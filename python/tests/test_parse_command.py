@@ -0,0 +1,46 @@
+# tests/test_parse_command.py
+# CommandRegistry.parse(): spoken phrase -> (type, target, match kind)
+import pytest
+
+from command_registry import CommandRegistry
+
+PARSE_CASES = [
+    ("open notepad", ("app", "notepad", "exact")),
+    ("Open Notepad", ("app", "notepad", "exact")),
+    ("start calc", ("app", "calculator", "exact")),
+    ("launch visual studio code", ("app", "vs code", "exact")),
+    ("open vscode", ("app", "vs code", "exact")),
+    ("open browser", ("app", "edge", "exact")),
+    ("launch edge", ("app", "edge", "exact")),
+    ("go to google", ("website", "google", "exact")),
+    ("go to github", ("website", "github", "exact")),
+    ("visit stackoverflow", ("website", "stackoverflow", "exact")),
+    ("open you tube", ("website", "youtube", "exact")),
+    ("open fb", ("website", "facebook", "exact")),
+    ("reopen notepad", ("app", "notepad", "exact")),
+    ("open gimp", ("app", "gimp", "fallback")),
+    ("open spotify app", ("app", "spotify", "fallback")),
+    ("start youtube", ("app", "youtube", "fallback")),  # websites need open/go to/visit
+    ("what is the weather", ("unknown", None, None)),
+    # App names are tried before website names, so "google" does not shadow "google chrome"
+    ("open google chrome", ("app", "chrome", "exact")),
+    # "the" and the app/application/program suffix are skipped around known names
+    ("start the calculator", ("app", "calculator", "exact")),
+    ("open the file explorer app", ("app", "explorer", "exact")),
+    # Misheard names are corrected within a small edit distance
+    ("open notpad", ("app", "notepad", "fuzzy")),
+    # A verb anywhere still yields a fallback target; execute_transcript() sends these to the LLM
+    ("how do i start a business", ("app", "a business", "fallback")),
+    ("what time does the store open tomorrow", ("app", "tomorrow", "fallback")),
+]
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return CommandRegistry()
+
+
+@pytest.mark.parametrize("phrase, expected", PARSE_CASES)
+def test_parse(registry, phrase, expected):
+    parsed = registry.parse(phrase)
+    assert (parsed["type"], parsed.get("app") or parsed.get("name"), parsed.get("match")) == expected
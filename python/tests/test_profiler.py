@@ -0,0 +1,55 @@
+# tests/test_profiler.py
+# Per-request cProfile (X-Profile-Request): one stats file per request, profiler off again when the view returns
+import functools
+import os
+import pstats
+import sys
+
+import pytest
+
+import profiler
+from profiler import RequestProfile
+
+
+def test_run_profiles_the_call_and_unhooks_the_thread(tmp_path):
+    profile = RequestProfile("/health", directory=str(tmp_path))
+    assert profile.run(sorted, [3, 1, 2]) == [1, 2, 3]
+    assert profile.written
+    assert sys.getprofile() is None
+    assert f"-health-{os.getpid()}-" in os.path.basename(profile.path)
+    pstats.Stats(profile.path)  # readable
+
+
+def test_run_writes_stats_when_the_call_raises(tmp_path):
+    profile = RequestProfile("/boom", directory=str(tmp_path))
+    with pytest.raises(ZeroDivisionError):
+        profile.run(lambda: 1 / 0)
+    assert profile.written
+    assert sys.getprofile() is None
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    import server
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(server, "RequestProfile", functools.partial(profiler.RequestProfile, directory=str(tmp_path)))
+    return server.app.test_client()
+
+
+def test_consecutive_profiled_requests_each_get_a_profile(client, tmp_path):
+    headers = {"X-Profile-Request": "1", "X-Admin-Token": "secret"}
+    names = []
+    for _ in range(2):
+        response = client.get("/health", headers=headers)
+        assert response.status_code == 200
+        names.append(response.headers["X-Profile-File"])
+        assert sys.getprofile() is None
+        stats = pstats.Stats(str(tmp_path / names[-1]))
+        assert any(func == "health" for _, _, func in stats.stats)
+    assert names[0] != names[1]
+
+
+def test_profiling_needs_the_admin_token(client):
+    response = client.get("/health", headers={"X-Profile-Request": "1", "X-Admin-Token": "wrong"})
+    assert response.status_code == 200
+    assert "X-Profile-File" not in response.headers
@@ -0,0 +1,131 @@
+# tests/test_raw_audio.py
+# Declared raw uploads: format parsing, PCM layouts, chunked body reads and band-limited resampling
+import io
+
+import numpy as np
+import pytest
+
+import raw_audio
+from decoder_pool import DECODER_CHUNK_BYTES, DecodeError
+from raw_audio import RawFormat, decode_raw, parse_raw_format, read_raw, resample
+
+
+class CountingStream(io.BytesIO):
+    """BytesIO that records every read() size, to check the body is consumed in chunks."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+def tone(freq, seconds=1.0, rate=48000):
+    t = np.arange(int(seconds * rate)) / rate
+    return (np.sin(2 * np.pi * freq * t) * 0.5).astype(np.float32)
+
+
+def rms(audio):
+    return float(np.sqrt(np.mean(np.square(audio))))
+
+
+@pytest.mark.parametrize("content_type, expected", [
+    ("audio/s16le;rate=16000;channels=1", RawFormat("s16le", 16000, 1)),
+    ("audio/L16; rate=8000", RawFormat("s16be", 8000, 1)),
+    ("audio/f32le", RawFormat("f32le", 16000, 1)),
+    ('audio/s16le; rate="44100"; channels=2', RawFormat("s16le", 44100, 2)),
+    ("audio/webm", None),
+    ("", None),
+])
+def test_parse_raw_format(content_type, expected):
+    assert parse_raw_format(content_type) == expected
+
+
+@pytest.mark.parametrize("content_type", [
+    "audio/s16le;rate=abc",
+    "audio/s16le;rate=1000",
+    "audio/s16le;channels=9",
+])
+def test_parse_raw_format_rejects_bad_parameters(content_type):
+    with pytest.raises(DecodeError) as info:
+        parse_raw_format(content_type)
+    assert info.value.reason == "unsupported"
+
+
+def test_pcm_layouts_decode_to_the_same_samples():
+    samples = np.array([0, 16384, -16384, 32767], dtype=np.int16)
+    expected = samples.astype(np.float32) / 32768.0
+    for codec, data in (("s16le", samples.astype("<i2").tobytes()),
+                        ("s16be", samples.astype(">i2").tobytes()),
+                        ("f32le", expected.astype("<f4").tobytes())):
+        audio = decode_raw(data, RawFormat(codec, 16000, 1), max_seconds=10)
+        np.testing.assert_allclose(audio, expected)
+
+
+def test_channels_are_averaged():
+    stereo = np.array([[16384, 0], [-16384, -16384]], dtype="<i2").tobytes()
+    audio = decode_raw(stereo, RawFormat("s16le", 16000, 2), max_seconds=10)
+    np.testing.assert_allclose(audio, [0.25, -0.5])
+
+
+@pytest.mark.parametrize("data, fmt, reason", [
+    (b"", RawFormat("s16le", 16000, 1), "empty"),
+    (b"\x00\x00\x00", RawFormat("s16le", 16000, 1), "invalid"),
+    (b"\x00\x00", RawFormat("s16le", 16000, 2), "invalid"),
+    (np.array([np.nan], dtype="<f4").tobytes(), RawFormat("f32le", 16000, 1), "invalid"),
+    (bytes(2 * 16001), RawFormat("s16le", 16000, 1), "too_long"),
+])
+def test_decode_raw_errors(data, fmt, reason):
+    with pytest.raises(DecodeError) as info:
+        decode_raw(data, fmt, max_seconds=1)
+    assert info.value.reason == reason
+
+
+def test_read_raw_reads_in_chunks():
+    data = bytes(range(256)) * 1024
+    stream = CountingStream(data)
+    assert read_raw(stream, RawFormat("s16le", 16000, 1), max_seconds=60) == data
+    assert set(stream.reads) == {DECODER_CHUNK_BYTES}
+
+
+def test_read_raw_stops_at_the_first_chunk_past_max_seconds():
+    fmt = RawFormat("s16le", 16000, 1)
+    stream = CountingStream(bytes(2 * 16000 * 60))  # 60 s
+    with pytest.raises(DecodeError) as info:
+        read_raw(stream, fmt, max_seconds=1)
+    assert info.value.reason == "too_long"
+    assert stream.tell() <= 2 * 16000 + DECODER_CHUNK_BYTES
+
+
+def test_read_raw_accepts_exactly_max_seconds():
+    data = bytes(2 * 2 * 16000)  # 1 s of stereo s16le
+    assert read_raw(io.BytesIO(data), RawFormat("s16le", 16000, 2), max_seconds=1) == data
+
+
+@pytest.fixture(params=[False, True], ids=["numpy", "scipy"])
+def resampler(request, monkeypatch):
+    if request.param:
+        pytest.importorskip("scipy.signal")
+    monkeypatch.setattr(raw_audio, "HAVE_SCIPY", request.param)
+    return resample
+
+
+def test_resample_keeps_the_speech_band(resampler):
+    out = resampler(tone(1000), 48000, 16000)
+    assert abs(len(out) - 16000) <= 1
+    assert out.dtype == np.float32
+    assert rms(out[100:-100]) == pytest.approx(rms(tone(1000)), rel=0.05)
+
+
+def test_resample_does_not_alias_above_nyquist(resampler):
+    # A 12 kHz tone folds to 4 kHz at 16 kHz without a low-pass in front of the decimation
+    out = resampler(tone(12000), 48000, 16000)
+    assert rms(out[100:-100]) < 0.02 * rms(tone(12000))
+
+
+def test_resample_upsamples_and_passes_through(resampler):
+    audio = tone(440, rate=8000)
+    assert resampler(audio, 16000, 16000) is audio
+    assert abs(len(resampler(audio, 8000, 16000)) - 16000) <= 1
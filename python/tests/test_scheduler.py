@@ -0,0 +1,72 @@
+# tests/test_scheduler.py
+# BatchScheduler: concurrent clips share batches, options never mix, a full queue answers busy
+import threading
+import time
+
+import pytest
+
+from scheduler import BatchScheduler, EngineBusy
+
+
+class RecordingBackend:
+    """Echoes each clip back as its text and records the batches it was called with."""
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def transcribe_batch(self, audios, **options):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batches.append((list(audios), options))
+        return [{"text": audio} for audio in audios]
+
+
+def test_clips_arriving_together_share_a_batch():
+    backend = RecordingBackend()
+    scheduler = BatchScheduler(backend, max_batch_size=8, max_wait_ms=100, workers=1, max_queue=0)
+    futures = [scheduler.submit(f"clip-{i}", {"language": "en"}) for i in range(5)]
+    assert [f.result(5)["text"] for f in futures] == [f"clip-{i}" for i in range(5)]
+    assert len(backend.batches) == 1
+    assert scheduler.snapshot()["avg_batch_size"] == 5
+    scheduler.shutdown()
+
+
+def test_batches_are_split_by_options_and_size():
+    backend = RecordingBackend()
+    scheduler = BatchScheduler(backend, max_batch_size=3, max_wait_ms=100, workers=1, max_queue=0)
+    futures = [scheduler.submit(f"a{i}", {"beam_size": 1}) for i in range(4)]
+    futures += [scheduler.submit(f"b{i}", {"beam_size": 5}) for i in range(2)]
+    assert all(f.result(5) for f in futures)
+    for audios, options in backend.batches:
+        assert len(audios) <= 3
+        assert {a[0] for a in audios} == {"a" if options["beam_size"] == 1 else "b"}
+    scheduler.shutdown()
+
+
+def test_backend_error_fails_every_clip_in_the_batch():
+    class Broken:
+        def transcribe_batch(self, audios, **options):
+            raise RuntimeError("model crashed")
+
+    scheduler = BatchScheduler(Broken(), max_batch_size=4, max_wait_ms=50, workers=1, max_queue=0)
+    futures = [scheduler.submit(i, {}) for i in range(3)]
+    for f in futures:
+        with pytest.raises(RuntimeError, match="model crashed"):
+            f.result(5)
+    scheduler.shutdown()
+
+
+def test_full_queue_raises_busy():
+    gate = threading.Event()
+    scheduler = BatchScheduler(RecordingBackend(gate), max_batch_size=1, max_wait_ms=0, workers=1, max_queue=2)
+    running = scheduler.submit("running", {})
+    while scheduler.qsize():  # wait until the worker has taken it and is blocked in the backend
+        time.sleep(0.001)
+    queued = [scheduler.submit(f"q{i}", {}) for i in range(2)]
+    with pytest.raises(EngineBusy):
+        scheduler.submit("overflow", {})
+    assert scheduler.snapshot()["rejected"] == 1
+    gate.set()
+    assert [f.result(5)["text"] for f in [running] + queued] == ["running", "q0", "q1"]
+    scheduler.shutdown()
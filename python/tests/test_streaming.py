@@ -0,0 +1,58 @@
+# tests/test_streaming.py
+# StreamRegistry: the open-session cap under concurrent creates
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+import streaming
+from streaming import StreamRegistry, TooManyStreams
+
+
+class SlowDecoder:
+    """Stands in for StreamDecoder: takes a while to start, like spawning ffmpeg."""
+
+    def __init__(self, max_seconds=None):
+        time.sleep(0.05)
+        self.seconds = 0.0
+
+    def abort(self):
+        pass
+
+
+class BrokenDecoder:
+    def __init__(self, max_seconds=None):
+        raise OSError("ffmpeg not found")
+
+
+def test_cap_holds_under_concurrent_creates(monkeypatch):
+    monkeypatch.setattr(streaming, "StreamDecoder", SlowDecoder)
+    registry = StreamRegistry(max_sessions=3, idle_timeout=60)
+    start = threading.Barrier(10)
+
+    def create(_):
+        start.wait()
+        try:
+            return registry.create(lambda audio: "", None)
+        except TooManyStreams:
+            return None
+
+    with concurrent.futures.ThreadPoolExecutor(10) as pool:
+        sessions = list(pool.map(create, range(10)))
+    assert sum(s is not None for s in sessions) == 3
+    assert len(registry) == 3
+
+
+def test_failed_create_releases_its_slot(monkeypatch):
+    registry = StreamRegistry(max_sessions=1, idle_timeout=60)
+    monkeypatch.setattr(streaming, "StreamDecoder", BrokenDecoder)
+    with pytest.raises(OSError):
+        registry.create(lambda audio: "", None)
+    monkeypatch.setattr(streaming, "StreamDecoder", SlowDecoder)
+    session = registry.create(lambda audio: "", None)
+    assert len(registry) == 1
+    with pytest.raises(TooManyStreams):
+        registry.create(lambda audio: "", None)
+    registry.pop(session.id)
+    registry.create(lambda audio: "", None)
@@ -0,0 +1,55 @@
+# tests/test_transcript_cache.py
+# TranscriptCache: fingerprint stability, LRU + TTL in memory, and the sqlite tier
+import time
+
+import numpy as np
+
+from transcript_cache import TranscriptCache, audio_fingerprint, cache_key
+
+
+def tone(gain=0.5, seconds=0.5, rate=16000):
+    t = np.arange(int(seconds * rate)) / rate
+    return (np.sin(2 * np.pi * 300 * t) * gain).astype(np.float32)
+
+
+def test_fingerprint_ignores_gain_but_not_content():
+    assert audio_fingerprint(tone(0.5)) == audio_fingerprint(tone(0.9))
+    assert audio_fingerprint(tone(0.5)) != audio_fingerprint(tone(0.5, seconds=0.6))
+    assert audio_fingerprint(np.zeros(0, dtype=np.float32))  # empty audio still hashes
+
+
+def test_key_depends_on_model_and_options():
+    fp = audio_fingerprint(tone())
+    assert cache_key(fp, "tiny", {"beam_size": 1}) == cache_key(fp, "tiny", {"beam_size": 1})
+    assert cache_key(fp, "tiny", {"beam_size": 1}) != cache_key(fp, "small", {"beam_size": 1})
+    assert cache_key(fp, "tiny", {"beam_size": 1}) != cache_key(fp, "tiny", {"beam_size": 5})
+
+
+def test_lru_eviction():
+    cache = TranscriptCache(max_entries=2, ttl=0, db_path="")
+    cache.put("a", {"text": "a"})
+    cache.put("b", {"text": "b"})
+    assert cache.get("a") == {"text": "a"}  # "b" is now least recently used
+    cache.put("c", {"text": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+    assert cache.snapshot()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    cache = TranscriptCache(max_entries=8, ttl=0.1, db_path="")
+    cache.put("a", {"text": "a"})
+    assert cache.get("a") is not None
+    time.sleep(0.15)
+    assert cache.get("a") is None
+    assert cache.snapshot()["expired"] == 1
+
+
+def test_disk_tier_survives_a_new_process(tmp_path):
+    db = str(tmp_path / "transcripts.db")
+    TranscriptCache(max_entries=8, ttl=0, db_path=db).put("a", {"text": "open notepad", "avg_logprob": -0.2})
+    fresh = TranscriptCache(max_entries=8, ttl=0, db_path=db)
+    assert fresh.get("a") == {"text": "open notepad", "avg_logprob": -0.2}
+    assert fresh.get("a") is not None  # promoted to memory
+    stats = fresh.snapshot()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["persistent"]) == (1, 1, True)
@@ -0,0 +1,108 @@
+# transcript_cache.py
+# Content-addressed transcript cache: hash(normalized PCM + model + options) -> whisper result
+import collections
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+TRANSCRIPT_CACHE = os.environ.get("TRANSCRIPT_CACHE", "0").lower() in ("1", "true", "yes", "on")
+TRANSCRIPT_CACHE_SIZE = int(os.environ.get("TRANSCRIPT_CACHE_SIZE", "1024"))  # in-process entries
+TRANSCRIPT_CACHE_TTL = float(os.environ.get("TRANSCRIPT_CACHE_TTL", "86400"))  # seconds, 0 = no expiry
+TRANSCRIPT_CACHE_DB = os.environ.get("TRANSCRIPT_CACHE_DB", "")  # sqlite path for the persistent tier
+
+
+def audio_fingerprint(audio: np.ndarray) -> str:
+    """Hash of peak-normalized, 16-bit quantized PCM, so gain and float noise don't change the key."""
+    audio = np.asarray(audio, dtype=np.float32)
+    peak = float(np.max(np.abs(audio))) if len(audio) else 0.0
+    if peak > 0:
+        audio = audio / peak
+    return hashlib.sha256((audio * 32767).astype(np.int16).tobytes()).hexdigest()
+
+
+def cache_key(fingerprint: str, model_name: str, options: dict) -> str:
+    opts = json.dumps(options, sort_keys=True, default=repr)
+    return hashlib.sha256(f"{fingerprint}|{model_name}|{opts}".encode()).hexdigest()
+
+
+class TranscriptCache:
+    """Two-tier cache: an LRU dict with TTL in memory, optionally backed by sqlite on disk."""
+
+    def __init__(self, max_entries: int = TRANSCRIPT_CACHE_SIZE, ttl: float = TRANSCRIPT_CACHE_TTL,
+                 db_path: str = TRANSCRIPT_CACHE_DB):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._memory = collections.OrderedDict()  # key -> (stored_at, result)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "evictions": 0, "expired": 0}
+        self._db = None
+        self._puts = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts (key TEXT PRIMARY KEY, stored_at REAL, result TEXT)"
+            )
+            self._db.commit()
+            logging.info(f"Transcript cache persistent tier: {db_path}")
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._expired(entry[0], now):
+                    del self._memory[key]
+                    self.stats["expired"] += 1
+                else:
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return entry[1]
+            if self._db is not None:
+                row = self._db.execute("SELECT stored_at, result FROM transcripts WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[0], now):
+                    result = json.loads(row[1])
+                    self._remember(key, row[0], result)
+                    self.stats["hits"] += 1
+                    self.stats["disk_hits"] += 1
+                    return result
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, result: dict):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, result)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO transcripts (key, stored_at, result) VALUES (?, ?, ?)",
+                    (key, now, json.dumps(result, default=float)),
+                )
+                self._puts += 1
+                if self.ttl > 0 and self._puts % 256 == 0:
+                    self._db.execute("DELETE FROM transcripts WHERE stored_at < ?", (now - self.ttl,))
+                self._db.commit()
+
+    def _remember(self, key, stored_at, result):
+        self._memory[key] = (stored_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=len(self._memory),
+                        hit_rate=round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                        persistent=self._db is not None)
@@ -1,7 +1,6 @@
 # voice_app_launcher.py
 # Standalone Voice Command App Launcher - can work independently or send commands to server
 import requests
-import json
 import sys
 
 def send_command_to_server(command):
@@ -29,6 +28,41 @@ def send_command_to_server(command):
         print(f"✗ Error: {e}")
         return False
 
+def transcribe_file(path, rate=16000):
+    """Downsample a WAV file locally and upload it as raw 16-bit PCM (no container decode on the server)."""
+    import wave
+    import numpy as np
+    try:
+        with wave.open(path, "rb") as wav:
+            if wav.getsampwidth() != 2:
+                print("✗ Only 16-bit WAV files are supported")
+                return False
+            channels, src_rate = wav.getnchannels(), wav.getframerate()
+            audio = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2").astype(np.float32)
+        audio = audio.reshape(-1, channels).mean(axis=1)
+        if src_rate != rate:
+            n = int(len(audio) * rate / src_rate)
+            audio = np.interp(np.arange(n) * (src_rate / rate), np.arange(len(audio)), audio)
+        body = np.clip(audio, -32768, 32767).astype("<i2").tobytes()
+        response = requests.post(
+            "http://localhost:5000/transcribe",
+            data=body,
+            headers={"Content-Type": f"audio/s16le; rate={rate}; channels=1"},
+            timeout=60,
+        )
+        result = response.json()
+        if response.status_code != 200:
+            print(f"✗ Server error: {response.status_code} {result.get('error')}")
+            return False
+        print(f"✓ {result.get('question', '')!r} -> {result.get('text', '')}")
+        return True
+    except requests.exceptions.ConnectionError:
+        print("✗ Could not connect to server. Make sure server.py is running on port 5000.")
+        return False
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        return False
+
 def test_commands():
     """Test various voice commands with the server."""
     test_commands = [
@@ -88,6 +122,8 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         if sys.argv[1] == "test":
             test_commands()
+        elif sys.argv[1] == "transcribe" and len(sys.argv) == 3:
+            transcribe_file(sys.argv[2])
         else:
             # Execute single command from command line
             command = " ".join(sys.argv[1:])
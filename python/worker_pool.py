@@ -0,0 +1,306 @@
+# worker_pool.py
+# Multi-process inference: N pre-forked model workers, PCM handed over through shared memory
+import concurrent.futures
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+
+from scheduler import WHISPER_MAX_QUEUE, EngineBusy
+
+WHISPER_WORKER_PROCESSES = int(os.environ.get("WHISPER_WORKER_PROCESSES", "0"))  # 0 = in-process model
+WHISPER_WORKER_CORES = int(os.environ.get("WHISPER_WORKER_CORES", "0"))  # cores per worker, 0 = split evenly
+WHISPER_WORKER_START = os.environ.get("WHISPER_WORKER_START", "spawn")  # multiprocessing start method
+WHISPER_WORKER_TIMEOUT = float(os.environ.get("WHISPER_WORKER_TIMEOUT", "120"))  # per-clip hard limit
+WHISPER_WORKER_HEALTH_INTERVAL = float(os.environ.get("WHISPER_WORKER_HEALTH_INTERVAL", "5"))
+WORKER_NAME_PREFIX = "whisper-worker-"  # process name; the server starts nothing in these
+
+
+def _worker_main(index, conn, cores, threads, backend_name, model_name, warmup_options=None):
+    """Worker process: pin to its cores, load (and warm up) the model once, then serve clips until told to stop."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    # Must be set before torch / CTranslate2 spin up their thread pools
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    from log_setup import setup_logging
+    setup_logging(f"worker {index}", force=True)
+
+    from asr_backends import load_backend
+    backend = load_backend(backend_name, model_name=model_name, threads=threads)
+    info = backend.describe()
+    if warmup_options is not None:
+        from model_loader import warm_up
+        info["warmup_seconds"] = round(warm_up(backend, warmup_options), 3)
+    conn.send(("ready", None, info))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        kind, task_id, payload = msg
+        if kind == "ping":
+            conn.send(("pong", task_id, None))
+            continue
+        shm_name, audio, options = payload
+        shm = None
+        try:
+            if shm_name is not None:  # otherwise `audio` is a file path
+                shm = shared_memory.SharedMemory(name=shm_name)
+                audio = np.ndarray((audio,), dtype=np.float32, buffer=shm.buf).copy()
+            conn.send(("result", task_id, backend.transcribe(audio, **options)))
+        except Exception as exc:
+            logging.exception("transcription failed in worker")
+            conn.send(("error", task_id, f"{type(exc).__name__}: {exc}"))
+        finally:
+            if shm is not None:
+                shm.close()
+
+
+class _Worker:
+    def __init__(self, index, cores, threads):
+        self.index = index
+        self.cores = cores
+        self.threads = threads
+        self.process = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.ready = False
+        self.info = None
+        self.inflight = {}  # task_id -> (future, shm, started)
+        self.restarts = 0
+        self.ping_sent = None
+        self.last_progress = time.monotonic()  # last ready/result message; bounds queued-clip waits
+
+
+class WorkerPool:
+    """Pool of model worker processes with the same submit()/transcribe() API as BatchScheduler.
+
+    Decoded PCM is copied once into a `multiprocessing.shared_memory` block and only its name
+    travels over the pipe. A monitor thread restarts workers that die, hang on a clip for
+    longer than WHISPER_WORKER_TIMEOUT, or stop answering pings while idle.
+    """
+
+    def __init__(self, processes: int, backend_name: str = None, model_name: str = "tiny",
+                 cores_per_worker: int = WHISPER_WORKER_CORES, start_method: str = WHISPER_WORKER_START,
+                 max_queue: int = WHISPER_MAX_QUEUE, warmup_options: dict = None):
+        self.backend_name = backend_name
+        self.max_queue = max_queue
+        self.warmup_options = warmup_options
+        self.model_name = model_name
+        self._ctx = multiprocessing.get_context(start_method)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._restart_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        per_worker = cores_per_worker or max(1, len(available) // processes)
+        self.workers = []
+        for i in range(processes):
+            cores = available[i * per_worker:(i + 1) * per_worker] or available
+            self.workers.append(_Worker(i, cores, threads=len(cores)))
+        for w in self.workers:
+            self._start(w)
+
+        self._reader = threading.Thread(target=self._read_results, name="whisper-pool-results", daemon=True)
+        self._reader.start()
+        self._monitor = threading.Thread(target=self._monitor_workers, name="whisper-pool-monitor", daemon=True)
+        self._monitor.start()
+        logging.info(f"Started {processes} model worker processes ({per_worker} cores each, start={start_method})")
+
+    # --- lifecycle ---
+    def _start(self, w: _Worker):
+        parent_conn, child_conn = self._ctx.Pipe()
+        w.process = self._ctx.Process(
+            target=_worker_main,
+            args=(w.index, child_conn, w.cores, w.threads, self.backend_name, self.model_name, self.warmup_options),
+            name=f"{WORKER_NAME_PREFIX}{w.index}",
+            daemon=True,
+        )
+        w.process.start()
+        child_conn.close()
+        w.conn = parent_conn
+        w.ready = False
+        w.ping_sent = None
+
+    def _restart(self, w: _Worker, reason: str, conn=None):
+        with self._restart_lock:
+            if conn is not None and w.conn is not conn:
+                return  # another thread already replaced this worker
+            self._restart_locked(w, reason)
+
+    def _restart_locked(self, w: _Worker, reason: str):
+        logging.error(f"Restarting model worker {w.index}: {reason}")
+        with self._lock:
+            failed = list(w.inflight.items())
+            w.inflight.clear()
+        for task_id, (future, shm, _) in failed:
+            self._release(shm)
+            if not future.done():
+                future.set_exception(RuntimeError(f"model worker {w.index} failed: {reason}"))
+        old = w.process
+        if old.is_alive():
+            old.kill()
+        # Reap it off this thread: the result reader calls here, and other workers' results must keep flowing
+        threading.Thread(target=old.join, args=(5,), name="whisper-worker-reap", daemon=True).start()
+        try:
+            w.conn.close()
+        except Exception:
+            pass
+        w.restarts += 1
+        if not self._stopped.is_set():
+            self._start(w)
+
+    def shutdown(self):
+        self._stopped.set()
+        for w in self.workers:
+            try:
+                with w.send_lock:
+                    w.conn.send(None)
+            except Exception:
+                pass
+        for w in self.workers:
+            w.process.join(timeout=5)
+            if w.process.is_alive():
+                w.process.kill()
+
+    # --- submission ---
+    def submit(self, audio, options: dict) -> concurrent.futures.Future:
+        """Queue one clip on the least-loaded worker; the Future resolves to the result dict."""
+        if self._stopped.is_set():
+            raise RuntimeError("worker pool is shut down")
+        # Each worker runs one clip at a time; anything beyond that is queued in its pipe
+        if self.max_queue and self.qsize() >= self.max_queue + len(self.workers):
+            raise EngineBusy(f"inference queue is full ({self.max_queue} clips waiting)")
+        if isinstance(audio, str):
+            shm, payload = None, (None, audio, dict(options))
+        else:
+            audio = np.ascontiguousarray(audio, dtype=np.float32)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, audio.nbytes))
+            np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+            payload = (shm.name, len(audio), dict(options))
+        future = concurrent.futures.Future()
+        task_id = next(self._ids)
+        with self._lock:
+            # A ready worker first: one still loading its model (e.g. just restarted) would hold the clip for the whole load
+            w = min(self.workers, key=lambda x: (not x.ready, len(x.inflight)))
+            w.inflight[task_id] = (future, shm, time.monotonic())
+        try:
+            with w.send_lock:
+                w.conn.send(("transcribe", task_id, payload))
+        except Exception as exc:
+            with self._lock:
+                w.inflight.pop(task_id, None)
+            self._release(shm)
+            future.set_exception(RuntimeError(f"could not reach model worker {w.index}: {exc}"))
+        return future
+
+    def transcribe(self, audio, **options) -> dict:
+        return self.submit(audio, options).result()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Block until every worker has loaded its model (or `timeout` seconds pass)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not all(w.ready for w in self.workers):
+            if self._stopped.is_set() or (deadline is not None and time.monotonic() > deadline):
+                return False
+            time.sleep(0.05)
+        return True
+
+    def qsize(self) -> int:
+        with self._lock:
+            return sum(len(w.inflight) for w in self.workers)
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "worker_pool",
+            "queued": self.qsize(),
+            "workers": [
+                {"index": w.index, "pid": w.process.pid, "alive": w.process.is_alive(), "ready": w.ready,
+                 "cores": w.cores, "inflight": len(w.inflight), "restarts": w.restarts}
+                for w in self.workers
+            ],
+        }
+
+    @staticmethod
+    def _release(shm):
+        if shm is None:
+            return
+        try:
+            shm.close()
+            shm.unlink()
+        except Exception:
+            pass
+
+    # --- background threads ---
+    def _read_results(self):
+        while not self._stopped.is_set():
+            conns = {w.conn: w for w in self.workers}
+            try:
+                ready = connection.wait(list(conns), timeout=0.5)
+            except OSError:
+                continue  # a pipe was swapped by a restart; rebuild the list
+            for conn in ready:
+                w = conns[conn]
+                try:
+                    kind, task_id, payload = conn.recv()
+                except (EOFError, OSError):
+                    if not self._stopped.is_set():
+                        self._restart(w, "pipe closed (process exited)", conn=conn)
+                    continue
+                w.last_progress = time.monotonic()
+                if kind == "ready":
+                    w.ready = True
+                    w.info = payload
+                    logging.info(f"Model worker {w.index} ready (pid {w.process.pid}, cores {w.cores})")
+                elif kind == "pong":
+                    w.ping_sent = None
+                else:
+                    with self._lock:
+                        entry = w.inflight.pop(task_id, None)
+                    if entry is None:
+                        continue
+                    future, shm, _ = entry
+                    self._release(shm)
+                    if kind == "result":
+                        future.set_result(payload)
+                    else:
+                        future.set_exception(RuntimeError(payload))
+
+    def _monitor_workers(self):
+        while not self._stopped.wait(WHISPER_WORKER_HEALTH_INTERVAL):
+            now = time.monotonic()
+            for w in self.workers:
+                conn = w.conn
+                if not w.process.is_alive():
+                    self._restart(w, f"process exited (code {w.process.exitcode})", conn=conn)
+                    continue
+                if not w.ready:
+                    continue  # still loading the model
+                with self._lock:
+                    oldest = min((started for _, _, started in w.inflight.values()), default=None)
+                if oldest is not None:
+                    # Busy workers cannot answer pings; only enforce the per-clip limit.
+                    # A queued clip's clock starts when the worker finished the previous one.
+                    if now - max(oldest, w.last_progress) > WHISPER_WORKER_TIMEOUT:
+                        self._restart(w, f"clip exceeded {WHISPER_WORKER_TIMEOUT:.0f}s", conn=conn)
+                    continue
+                if w.ping_sent is not None and now - w.ping_sent > WHISPER_WORKER_HEALTH_INTERVAL * 2:
+                    self._restart(w, "did not answer health check", conn=conn)
+                    continue
+                if w.ping_sent is None:
+                    w.ping_sent = now
+                    try:
+                        with w.send_lock:
+                            conn.send(("ping", None, None))
+                    except Exception as exc:
+                        self._restart(w, f"health check failed: {exc}", conn=conn)